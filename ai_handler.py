@@ -3,75 +3,225 @@ ai_handler.py
 
 Communicates with OpenAI's GPT-4.1-nano for image description.
 - Optionally includes OCR text in the prompt if enabled
-- Returns 'name' and 'alt' in a structured JSON
-- Logs usage tokens (if available) and accumulates them in state['total_tokens']
+- Builds the instructions once per run and sends them ahead of anything per-image
+  (OCR text, the image itself), so the API's prompt cache can reuse the prefix;
+  cached input tokens are counted separately
+- Returns 'name' and 'alt' in a structured JSON, held to a strict JSON schema and a
+  bounded answer length; output that still comes back cut off or malformed is salvaged
+  locally (salvage.py), and only answers beyond repair are asked for again
+- Reports logs and usage tokens (if available) as events, so it can run off the Tk thread
+- Shares one pooled, keep-alive OpenAI client across all worker threads of a session
+- Serves repeated images from the persistent result cache without calling the API
+- Sends the payload the preparation stage (prepare.py) already downscaled/re-encoded for
+  the chosen vision detail, from the same decoded image it used for OCR and the cache key
+- Schedules requests through the shared rate limiter, honouring retry-after and retrying
+  transient failures with jittered exponential backoff
+- Can pack several images into one request (describe_images), so the instructions are
+  paid for once per group; images the answer misses are described on their own
 """
 
-from openai import OpenAI
+import openai
+from openai import OpenAI, DefaultHttpxClient
+import hashlib
 import json
-from helpers import image_to_base64, extract_text_from_image
-from ui_components import append_monitor_colored
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple
+from imaging import prepare_image
+from prepare import PrepareStage, PreparedWork, stage_options
+from ratelimit import retry_after_seconds, backoff_delay
+from salvage import parse_answer, clean_result
+from settings import Settings
 
 MODEL = "gpt-4.1-nano"
 
-def describe_image(state, image_path: str) -> dict | None:
+# USD per million tokens: (input, cached input, output)
+PRICES_PER_MILLION = {
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# Expected output size of one answer, used to reserve tokens before a request
+EXPECTED_OUTPUT_TOKENS = 150
+
+# Hard cap on the output tokens of one answer (max_output_tokens is this per image)
+MAX_OUTPUT_TOKENS = 300
+
+# Longest alt text the prompt and schema ask for, in characters
+ALT_MAX_CHARS = 250
+
+# Paid re-asks for an answer that can't be salvaged
+PARSE_RETRIES = 1
+
+# Connect timeout is kept short; the read timeout comes from settings.http_timeout
+CONNECT_TIMEOUT = 10.0
+
+# Session-scoped client, rebuilt only when the key or connection settings change.
+# The OpenAI client (and the httpx pool under it) is safe to share between threads.
+_client_lock = threading.Lock()
+_client = None
+_client_options = None
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed with 'pip install httpx[http2]')
+        return True
+    except ImportError:
+        return False
+
+def get_client(settings: Settings) -> OpenAI:
     """
-    Describes the image using GPT-4.1-nano, reading user settings from 'state'.
-    
-    - If OCR is enabled, extracts text with Tesseract and appends that text to the prompt.
-    - Builds a JSON structure prompt asking for {"name": ..., "alt": ...}.
-    - If response.usage is available, logs the token usage and adds to state['total_tokens'].
-    
-    Returns:
-        A dict { "name": str, "alt": str }
-        or None if there's an error or invalid response.
+    Returns the shared OpenAI client for these settings, creating it on first use.
+    The pool is sized to at least the run's concurrency so no worker waits for a connection.
+    """
+    global _client, _client_options
+    pool_size = max(int(settings.http_pool_size), int(settings.concurrency))
+    options = (
+        settings.openai_api_key,
+        pool_size,
+        float(settings.http_timeout),
+        bool(settings.http2_enabled) and _http2_available(),
+        settings.api_base_url or None,
+    )
+    # Build limits/timeout with the HTTP library the SDK itself uses (httpx, or the
+    # fork newer SDKs ship), not whatever 'httpx' happens to be installed
+    Limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+    with _client_lock:
+        if _client is None or _client_options != options:
+            if _client is not None:
+                _client.close()
+            api_key, pool_size, timeout, http2, base_url = options
+            http_client = DefaultHttpxClient(
+                limits=Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=openai.Timeout(timeout, connect=CONNECT_TIMEOUT),
+                http2=http2,
+            )
+            # Retries are ours (see describe_image), so the SDK shouldn't add its own
+            _client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _client_options = options
+        return _client
+
+def prewarm_client(settings: Settings, events=None) -> float | None:
+    """
+    Opens (and authenticates) a connection ahead of the first image with a cheap
+    models.list() call, so the TLS handshake isn't paid inside the first request.
+    Returns the elapsed seconds, or None if the warm-up failed.
+    """
+    if settings.http2_enabled and not _http2_available() and events:
+        events.log("[WARN] HTTP/2 requested but the 'h2' package is missing; using HTTP/1.1.", "warn")
+    start = time.perf_counter()
+    try:
+        get_client(settings).models.list()
+    except Exception as e:
+        if events:
+            events.log(f"[WARN] Connection pre-warm failed: {e}", "warn")
+        return None
+    elapsed = time.perf_counter() - start
+    if events:
+        events.log(f"[INFO] Connection pre-warmed in {elapsed:.2f}s", "info")
+    return elapsed
+
+def cache_key_inputs(settings: Settings) -> dict:
+    """
+    Every prompt input that changes the answer, for the result-cache key
+    (the preparation stage adds the image hash and the OCR text).
+    """
+    return {
+        "model": MODEL,
+        "filename_language": settings.filename_language.lower(),
+        "alttext_language": settings.alttext_language.lower(),
+        "name_detail_level": settings.name_detail_level.lower(),
+        "vision_detail": settings.vision_detail.lower(),
+        "upload_format": settings.upload_format,
+        "upload_quality": int(settings.upload_quality),
+        "prompt": prompt_fingerprint(settings),
+    }
+
+def prompt_fingerprint(settings: Settings) -> str:
+    """
+    A hash of the compiled prompts and answer schemas (single and multi-image), so
+    editing either one is a cache miss rather than an old answer.
+    """
+    payload = json.dumps(
+        [build_prompt(settings), _MULTI_TASK, response_format(1), response_format(2)],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def open_prepare_stage(settings: Settings, cache) -> PrepareStage:
     """
-    # Gather relevant config from state
-    api_key = state['openai_api_key'].get()
-    name_lang = state['filename_language'].get().lower()   # e.g. "english", "persian"
-    alt_lang = state['alttext_language'].get().lower()     # e.g. "english", "persian"
-    detail_level = state['name_detail_level'].get().lower()# "minimal"/"normal"/"detailed"
-    vision_detail = state['vision_detail'].get().lower()   # "low"/"high"/"auto"
-    ocr_enabled = state['ocr_enabled'].get()
-    tesseract_path = state['tesseract_path'].get()
-    ocr_lang = state['ocr_language'].get()
-
-    client = OpenAI(api_key=api_key)
-
-    # If OCR is enabled, attempt to extract text
-    if ocr_enabled:
-        ocr_result = extract_text_from_image(image_path, tesseract_path, ocr_lang)
-        if ocr_result.startswith("⚠️ OCR failed:"):
-            # Log error but continue with empty OCR text
-            append_monitor_colored(state, ocr_result, "error")
-            ocr_text = ""
-        else:
-            append_monitor_colored(state, f"[OCR RESULT] {ocr_result}", "warn")
-            ocr_text = ocr_result
+    Starts the preparation process pool for a run (see prepare.py).
+    """
+    if cache is not None:
+        options = stage_options(settings, cache_key_inputs(settings), cache.path)
+    else:
+        options = stage_options(settings, None)
+    return PrepareStage(options, settings.prepare_workers)
+
+def lookup_cache(settings: Settings, cache, cache_key: str | None, image_path: str, events) -> dict | None:
+    """
+    Returns the cached result for 'cache_key', unless the cache is bypassed.
+    """
+    if cache is None or not cache_key or settings.cache_bypass:
+        return None
+    cached = cache.get(cache_key)
+    if cached is not None:
+        events.log(f"[CACHE HIT] {image_path}", "success")
     else:
-        ocr_text = ""
+        events.log(f"[CACHE MISS] {image_path}", "debug")
+    return cached
 
-    # Convert image to base64
-    b64_image = image_to_base64(image_path)
+# What the model is asked to return, for one image and for several
+_SINGLE_TASK = (
+    "Your task is to analyze the content and purpose of the given image.\n\n"
+    "Generate a JSON object with the following structure:\n"
+    "{\n"
+    "  \"name\": \"<a lowercase, dash-separated filename (max 10 words)>\",\n"
+    "  \"alt\": \"<a clear and descriptive alt text, suitable for screen readers>\"\n"
+    "}\n\n"
+)
+_MULTI_TASK = (
+    "You are given {count} images, numbered 0 to {last} in the order they appear.\n"
+    "Analyze the content and purpose of each image on its own.\n\n"
+    "Generate a JSON object with one entry per image:\n"
+    "{{\n"
+    "  \"images\": [\n"
+    "    {{\n"
+    "      \"index\": <the image's number>,\n"
+    "      \"name\": \"<a lowercase, dash-separated filename (max 10 words)>\",\n"
+    "      \"alt\": \"<a clear and descriptive alt text, suitable for screen readers>\"\n"
+    "    }}\n"
+    "  ]\n"
+    "}}\n\n"
+)
 
-    # Build the prompt
+def build_prompt(settings: Settings, count: int = 1) -> str:
+    """
+    The instruction prompt asking for {"name": ..., "alt": ...}, or with count > 1 for
+    {"images": [{"index": ..., "name": ..., "alt": ...}, ...]}.
+    It only depends on the settings, so it is built once and then reused: every request
+    of a run starts with exactly the same text, which is what the API's prompt cache
+    matches on. Per-image content (OCR text, the image) goes after it, see build_request.
+    """
+    return _compile_prompt(
+        settings.filename_language.lower(),     # e.g. "english", "persian"
+        settings.alttext_language.lower(),      # e.g. "english", "persian"
+        settings.name_detail_level.lower(),     # "minimal"/"normal"/"detailed"
+        count,
+    )
+
+@lru_cache(maxsize=32)
+def _compile_prompt(name_lang: str, alt_lang: str, detail_level: str, count: int) -> str:
     prompt = (
         "You are an expert image analyst.\n"
-        "Your task is to analyze the content and purpose of the given image.\n\n"
-        "Generate a JSON object with the following structure:\n"
-        "{\n"
-        "  \"name\": \"<a lowercase, dash-separated filename (max 10 words)>\",\n"
-        "  \"alt\": \"<a clear and descriptive alt text, suitable for screen readers>\"\n"
-        "}\n\n"
+        + (_MULTI_TASK.format(count=count, last=count - 1) if count > 1 else _SINGLE_TASK) +
         "Guidelines:\n"
         "- The 'name' should describe what the image is or what it's used for.\n"
         "- The 'alt' text must explain what is visible and what is happening.\n"
         "- Avoid special characters or digits in the 'name'.\n"
+        f"- Keep the 'alt' under {ALT_MAX_CHARS} characters.\n"
     )
 
-    if ocr_text:
-        prompt += f'\nText in image from OCR:\n"""\n{ocr_text}\n"""\n'
-
     if detail_level == "minimal":
         prompt += f"\nThe 'name' should be a very short {name_lang} phrase with 1–2 simple words."
     elif detail_level == "normal":
@@ -81,32 +231,451 @@ def describe_image(state, image_path: str) -> dict | None:
         prompt += f"\nThe 'name' should be a descriptive {name_lang} phrase with up to 10 words."
 
     prompt += f"\nThe 'alt' should be written in {alt_lang}."
+    return prompt
 
-    try:
-        response = client.responses.create(
-            model=MODEL,
-            input=[{
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": prompt},
-                    {"type": "input_image", "image_url": b64_image, "detail": vision_detail}
-                ]
-            }],
-            text={"format": {"type": "json_object"}}
-        )
+def ocr_prompt(ocr_text: str) -> str:
+    """
+    The per-image text that passes OCR results on to the model.
+    """
+    return f'Text in image from OCR:\n"""\n{ocr_text}\n"""'
 
-        # Show raw output for debugging
-        append_monitor_colored(state, f"[API RAW OUTPUT]\n{response.output_text}", "info")
+# JSON schemas the answers are held to (strict mode: every property required, no others)
+_ANSWER_PROPERTIES = {
+    "name": {"type": "string", "description": "Lowercase, dash-separated filename, at most 10 words."},
+    "alt": {"type": "string", "description": f"Alt text for screen readers, under {ALT_MAX_CHARS} characters."},
+}
+_SINGLE_SCHEMA = {
+    "type": "object",
+    "properties": _ANSWER_PROPERTIES,
+    "required": ["name", "alt"],
+    "additionalProperties": False,
+}
+_MULTI_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "images": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, **_ANSWER_PROPERTIES},
+                "required": ["index", "name", "alt"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["images"],
+    "additionalProperties": False,
+}
 
-        # If usage is available, log tokens
-        if response.usage:
-            used = response.usage.total_tokens
-            append_monitor_colored(state, f"[TOKEN USAGE] +{used} tokens", "token")
-            prev = state['total_tokens'].get()
-            state['total_tokens'].set(prev + used)
+def response_format(count: int = 1) -> dict:
+    """
+    The strict structured-output format for an answer about 'count' images.
+    Lengths are asked for in the descriptions (strict mode doesn't take maxLength);
+    max_output_tokens bounds them, and salvage.clean_result trims what's left over.
+    """
+    if count > 1:
+        return {"type": "json_schema", "name": "image_descriptions", "strict": True, "schema": _MULTI_SCHEMA}
+    return {"type": "json_schema", "name": "image_description", "strict": True, "schema": _SINGLE_SCHEMA}
 
-        return json.loads(response.output_text)
+def build_request(settings: Settings, prompt: str, image_url: str, ocr_text: str = "") -> dict:
+    """
+    Returns the keyword arguments for client.responses.create(). Batch mode writes
+    the very same dict as the request body of each JSONL line.
+    The shared prompt comes first; the image's OCR text and the image follow it.
+    """
+    content = [{"type": "input_text", "text": prompt}]
+    if ocr_text:
+        content.append({"type": "input_text", "text": ocr_prompt(ocr_text)})
+    content.append({"type": "input_image", "image_url": image_url, "detail": settings.vision_detail.lower()})
+    return {
+        "model": MODEL,
+        "input": [{"role": "user", "content": content}],
+        "text": {"format": response_format()},
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+    }
 
-    except Exception as e:
-        append_monitor_colored(state, f"[API ERROR] {e}", "error")
+def build_multi_request(settings: Settings, prompt: str, image_urls: list, ocr_texts: list) -> dict:
+    """
+    Like build_request, for several images: each is preceded by its number
+    (and its OCR text, if any).
+    """
+    detail = settings.vision_detail.lower()
+    content = [{"type": "input_text", "text": prompt}]
+    for index, (image_url, ocr_text) in enumerate(zip(image_urls, ocr_texts)):
+        label = f"Image {index}:"
+        if ocr_text:
+            label += "\n" + ocr_prompt(ocr_text)
+        content.append({"type": "input_text", "text": label})
+        content.append({"type": "input_image", "image_url": image_url, "detail": detail})
+    return {
+        "model": MODEL,
+        "input": [{"role": "user", "content": content}],
+        "text": {"format": response_format(len(image_urls))},
+        "max_output_tokens": MAX_OUTPUT_TOKENS * len(image_urls),
+    }
+
+def parse_multi_result(output_text: str, count: int) -> tuple:
+    """
+    Splits a multi-image answer into one result per image, in request order.
+    Returns (results, salvaged): an entry is None when its image is missing, out of
+    range, repeated or lacks a usable name/alt; 'salvaged' is True if the output had
+    to be repaired first (see salvage.py). Raises ValueError if nothing can be recovered.
+    """
+    data, salvaged = parse_answer(output_text)
+    if isinstance(data, dict):
+        data = data.get("images", [])
+    if not isinstance(data, list):
+        return [None] * count, salvaged
+
+    results = [None] * count
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count or results[index] is not None:
+            continue
+        results[index] = clean_result(entry)
+    return results, salvaged
+
+def report_prepared(prepared, events):
+    """
+    Logs what resizing/re-encoding saved and adds it to the run counters.
+    """
+    if prepared.sent_bytes != prepared.original_bytes:
+        events.log(
+            f"[PREPROCESS] {prepared.original_size[0]}x{prepared.original_size[1]} -> "
+            f"{prepared.sent_size[0]}x{prepared.sent_size[1]}, "
+            f"{prepared.original_bytes // 1024} KB -> {prepared.sent_bytes // 1024} KB, "
+            f"~{prepared.tokens_saved} image tokens saved",
+            "debug",
+        )
+    events.count('bytes_saved', prepared.bytes_saved)
+    events.count('image_tokens_saved', prepared.tokens_saved)
+
+class Usage(NamedTuple):
+    """
+    Token usage of one response.
+    """
+    total: int
+    input: int
+    output: int
+    cached: int     # input tokens served from the prompt cache
+
+def read_usage(usage) -> Usage | None:
+    """
+    The Usage of a response, given as the SDK object or as the plain dict of a
+    Batch API result line. None if the response reported none.
+    """
+    if not usage:
         return None
+    if isinstance(usage, dict):
+        details = usage.get('input_tokens_details') or {}
+        return Usage(usage.get('total_tokens') or 0, usage.get('input_tokens') or 0,
+                     usage.get('output_tokens') or 0, details.get('cached_tokens') or 0)
+    details = getattr(usage, "input_tokens_details", None)
+    return Usage(usage.total_tokens or 0, getattr(usage, "input_tokens", 0) or 0,
+                 getattr(usage, "output_tokens", 0) or 0, getattr(details, "cached_tokens", None) or 0)
+
+def token_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0, batch: bool = False) -> float:
+    """
+    What MODEL charges for these tokens, in USD. The Batch API bills half.
+    """
+    input_price, cached_price, output_price = PRICES_PER_MILLION[MODEL]
+    cost = ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + output_tokens * output_price) / 1_000_000
+    return cost / 2 if batch else cost
+
+def _log_output(output_text: str, usage: Usage | None, events, batch: bool = False):
+    """
+    Logs a raw answer and its token usage, and adds the usage and its cost to the
+    run counters.
+    """
+    # Show raw output for debugging (the Monitor only keeps it in verbose mode)
+    events.log(f"[API RAW OUTPUT]\n{output_text}", "raw")
+
+    # If usage is available, log tokens
+    if usage and usage.total:
+        events.log(f"[TOKEN USAGE] +{usage.total} tokens"
+                   + (f" ({usage.cached} cached)" if usage.cached else ""), "token")
+        events.emit("tokens", used=usage.total, cached=usage.cached)
+        events.count('tokens', usage.total)
+        if usage.cached:
+            events.count('cached_tokens', usage.cached)
+        events.count('cost', token_cost(usage.input, usage.output, usage.cached, batch))
+
+def note_answer(meta: dict | None, source: str, usage: Usage | None = None,
+                salvaged: bool = False, images: int = 1):
+    """
+    Notes how an image's answer was obtained in 'meta' (if given), for the result
+    files (see records.py): its source ("api" or "cache"), its tokens (its share, for
+    a request about several images) and whether it had to be salvaged.
+    """
+    if meta is None:
+        return
+    meta['source'] = source
+    meta['tokens'] = round(usage.total / images) if usage else 0
+    meta['cached_tokens'] = round(usage.cached / images) if usage else 0
+    meta['salvaged'] = salvaged
+
+def record_result(output_text: str, usage: Usage | None, cache, cache_key, events,
+                  stages=None, batch: bool = False, meta: dict = None) -> dict:
+    """
+    Logs the raw output and token usage, parses the answer and stores it in the cache.
+    Output that isn't clean JSON is salvaged if it can be (counted as 'salvaged').
+    Raises ValueError if no usable name/alt can be recovered from it.
+    Parsing time goes to the 'parse' stage of 'stages', if given; the answer's usage
+    is noted in 'meta', if given (see note_answer).
+    """
+    _log_output(output_text, usage, events, batch)
+
+    start = time.perf_counter()
+    try:
+        data, salvaged = parse_answer(output_text)
+        result = clean_result(data)
+    finally:
+        if stages is not None:
+            stages.add('parse', time.perf_counter() - start)
+    if result is None:
+        raise ValueError("the answer has no usable name/alt")
+    if salvaged:
+        events.count('salvaged')
+        events.log("[SALVAGED] Repaired a malformed or cut-off answer locally.", "warn")
+    if cache is not None and cache_key:
+        cache.put(cache_key, result)
+    note_answer(meta, "api", usage, salvaged)
+    return result
+
+def estimate_request_tokens(prompt: str, prepared, ocr_text: str = "") -> int:
+    """
+    Rough token cost of a request before it is sent: ~4 characters per text token,
+    the image's estimated vision tokens and a typical answer.
+    """
+    return (len(prompt) + len(ocr_text)) // 4 + prepared.tokens_after + EXPECTED_OUTPUT_TOKENS
+
+def estimate_multi_request_tokens(prompt: str, prepared_images: list, ocr_texts: list) -> int:
+    """
+    estimate_request_tokens for a multi-image request: one answer per image.
+    """
+    text = len(prompt) + sum(len(ocr_text) + 40 for ocr_text in ocr_texts)
+    return (text // 4 + sum(p.tokens_after for p in prepared_images)
+            + EXPECTED_OUTPUT_TOKENS * len(prepared_images))
+
+def _retry_delay(error, attempt: int, limiter, events) -> float | None:
+    """
+    Decides whether a failed request is worth retrying.
+    Returns the seconds to wait first, or None if the error is permanent.
+    A 429's retry-after also pauses the shared limiter, so other workers back off too.
+    """
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status == 429 and getattr(error, "code", None) == "insufficient_quota":
+            return None
+        if status not in (408, 409, 429) and status < 500:
+            return None
+        if status == 429:
+            events.count('rate_limited')
+        if limiter is not None:
+            limiter.update_from_headers(error.response.headers)
+        delay = retry_after_seconds(error.response.headers)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if status == 429 and limiter is not None:
+            limiter.pause(delay)
+        return delay
+    if isinstance(error, openai.APIConnectionError):
+        # Includes timeouts
+        return backoff_delay(attempt)
+    return None
+
+def describe_image(settings: Settings, image_path: str, events, work: PreparedWork,
+                   cache=None, limiter=None, stages=None, meta: dict = None) -> dict | None:
+    """
+    Describes the image using GPT-4.1-nano, reading user settings from the 'settings' snapshot.
+    Log lines and token usage are posted to 'events' (an events.EventQueue); no Tk is touched.
+    
+    - 'work' is what the preparation stage produced for the image (see prepare.py):
+      the OCR text, the cache key and the resized/re-encoded payload. Its payload is
+      released once the request body is built.
+    - If OCR is enabled, the OCR text is appended to the prompt.
+    - If a cache.ResultCache is given, returns a cached result for the same image bytes and
+      prompt inputs without calling the API (unless settings.cache_bypass is set);
+      fresh results are always stored.
+    - If a ratelimit.RateLimiter is given, each attempt waits for room in the RPM/TPM
+      budgets and feeds the rate-limit headers back into it.
+    - 429s, 5xx and connection errors are retried up to settings.max_retries times.
+    - Builds a JSON structure prompt asking for {"name": ..., "alt": ...}, held to a
+      strict schema. Malformed output is salvaged locally; an answer beyond repair is
+      asked for again up to PARSE_RETRIES times (counted as 'parse_retries').
+    - If response.usage is available, logs the token usage and posts a 'tokens' event.
+    - If a stages.StageTimes is given, API time is added to it.
+    - If a 'meta' dict is given, how the answer was obtained is noted in it (note_answer).
+    
+    Returns:
+        A dict { "name": str, "alt": str }
+        or None if there's an error or invalid response.
+    """
+    client = get_client(settings)
+
+    cached = lookup_cache(settings, cache, work.cache_key, image_path, events)
+    if cached is not None:
+        note_answer(meta, "cache")
+        return cached
+
+    prepared = work.prepared
+    if prepared is None:
+        # The cache entry went away after the preparation stage saw it
+        prepared = prepare_image(image_path, settings.vision_detail.lower(),
+                                 settings.upload_format, settings.upload_quality)
+    report_prepared(prepared, events)
+
+    prompt = build_prompt(settings)
+    request = build_request(settings, prompt, prepared.to_data_url(), work.ocr_text)
+    estimated = estimate_request_tokens(prompt, prepared, work.ocr_text)
+    # The request body holds the only copy we still need
+    work.prepared = prepared = None
+
+    for attempt in range(PARSE_RETRIES + 1):
+        response = _send(settings, client, request, estimated, image_path, events, limiter, stages)
+        if response is None:
+            return None
+        output_text, usage = response
+        try:
+            return record_result(output_text, usage, cache, work.cache_key, events, stages, meta=meta)
+        except ValueError as e:
+            if attempt == PARSE_RETRIES:
+                events.log(f"[API ERROR] Unusable answer for {image_path}: {e}", "error")
+                return None
+            events.count('parse_retries')
+            events.log(f"[RETRY] {image_path}: unusable answer ({e}); asking again.", "warn")
+        except Exception as e:
+            events.log(f"[API ERROR] {e}", "error")
+            return None
+    return None
+
+def _send(settings: Settings, client, request: dict, estimated: int, label: str, events,
+          limiter=None, stages=None) -> tuple | None:
+    """
+    Sends one request, waiting for the rate limiter and retrying transient failures.
+    Returns (output text, Usage or None), or None once it has given up.
+    """
+    max_retries = int(settings.max_retries)
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire(estimated)
+        try:
+            start = time.perf_counter()
+            raw = client.responses.with_raw_response.create(**request)
+            response = raw.parse()
+        except Exception as e:
+            delay = _retry_delay(e, attempt, limiter, events)
+            if delay is None or attempt == max_retries:
+                events.log(f"[API ERROR] {e}", "error")
+                return None
+            events.count('retries')
+            events.log(f"[RETRY] {label} in {delay:.1f}s (attempt {attempt + 1}/{max_retries}): {e}", "warn")
+            time.sleep(delay)
+            continue
+
+        latency = time.perf_counter() - start
+        events.log(f"[API LATENCY] {latency:.2f}s", "debug")
+        if stages is not None:
+            stages.add('api', latency)
+        usage = read_usage(response.usage)
+        if limiter is not None:
+            limiter.update_from_headers(raw.headers)
+            if usage and usage.total:
+                limiter.record_usage(estimated, usage.total)
+            events.emit("limiter", **limiter.snapshot())
+        return response.output_text, usage
+    return None
+
+def describe_images(settings: Settings, image_paths: list, events, works: list,
+                    cache=None, limiter=None, stages=None, metas: list = None) -> list:
+    """
+    Describes several images with one request (settings.images_per_request of them).
+    Same contract as describe_image, per image: returns one result (or None) for each of
+    'image_paths', in order.
+
+    - Cached images are answered from the cache and left out of the request.
+    - The answer must hold a usable {"index", "name", "alt"} entry for every image sent;
+      images it misses or gets wrong are described with describe_image(), one by one.
+      If the request itself fails, every image it held fails with it.
+    - The payloads in 'works' are released once every image has its answer.
+    - 'metas', if given, holds one dict per image to note its answer in (note_answer).
+    """
+    if metas is None:
+        metas = [None] * len(image_paths)
+    results = [lookup_cache(settings, cache, work.cache_key, path, events)
+               for path, work in zip(image_paths, works)]
+    for result, meta in zip(results, metas):
+        if result is not None:
+            note_answer(meta, "cache")
+    todo = [i for i, result in enumerate(results) if result is None]
+    if len(todo) < 2:
+        # Nothing to share the instructions with
+        for i in todo:
+            results[i] = describe_image(settings, image_paths[i], events, works[i], cache, limiter, stages, metas[i])
+        return results
+
+    prepared_images = []
+    for i in todo:
+        if works[i].prepared is None:
+            # The cache entry went away after the preparation stage saw it
+            works[i].prepared = prepare_image(image_paths[i], settings.vision_detail.lower(),
+                                              settings.upload_format, settings.upload_quality)
+        report_prepared(works[i].prepared, events)
+        prepared_images.append(works[i].prepared)
+
+    ocr_texts = [works[i].ocr_text for i in todo]
+    prompt = build_prompt(settings, len(todo))
+    request = build_multi_request(settings, prompt, [p.to_data_url() for p in prepared_images], ocr_texts)
+    estimated = estimate_multi_request_tokens(prompt, prepared_images, ocr_texts)
+    del prepared_images
+
+    events.count('multi_requests')
+    label = f"{len(todo)} images ({image_paths[todo[0]]}, ...)"
+    response = _send(settings, get_client(settings), request, estimated, label, events, limiter, stages)
+    del request
+    if response is None:
+        # Already retried as far as it makes sense: asking again per image would repeat
+        # a permanent error once per image, outside the run budget's reservation
+        for i in todo:
+            works[i].prepared = None
+        return results
+
+    output_text, usage = response
+    _log_output(output_text, usage, events)
+    answers, salvaged = [None] * len(todo), False
+    start = time.perf_counter()
+    try:
+        answers, salvaged = parse_multi_result(output_text, len(todo))
+        if salvaged and any(answers):
+            events.count('salvaged', sum(1 for answer in answers if answer))
+            events.log("[SALVAGED] Repaired a malformed or cut-off multi-image answer locally.", "warn")
+    except ValueError as e:
+        events.log(f"[API ERROR] Multi-image answer can't be parsed: {e}", "error")
+    finally:
+        if stages is not None:
+            stages.add('parse', time.perf_counter() - start)
+
+    missing = []
+    for i, answer in zip(todo, answers):
+        if answer is None:
+            missing.append(i)
+            continue
+        results[i] = answer
+        note_answer(metas[i], "api", usage, salvaged, len(todo))
+        works[i].prepared = None
+        if cache is not None and works[i].cache_key:
+            cache.put(works[i].cache_key, answer)
+
+    if missing:
+        events.count('multi_fallbacks', len(missing))
+        events.log(f"[WARN] {len(missing)} of {len(todo)} images missing or malformed in a multi-image answer; "
+                   "describing them one by one.", "warn")
+        for i in missing:
+            results[i] = describe_image(settings, image_paths[i], events, works[i], cache, limiter, stages, metas[i])
+    return results
@@ -0,0 +1,202 @@
+"""
+altomatic.py
+
+Headless command line for Altomatic, e.g.:
+    python -m altomatic ./photos --output ./out --concurrency 8 --vision-detail low
+    python -m altomatic --resume-session ./out/session-2025-04-15-19-37-A2B7
+    python -m altomatic ./photos --dry-run
+    python -m altomatic ./inbox --output ./out --watch
+
+- Takes the same options as the Settings tab (generated from settings.Settings),
+  starting from the saved config unless --no-config is given
+- Runs the same engine as the GUI (logic.run_engine) without importing tkinter
+- Prints progress, logs and the final summary to stdout as JSON lines
+- --dry-run projects tokens, cost and duration from the image headers, without
+  calling the API (see logic.run_estimate)
+- --undo-renames SESSION puts back the files an in-place rename run renamed
+- --watch keeps running and processes images as they are dropped into the input
+  folder (see watcher.py), until interrupted or sent SIGTERM
+- Exits with 0 if every image was processed, 1 if some failed, the run stopped, or the
+  run budget stopped it before every image was sent (resume the session to finish)
+"""
+
+import os
+import sys
+import signal
+import argparse
+import threading
+import multiprocessing
+from dataclasses import fields
+
+from config import load_config, NUMERIC_RANGES
+from events import JsonLinesEvents
+from logic import run_engine, run_estimate
+from outputs import undo_renames
+from settings import Settings
+from watcher import run_watch
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    One option per CLI-enabled Settings field, with the saved config as defaults.
+    """
+    parser = argparse.ArgumentParser(
+        prog="altomatic",
+        description="Rename images and write alt text for them using OpenAI vision models.",
+    )
+    parser.add_argument("input", nargs="?",
+                        help="an image file or a folder of images (not needed with --resume-session)")
+    parser.add_argument("-o", "--output",
+                        help="folder to create the session folder in (default: next to the input)")
+    parser.add_argument("--api-key",
+                        help="OpenAI API key (default: $OPENAI_API_KEY, then the saved config)")
+    parser.add_argument("--no-config", action="store_true",
+                        help="ignore the GUI's saved settings and start from the defaults")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only estimate tokens, cost and duration (reads image headers, sends nothing)")
+    parser.add_argument("--undo-renames", metavar="SESSION",
+                        help="put back the originals an --output-strategy rename run renamed, then exit")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process new images as they arrive in the input folder")
+    parser.add_argument("--watch-settle", type=float, default=2.0, metavar="SECONDS",
+                        help="with --watch: how long a file must stay unchanged before it is picked up")
+    parser.add_argument("--watch-batch", type=float, default=10.0, metavar="SECONDS",
+                        help="with --watch: how long to gather new images before sending them")
+    parser.add_argument("--watch-poll", type=float, default=0.0, metavar="SECONDS",
+                        help="with --watch: poll the folder this often instead of using inotify "
+                             "(e.g. for network shares)")
+    parser.add_argument("--events",
+                        help="comma-separated event kinds to print, e.g. progress,finished (default: all)")
+
+    for f in fields(Settings):
+        if not f.metadata.get('cli', True):
+            continue
+        flag = "--" + f.name.replace("_", "-")
+        if f.type is bool:
+            parser.add_argument(flag, dest=f.name, action=argparse.BooleanOptionalAction,
+                                default=None, help=f.metadata['help'])
+        else:
+            kind = _in_range(f.name, f.type) if f.name in NUMERIC_RANGES else f.type
+            parser.add_argument(flag, dest=f.name, type=kind, default=None,
+                                choices=f.metadata.get('choices'), help=f.metadata['help'])
+    return parser
+
+def _in_range(name: str, kind: type):
+    """
+    An argparse type= converter for a numeric setting that refuses values outside
+    NUMERIC_RANGES (the GUI's spinboxes clamp to the same bounds).
+    """
+    low, high = NUMERIC_RANGES[name]
+
+    def convert(text):
+        try:
+            value = kind(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid {kind.__name__} value: {text!r}")
+        if not low <= value <= high:
+            raise argparse.ArgumentTypeError(f"{value} is out of range (allowed: {low} to {high})")
+        return value
+
+    return convert
+
+def settings_from_args(args) -> Settings:
+    """
+    Merges the saved config (unless --no-config), the environment and the given options.
+    """
+    config = {} if args.no_config else load_config()
+    in_path = os.path.abspath(args.input) if args.input else ""
+    input_type = "File" if os.path.isfile(in_path) else "Folder"
+
+    overrides = {
+        f.name: getattr(args, f.name) for f in fields(Settings)
+        if f.metadata.get('cli', True) and getattr(args, f.name, None) is not None
+    }
+    overrides['input_path'] = in_path
+    overrides['input_type'] = input_type
+    overrides['output_folder'] = os.path.abspath(args.output) if args.output else (
+        os.path.dirname(in_path) if input_type == "File" else in_path)
+    if overrides.get('resume_session'):
+        overrides['resume_session'] = os.path.abspath(overrides['resume_session'])
+    overrides['openai_api_key'] = (
+        args.api_key or os.environ.get("OPENAI_API_KEY") or config.get('openai_api_key', "")
+    ).strip()
+    return Settings.from_config(config, **overrides)
+
+def _undo_renames(session_path: str) -> int:
+    """
+    Reverts an in-place rename run, printing one 'undone' event.
+    """
+    events = JsonLinesEvents()
+    try:
+        restored, problems = undo_renames(os.path.abspath(session_path))
+    except FileNotFoundError as e:
+        events.log(f"[ERROR] {e}", "error")
+        return 1
+    for problem in problems:
+        events.log(f"[WARN] {problem}", "warn")
+    events.emit("undone", restored=restored, problems=len(problems))
+    return 1 if problems else 0
+
+def _watch(settings: Settings, args, kinds, parser) -> int:
+    """
+    Runs watch mode until Ctrl+C or SIGTERM; each batch prints its own 'finished' event.
+    """
+    if settings.resume_session or not os.path.isdir(settings.input_path):
+        parser.error("--watch needs an input folder (and no --resume-session)")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        run_watch(settings, lambda: JsonLinesEvents(kinds=kinds), stop,
+                  settle=args.watch_settle, batch=args.watch_batch, poll=args.watch_poll)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        parser.error(str(e))
+    return 0
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.undo_renames:
+        return _undo_renames(args.undo_renames)
+    settings = settings_from_args(args)
+
+    if not settings.openai_api_key and not args.dry_run:
+        parser.error("no API key: pass --api-key or set OPENAI_API_KEY")
+    if settings.resume_session:
+        if not os.path.isdir(settings.resume_session):
+            parser.error(f"session folder does not exist: {settings.resume_session}")
+    elif not args.input:
+        parser.error("an input file or folder is required")
+    elif not os.path.exists(settings.input_path):
+        parser.error(f"input path does not exist: {args.input}")
+    elif not args.dry_run:
+        os.makedirs(settings.output_folder, exist_ok=True)
+
+    kinds = [k.strip() for k in args.events.split(",") if k.strip()] if args.events else None
+    events = JsonLinesEvents(kinds=kinds)
+
+    if args.watch:
+        return _watch(settings, args, kinds, parser)
+
+    if args.dry_run:
+        estimate = run_estimate(settings, events)
+        events.emit("estimate", estimate=estimate)
+        return 0 if estimate else 1
+
+    summary = None
+    try:
+        summary = run_engine(settings, events)
+    except KeyboardInterrupt:
+        events.log("[ERROR] Interrupted.", "error")
+    except Exception as e:
+        events.log(f"[ERROR] Processing stopped: {e}", "error")
+    finally:
+        events.emit("finished", summary=summary)
+
+    if summary is None or summary.get('failed') or summary.get('budget_stopped'):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
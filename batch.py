@@ -0,0 +1,359 @@
+"""
+batch.py
+
+Batch processing mode for large offline folders, via the OpenAI Batch API:
+- Builds exactly the requests describe_image() would send and streams them into JSONL
+  files (split to stay under the Batch API's size and request-count limits)
+- Uploads and submits the files, then polls until every batch has finished
+- Records every submitted batch (and which image each request is for) in
+  batch_jobs.json as soon as it is submitted, so resuming the session after a crash
+  collects those batches instead of paying for the requests again
+- Downloads the results and hands them back per image, so logic.py can write
+  renamed_images, the summary txt and failed.log as usual
+- Talks to the API through a small transport object, so it can be pointed at a
+  local stand-in server (or replaced entirely) for testing
+"""
+
+import os
+import json
+import time
+from abc import ABC, abstractmethod
+
+from ai_handler import (
+    get_client,
+    open_prepare_stage,
+    lookup_cache,
+    build_prompt,
+    build_request,
+    report_prepared,
+    record_result,
+    note_answer,
+    read_usage,
+)
+from imaging import prepare_image
+from ratelimit import backoff_delay
+
+# Batch API limits (kept a little under the documented 200 MB / 50,000 requests)
+MAX_BATCH_FILE_BYTES = 190 * 1024 * 1024
+MAX_BATCH_REQUESTS = 50000
+
+BATCH_ENDPOINT = "/v1/responses"
+COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = 30
+# Failed status checks in a row (at least) before giving up on the wait
+STATUS_RETRIES = 5
+
+BATCH_JOBS_FILE = "batch_jobs.json"
+
+# Batch states after which nothing more will happen
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+class BatchTransport(ABC):
+    """
+    The four Files/Batches calls batch mode needs. Subclass to plug in another backend.
+    """
+
+    @abstractmethod
+    def upload(self, path: str) -> str:
+        """Uploads a JSONL input file, returns its file id."""
+
+    @abstractmethod
+    def create(self, input_file_id: str) -> str:
+        """Submits a batch for an uploaded file, returns the batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> dict:
+        """
+        Returns {'status', 'output_file_id', 'error_file_id', 'completed', 'failed', 'total'}.
+        """
+
+    @abstractmethod
+    def download(self, file_id: str, dest_path: str):
+        """Saves a result file to dest_path."""
+
+class OpenAIBatchTransport(BatchTransport):
+    """
+    Uses the shared OpenAI client (which honours settings.api_base_url,
+    so a local stand-in server works too).
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, path):
+        with open(path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch").id
+
+    def create(self, input_file_id):
+        batch = self.client.batches.create(
+            input_file_id=input_file_id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'completed': counts.completed if counts else 0,
+            'failed': counts.failed if counts else 0,
+            'total': counts.total if counts else 0,
+        }
+
+    def download(self, file_id, dest_path):
+        self.client.files.content(file_id).write_to_file(dest_path)
+
+def run_batch(settings, images, events, session_path, cache=None, transport=None,
+              poll_interval=BATCH_POLL_SECONDS, stages=None):
+    """
+    Describes 'images' through the Batch API.
+    Returns {index: (result, error, meta)} for every image; exactly one of result and
+    error is set, and 'meta' notes how a result was obtained (see ai_handler.note_answer).
+    'stages' (a stages.StageTimes) collects the preparation and parse times.
+    When a resumed session's batch_jobs.json lists batches a crashed run submitted for
+    some of 'images', those images are collected from them rather than sent again.
+    """
+    if transport is None:
+        transport = OpenAIBatchTransport(get_client(settings))
+
+    outcomes = {}
+    jobs_path = os.path.join(session_path, BATCH_JOBS_FILE)
+    jobs = _load_jobs(jobs_path, events)
+    index = {path: idx for idx, path in enumerate(images)}
+
+    # Images the journal has no result for but an earlier batch was sent for (a retry
+    # of failures asks again: those batches already answered)
+    attached = []
+    if not settings.retry_failures:
+        for job in jobs:
+            # (Files from before the image list was recorded can't be matched to images)
+            count = sum(1 for path, _ in (job.get('images') or {}).values() if path in index)
+            if count:
+                attached.append(job)
+                events.log(f"[BATCH] Collecting {count} image(s) from {job['batch_id']}, "
+                           f"submitted by an earlier run", "info")
+    pending = {index[path] for job in attached for path, _ in job['images'].values() if path in index}
+
+    chunks = _write_request_files(settings, images, events, session_path, cache, outcomes, stages, pending)
+    if not chunks and not attached:
+        events.log("[BATCH] Every image was served from the cache; nothing to submit.", "info")
+        return outcomes
+
+    # Submit every chunk, recording it before anything else can go wrong
+    active = list(attached)
+    for chunk_path, requests in chunks:
+        file_id = transport.upload(chunk_path)
+        batch_id = transport.create(file_id)
+        job = {'batch_id': batch_id, 'input_file_id': file_id, 'requests': len(requests), 'images': requests}
+        jobs.append(job)
+        active.append(job)
+        _save_jobs(jobs_path, jobs)
+        events.log(f"[BATCH] Submitted {len(requests)} request(s) as {batch_id}", "info")
+        # The base64 payloads are no longer needed locally
+        os.remove(chunk_path)
+
+    retries = max(int(settings.max_retries), STATUS_RETRIES)
+    statuses = _poll_until_done(transport, active, events, poll_interval, retries, jobs_path)
+
+    # Collect results and per-request errors
+    for job in active:
+        info = statuses[job['batch_id']]
+        for kind in ("output", "error"):
+            file_id = info.get(f"{kind}_file_id")
+            if file_id:
+                path = os.path.join(session_path, f"batch_{kind}_{job['batch_id']}.jsonl")
+                transport.download(file_id, path)
+                _read_output_file(path, job, index, events, cache, outcomes, stages)
+
+    # Anything still unaccounted for never came back from its batch
+    for idx in range(len(images)):
+        if idx not in outcomes:
+            outcomes[idx] = (None, RuntimeError("No result returned by the batch."), None)
+    return outcomes
+
+def _load_jobs(path, events):
+    """
+    The batches recorded in a session's batch_jobs.json ([] if there are none).
+    """
+    if not os.path.isfile(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+    except (OSError, ValueError) as e:
+        events.log(f"[WARN] Can't read {path}: {e}", "warn")
+        return []
+    return jobs if isinstance(jobs, list) else []
+
+def _save_jobs(path, jobs):
+    """
+    Rewrites batch_jobs.json through a temporary file, so a crash leaves the old or
+    the new list, never half of one.
+    """
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(jobs, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+def _custom_id(idx):
+    return f"img-{idx}"
+
+def _write_request_files(settings, images, events, session_path, cache, outcomes, stages=None, skip=()):
+    """
+    Streams one JSONL line per (uncached) image into request files, starting a new file
+    whenever the size or count limit would be exceeded. Images whose index is in 'skip'
+    are left out. Returns [(path, {custom_id: [image path, cache key]})].
+    Cache hits and images that can't be prepared go straight into 'outcomes'.
+    Images are loaded, OCR'd and re-encoded by the preparation process pool (see
+    prepare.py), a few images ahead of this loop.
+    """
+    chunks = []
+    out = None
+    size = 0
+    requests = {}
+    todo = [(idx, path) for idx, path in enumerate(images) if idx not in skip]
+    stage = open_prepare_stage(settings, cache)
+    works = stage.prefetched([path for _, path in todo], max(1, int(settings.prepare_prefetch)), events, stages)
+    try:
+        for (idx, _), (img_path, work) in zip(todo, works):
+            events.emit("progress", value=idx, maximum=len(images))
+            try:
+                if isinstance(work, Exception):
+                    raise work
+                cached = lookup_cache(settings, cache, work.cache_key, img_path, events)
+                if cached is not None:
+                    meta = {}
+                    note_answer(meta, "cache")
+                    outcomes[idx] = (cached, None, meta)
+                    continue
+                cache_key = work.cache_key
+
+                prepared = work.prepared or prepare_image(
+                    img_path, settings.vision_detail.lower(), settings.upload_format, settings.upload_quality)
+                report_prepared(prepared, events)
+                line = json.dumps({
+                    "custom_id": _custom_id(idx),
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": build_request(settings, build_prompt(settings), prepared.to_data_url(), work.ocr_text),
+                }, ensure_ascii=False) + "\n"
+                del prepared, work
+            except Exception as e:
+                outcomes[idx] = (None, e, None)
+                continue
+
+            line_bytes = len(line.encode("utf-8"))
+            if out is None or size + line_bytes > MAX_BATCH_FILE_BYTES or len(requests) >= MAX_BATCH_REQUESTS:
+                if out is not None:
+                    out.close()
+                    chunks.append((out.name, requests))
+                path = os.path.join(session_path, f"batch_input_{len(chunks) + 1}.jsonl")
+                out = open(path, "w", encoding="utf-8")
+                size = 0
+                requests = {}
+            out.write(line)
+            size += line_bytes
+            requests[_custom_id(idx)] = [img_path, cache_key]
+            events.log(f"[BATCH] Queued {img_path}", "info")
+    finally:
+        stage.close()
+        if out is not None:
+            out.close()
+            if requests:
+                chunks.append((out.name, requests))
+    return chunks
+
+def _poll_until_done(transport, jobs, events, poll_interval, retries=STATUS_RETRIES, jobs_path=None):
+    """
+    Polls every batch until all are in a terminal state, reporting progress.
+    Returns {batch_id: last status dict}.
+    """
+    statuses = {}
+    total = sum(job['requests'] for job in jobs)
+    while True:
+        for job in jobs:
+            batch_id = job['batch_id']
+            previous = statuses.get(batch_id, {}).get('status')
+            if previous in TERMINAL_STATES:
+                continue
+            info = _status_with_retry(transport, batch_id, events, retries, jobs_path)
+            statuses[batch_id] = info
+            if info['status'] != previous:
+                events.log(f"[BATCH] {batch_id}: {info['status']}", "info")
+
+        done = sum(info['completed'] + info['failed'] for info in statuses.values())
+        events.emit("progress", value=done, maximum=total)
+        if all(statuses[job['batch_id']]['status'] in TERMINAL_STATES for job in jobs):
+            return statuses
+        time.sleep(poll_interval)
+
+def _status_with_retry(transport, batch_id, events, retries, jobs_path):
+    """
+    transport.status(), retried with backoff: a network blip mustn't end a wait of hours.
+    After 'retries' failures in a row the last error is raised; the batch keeps running
+    and a resumed session collects it.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return transport.status(batch_id)
+        except Exception as e:
+            if attempt == retries:
+                where = jobs_path or BATCH_JOBS_FILE
+                events.log(f"[BATCH ERROR] Can't check {batch_id}: {e}. The batch is still "
+                           f"recorded in {where}; resume the session to collect it.", "error")
+                raise
+            delay = backoff_delay(attempt)
+            events.count('retries')
+            events.log(f"[RETRY] Status of {batch_id} in {delay:.1f}s "
+                       f"(attempt {attempt + 1}/{retries}): {e}", "warn")
+            time.sleep(delay)
+
+def _read_output_file(path, job, index, events, cache, outcomes, stages=None):
+    """
+    Parses a batch output or error file of 'job' and fills 'outcomes' for each line
+    whose image is in 'index' (image path -> index in this run).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            img_path, cache_key = job['images'].get(record['custom_id'], (None, None))
+            idx = index.get(img_path)
+            if idx is None:
+                # Already recorded by the run that submitted it
+                continue
+            response = record.get('response') or {}
+            body = response.get('body') or {}
+            try:
+                if record.get('error'):
+                    raise RuntimeError(record['error'].get('message', record['error']))
+                if response.get('status_code') != 200:
+                    error = body.get('error') or {}
+                    raise RuntimeError(f"HTTP {response.get('status_code')}: {error.get('message', 'request failed')}")
+                meta = {}
+                result = record_result(_output_text(body), read_usage(body.get('usage')),
+                                       cache, cache_key, events, stages, batch=True, meta=meta)
+                outcomes[idx] = (result, None, meta)
+            except Exception as e:
+                events.log(f"[API ERROR] {record['custom_id']}: {e}", "error")
+                outcomes[idx] = (None, e, None)
+
+def _output_text(body):
+    """
+    Extracts the concatenated output text from a Responses API response body
+    (the batch equivalent of response.output_text).
+    """
+    texts = []
+    for item in body.get('output', []):
+        if item.get('type') == "message":
+            for part in item.get('content', []):
+                if part.get('type') == "output_text":
+                    texts.append(part.get('text', ""))
+    return "".join(texts)
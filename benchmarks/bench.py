@@ -0,0 +1,264 @@
+"""
+bench.py
+
+End-to-end benchmark of the headless engine (logic.run_engine) against a local fake
+Responses API (fake_server.py), e.g.:
+    python benchmarks/bench.py --images 100 --concurrency 1,4,16 --output report.json
+    python benchmarks/bench.py --baseline old-report.json --output new-report.json
+
+- Generates a synthetic corpus once (corpus.py) and reuses it
+- Runs every scenario (concurrency x feature set) in a fresh process, with its own
+  HOME so the user's config and result cache are never touched
+- Measures wall time, images/s, request latency percentiles, peak RSS and CPU time
+  (including the preparation worker processes), plus the engine's stage timings
+- Writes one JSON report whose results can be compared across versions; with
+  --baseline, prints the change against an earlier report
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from dataclasses import asdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from corpus import CorpusSpec, generate_corpus, corpus_stats
+from fake_server import FakeResponsesServer, ServerOptions
+
+REPORT_VERSION = 1
+
+# Settings changes per feature set; every scenario also gets a concurrency
+FEATURES = {
+    'baseline': {},
+    'original': {'upload_format': "Original"},
+    'low-detail': {'vision_detail': "low"},
+    'webp': {'upload_format': "WEBP"},
+    'dedup': {'dedup_enabled': True},
+    'multi-4': {'images_per_request': 4},
+    'ocr': {'ocr_enabled': True},
+    'no-metrics': {'metrics_enabled': False},
+}
+
+def _cpu_and_memory():
+    """
+    (user seconds, system seconds, own peak RSS, largest child peak RSS) so far,
+    children counted once they have exited.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows: no rusage, only our own CPU time
+        times = os.times()
+        sys.path.insert(0, ROOT)
+        from helpers import peak_rss_bytes
+        return times.user, times.system, peak_rss_bytes(), None
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    return (own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime,
+            own.ru_maxrss * scale, children.ru_maxrss * scale)
+
+def run_scenario(spec: dict) -> dict:
+    """
+    Runs one scenario in this process (called in the child, see --run-scenario).
+    """
+    sys.path.insert(0, ROOT)
+    import multiprocessing
+    from events import EventQueue
+    from logic import run_engine
+    from settings import Settings
+
+    class _Discard(EventQueue):
+        # Keep the counters, drop the events (nobody drains them here)
+        def emit(self, kind, **data):
+            pass
+
+    output = tempfile.mkdtemp(prefix="altomatic-bench-out-")
+    settings = Settings(
+        input_path=spec['corpus'],
+        input_type="Folder",
+        output_folder=output,
+        openai_api_key="benchmark",
+        api_base_url=spec['base_url'],
+        cache_bypass=True,
+        rate_limit_rpm=0,
+        rate_limit_tpm=0,
+        **spec['settings'],
+    )
+    events = _Discard()
+    start = time.perf_counter()
+    try:
+        summary = run_engine(settings, events)
+    finally:
+        wall = time.perf_counter() - start
+        # Reap the preparation workers, so their CPU time shows up under RUSAGE_CHILDREN
+        for child in multiprocessing.active_children():
+            child.join(timeout=10)
+        shutil.rmtree(output, ignore_errors=True)
+
+    user, system, peak_rss, peak_rss_children = _cpu_and_memory()
+    throughput = summary['throughput']
+    return {
+        'images': summary['processed'],
+        'failed': summary['failed'],
+        'duplicates': summary['duplicates'],
+        'wall_seconds': round(wall, 3),
+        'images_per_sec': round(summary['processed'] / wall, 3) if wall else 0.0,
+        'latency': {key: throughput[key] for key in ('p50', 'p95', 'p99')}
+                   | {'avg': round(summary['avg_latency'], 4)},
+        'cpu_user': round(user, 3),
+        'cpu_system': round(system, 3),
+        'cpu_seconds': round(user + system, 3),
+        'cpu_per_image_ms': round((user + system) * 1000 / summary['processed'], 2) if summary['processed'] else None,
+        'peak_rss': peak_rss,
+        'peak_rss_children': peak_rss_children,
+        'peak_inflight': summary['peak_inflight'],
+        'retries': summary['retries'],
+        'rate_limited': summary['rate_limited'],
+        'salvaged': summary['salvaged'],
+        'parse_retries': summary['parse_retries'],
+        'bytes_saved': summary['bytes_saved'],
+        'stages': summary['stages'],
+    }
+
+def _run_in_child(spec: dict, home: str) -> dict:
+    env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONUNBUFFERED="1")
+    env.pop("OPENAI_API_KEY", None)
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-scenario", json.dumps(spec)],
+        env=env, capture_output=True, text=True, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"scenario failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: dict, baseline: dict) -> list:
+    """
+    Lines describing how each scenario changed against 'baseline' (matched by name).
+    """
+    old = {r['scenario']: r for r in baseline.get('results', [])}
+    lines = []
+    for result in report['results']:
+        before = old.get(result['scenario'])
+        if not before:
+            continue
+
+        def change(key):
+            a, b = before.get(key), result.get(key)
+            if not a or b is None:
+                return "n/a"
+            return f"{(b - a) / a * 100:+.1f}%"
+
+        lines.append(f"{result['scenario']:<28} images/s {change('images_per_sec'):>8}  "
+                     f"CPU {change('cpu_seconds'):>8}  peak RSS {change('peak_rss'):>8}")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Altomatic against a fake Responses API.")
+    parser.add_argument("--images", type=int, default=50, help="images in the synthetic corpus")
+    parser.add_argument("--sizes", default="1024x768,3000x2000", help="image sizes, e.g. 640x480,4000x3000")
+    parser.add_argument("--formats", default="JPEG,PNG,WEBP", help="image formats to mix")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="share of near-duplicate images")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--features", default="baseline",
+                        help=f"comma-separated feature sets: {', '.join(FEATURES)}")
+    parser.add_argument("--latency", type=float, default=ServerOptions.latency, help="mean fake API latency (s)")
+    parser.add_argument("--jitter", type=float, default=ServerOptions.jitter)
+    parser.add_argument("--error-rate", type=float, default=ServerOptions.error_rate)
+    parser.add_argument("--malformed-rate", type=float, default=ServerOptions.malformed_rate,
+                        help="share of answers cut off or wrapped in prose")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario (the fastest is kept)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "altomatic-bench-corpus"))
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="an earlier report to compare against")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario))))
+        return 0
+
+    unknown = [f for f in args.features.split(",") if f not in FEATURES]
+    if unknown:
+        parser.error(f"unknown feature set(s): {', '.join(unknown)}")
+
+    spec = CorpusSpec(
+        count=args.images,
+        sizes=[[int(v) for v in size.split("x")] for size in args.sizes.split(",")],
+        formats=[f.strip().upper() for f in args.formats.split(",")],
+        duplicate_share=args.duplicates,
+    )
+    print(f"Preparing corpus {spec.key()}...", file=sys.stderr)
+    corpus = generate_corpus(spec, args.corpus_dir)
+
+    options = ServerOptions(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                            malformed_rate=args.malformed_rate)
+    report = {
+        'version': REPORT_VERSION,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'git_commit': _git_commit(),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'server': asdict(options),
+        'corpus': {**asdict(spec), **corpus_stats(corpus)},
+        'results': [],
+    }
+
+    home = tempfile.mkdtemp(prefix="altomatic-bench-home-")
+    try:
+        with FakeResponsesServer(options) as server:
+            for feature in args.features.split(","):
+                for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                    name = f"{feature}/c{concurrency}"
+                    scenario = {'corpus': corpus, 'base_url': server.base_url,
+                                'settings': {**FEATURES[feature], 'concurrency': concurrency}}
+                    runs = []
+                    for _ in range(max(1, args.repeat)):
+                        before = server.counters()
+                        result = _run_in_child(scenario, home)
+                        after = server.counters()
+                        result['server'] = {k: after[k] - before[k] for k in after}
+                        runs.append(result)
+                    best = min(runs, key=lambda r: r['wall_seconds'])
+                    report['results'].append({'scenario': name, 'settings': scenario['settings'], **best})
+                    print(f"{name:<28} {best['images_per_sec']:8.2f} images/s  "
+                          f"p95 {best['latency']['p95'] or 0:.3f}s  CPU {best['cpu_seconds']:.2f}s  "
+                          f"peak RSS {best['peak_rss'] / 2**20:.0f} MB", file=sys.stderr)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(line, file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+corpus.py
+
+Synthetic image folders for benchmarks:
+- Deterministic (seeded), so every run and every machine sees the same files
+- Mixed sizes and formats (JPEG, PNG, WebP), with noise so the files compress like photos
+  rather than flat colour
+- Optionally a share of near-duplicates (recompressed/cropped copies), to exercise
+  near-duplicate detection
+- Generated once per spec and reused from the cache folder afterwards
+"""
+
+import os
+import json
+import random
+from dataclasses import dataclass, asdict, field
+
+@dataclass
+class CorpusSpec:
+    count: int = 50
+    sizes: list = field(default_factory=lambda: [[1024, 768], [3000, 2000]])
+    formats: list = field(default_factory=lambda: ["JPEG", "PNG", "WEBP"])
+    duplicate_share: float = 0.0    # share of images that are near-copies of an earlier one
+    seed: int = 7
+
+    def key(self) -> str:
+        sizes = "_".join(f"{w}x{h}" for w, h in self.sizes)
+        formats = "-".join(f.lower() for f in self.formats)
+        return f"n{self.count}-{sizes}-{formats}-d{int(self.duplicate_share * 100)}-s{self.seed}"
+
+_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+def _draw_image(rng, size):
+    from PIL import Image, ImageDraw, ImageFilter
+
+    width, height = size
+    # Low-resolution noise, scaled up: textured like a photo, cheap to generate
+    noise = Image.effect_noise((max(8, width // 8), max(8, height // 8)), rng.uniform(30, 90))
+    img = Image.merge("RGB", [noise, noise.rotate(90, expand=False), noise.transpose(Image.FLIP_LEFT_RIGHT)])
+    img = img.resize(size, Image.BILINEAR)
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(3, 8)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randint(width // 10, width // 2), y0 + rng.randint(height // 10, height // 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+    return img.filter(ImageFilter.SMOOTH)
+
+def _save(img, path, fmt, quality):
+    if fmt == "PNG":
+        img.save(path, fmt, compress_level=6)
+    else:
+        img.save(path, fmt, quality=quality)
+
+def generate_corpus(spec: CorpusSpec, root: str) -> str:
+    """
+    Creates (or reuses) the corpus for 'spec' under 'root'. Returns its folder.
+    """
+    folder = os.path.join(root, spec.key())
+    marker = os.path.join(folder, "corpus.json")
+    if os.path.isfile(marker):
+        return folder
+    os.makedirs(folder, exist_ok=True)
+
+    rng = random.Random(spec.seed)
+    originals = []
+    for i in range(spec.count):
+        fmt = spec.formats[i % len(spec.formats)]
+        path = os.path.join(folder, f"img-{i:05d}{_EXTENSIONS[fmt]}")
+        if originals and rng.random() < spec.duplicate_share:
+            # A near-copy: an earlier image, slightly cropped and recompressed
+            source = rng.choice(originals)
+            w, h = source.size
+            img = source.crop((w // 50, h // 50, w - w // 50, h - h // 50)).resize((w, h))
+            _save(img, path, fmt, rng.randint(60, 90))
+            continue
+        img = _draw_image(rng, tuple(spec.sizes[i % len(spec.sizes)]))
+        _save(img, path, fmt, 90)
+        if spec.duplicate_share:
+            originals.append(img)
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(asdict(spec), f, indent=2)
+    return folder
+
+def corpus_stats(folder: str) -> dict:
+    files = [n for n in os.listdir(folder) if n != "corpus.json"]
+    return {
+        'files': len(files),
+        'bytes': sum(os.path.getsize(os.path.join(folder, n)) for n in files),
+    }
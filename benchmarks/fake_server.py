@@ -0,0 +1,355 @@
+"""
+fake_server.py
+
+A local stand-in for the OpenAI API, for benchmarks:
+- POST /v1/responses answers like responses.create, with a JSON name/alt text
+  (an {"images": [...]} list when the request holds several images)
+- GET /v1/models answers the connection pre-warm
+- POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches and GET /v1/batches/{id}
+  run Batch API jobs: every request line is answered as /v1/responses would, and the
+  batch completes 'batch_seconds' after it was created
+- Configurable latency (mean and jitter), error rate (500s and 429s with retry-after)
+  and token usage
+- Optionally answers a share of requests with malformed output (cut off mid-way, or
+  wrapped in prose), to exercise the local salvage parser
+- Sends the x-ratelimit-* headers the rate limiter reads
+- Reports the prompt tokens as cached when a request starts with the same text as an
+  earlier one, like the API's prompt cache
+- Counts requests, errors and request bytes, so a run can be checked against it
+Run it on its own with: python benchmarks/fake_server.py --port 8765 --latency 0.3
+"""
+
+import json
+import random
+import email.parser
+import threading
+import time
+import argparse
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+@dataclass
+class ServerOptions:
+    latency: float = 0.25           # mean seconds per request
+    jitter: float = 0.5             # latency varies by up to +/- this share of the mean
+    error_rate: float = 0.0         # share of requests that fail
+    rate_limit_share: float = 0.5   # share of the failures that are 429s (the rest are 500s)
+    malformed_rate: float = 0.0     # share of answers that are cut off or wrapped in prose
+    input_tokens: int = 900
+    prompt_tokens: int = 200        # part of input_tokens a request pays once, however many images
+    output_tokens: int = 40
+    batch_seconds: float = 0.0      # how long a batch stays in progress
+    seed: int = 1
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status, body, content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        parts = path.split("/")
+        server = self.server
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": []})
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+            with server.lock:
+                stored = server.files.get(parts[-2])
+            if stored is None:
+                self._send_json(404, {"error": {"message": "No such file"}})
+            else:
+                self._send_bytes(200, stored[1])
+        elif len(parts) >= 2 and parts[-2] == "batches":
+            with server.lock:
+                batch = server.batches.get(parts[-1])
+                payload = _batch_object(server, batch) if batch else None
+            if payload is None:
+                self._send_json(404, {"error": {"message": "No such batch"}})
+            else:
+                self._send_json(200, payload)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        path = self.path.rstrip("/")
+        if path.endswith("/responses"):
+            self._respond(body)
+        elif path.endswith("/files"):
+            self._upload(body)
+        elif path.endswith("/batches"):
+            self._create_batch(body)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _respond(self, body):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.request_bytes += len(body)
+            n = server.requests
+            delay = server.options.latency * (1 + server.rng.uniform(-server.options.jitter, server.options.jitter))
+        time.sleep(max(0.0, delay))
+        status, payload, headers = _answer(server, body, n)
+        self._send_json(status, payload, headers)
+
+    def _upload(self, body):
+        """
+        A multipart/form-data upload with 'file' and 'purpose' parts.
+        """
+        server = self.server
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + self.headers.get("Content-Type", "").encode("latin-1") + b"\r\n\r\n" + body)
+        fields = {}
+        for part in message.get_payload() if message.is_multipart() else []:
+            fields[part.get_param("name", header="content-disposition")] = part
+        if "file" not in fields:
+            self._send_json(400, {"error": {"message": "missing file"}})
+            return
+        filename = fields["file"].get_filename() or "upload.jsonl"
+        content = fields["file"].get_payload(decode=True) or b""
+        purpose = fields["purpose"].get_payload(decode=True).decode() if "purpose" in fields else "batch"
+        with server.lock:
+            file_id = f"file-{len(server.files) + 1}"
+            server.files[file_id] = (filename, content)
+        self._send_json(200, _file_object(file_id, filename, len(content), purpose))
+
+    def _create_batch(self, body):
+        """
+        Answers every request line of the input file right away; the results show
+        once the batch is done.
+        """
+        server = self.server
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = {}
+        with server.lock:
+            stored = server.files.get(request.get("input_file_id"))
+        if stored is None:
+            self._send_json(404, {"error": {"message": "No such input file"}})
+            return
+
+        output, errors = [], []
+        for line in stored[1].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = json.dumps(item.get("body") or {}).encode("utf-8")
+            with server.lock:
+                server.requests += 1
+                server.request_bytes += len(body)
+                n = server.requests
+            status, payload, _ = _answer(server, body, n)
+            record = {"id": f"batch_req_{n}", "custom_id": item.get("custom_id"),
+                      "response": {"status_code": status, "request_id": f"req_{n}", "body": payload},
+                      "error": None}
+            (output if status == 200 else errors).append(json.dumps(record))
+
+        with server.lock:
+            batch_id = f"batch_{len(server.batches) + 1}"
+            files = {}
+            for kind, lines in (("output", output), ("error", errors)):
+                if lines:
+                    file_id = f"file-{len(server.files) + 1}"
+                    server.files[file_id] = (f"{batch_id}_{kind}.jsonl", ("\n".join(lines) + "\n").encode("utf-8"))
+                    files[kind] = file_id
+            server.batches[batch_id] = {
+                "id": batch_id,
+                "input_file_id": request["input_file_id"],
+                "endpoint": request.get("endpoint", "/v1/responses"),
+                "completion_window": request.get("completion_window", "24h"),
+                "created_at": int(time.time()),
+                "ready_at": time.monotonic() + server.options.batch_seconds,
+                "files": files,
+                "counts": {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)},
+            }
+            payload = _batch_object(server, server.batches[batch_id])
+        self._send_json(200, payload)
+
+def _answer(server, body: bytes, n: int) -> tuple:
+    """
+    (status, response body, headers) for the n-th /v1/responses request.
+    """
+    options = server.options
+    with server.lock:
+        fail = server.rng.random() < options.error_rate
+        rate_limited = fail and server.rng.random() < options.rate_limit_share
+        malformed = server.rng.random() < options.malformed_rate
+
+    limit_headers = {
+        "x-ratelimit-limit-requests": "10000",
+        "x-ratelimit-remaining-requests": "9999",
+        "x-ratelimit-limit-tokens": "10000000",
+        "x-ratelimit-remaining-tokens": "9990000",
+    }
+    if fail:
+        with server.lock:
+            server.errors += 1
+        if rate_limited:
+            return (429, {"error": {"message": "Rate limit reached (fake)", "type": "requests"}},
+                    {**limit_headers, "retry-after-ms": "200"})
+        return 500, {"error": {"message": "Internal error (fake)", "type": "server_error"}}, limit_headers
+
+    try:
+        request = json.loads(body)
+    except ValueError:
+        request = {}
+    model = request.get("model", "fake")
+    images = sum(1 for message in request.get("input", []) for part in message.get("content", [])
+                 if part.get("type") == "input_image")
+    if images > 1:
+        answer = json.dumps({"images": [
+            {"index": i, "name": f"benchmark image {n} {i}", "alt": f"A synthetic benchmark image, number {n}.{i}."}
+            for i in range(images)
+        ]})
+    else:
+        answer = json.dumps({"name": f"benchmark image {n}", "alt": f"A synthetic benchmark image, number {n}."})
+    if malformed:
+        # Alternate between the two ways real answers go wrong
+        answer = answer[:len(answer) - 12] if n % 2 else f"Here is the JSON:\n```json\n{answer}\n```"
+    images = max(1, images)
+    content = (request.get("input") or [{}])[0].get("content") or [{}]
+    prefix = content[0].get("text", "")
+    with server.lock:
+        cached_tokens = options.prompt_tokens if prefix in server.prefixes else 0
+        server.prefixes.add(prefix)
+    input_tokens = options.prompt_tokens + (options.input_tokens - options.prompt_tokens) * images
+    output_tokens = options.output_tokens * images
+    total = input_tokens + output_tokens
+    return 200, {
+        "id": f"resp_{n}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [{
+            "type": "message",
+            "id": f"msg_{n}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": answer, "annotations": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": total,
+        },
+    }, limit_headers
+
+def _file_object(file_id, filename, size, purpose):
+    return {"id": file_id, "object": "file", "bytes": size, "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed"}
+
+def _batch_object(server, batch) -> dict:
+    """
+    The Batch object as the API returns it: in progress until ready_at, then completed.
+    """
+    done = time.monotonic() >= batch["ready_at"]
+    counts = batch["counts"] if done else {"total": batch["counts"]["total"], "completed": 0, "failed": 0}
+    return {
+        "id": batch["id"],
+        "object": "batch",
+        "endpoint": batch["endpoint"],
+        "input_file_id": batch["input_file_id"],
+        "completion_window": batch["completion_window"],
+        "status": "completed" if done else "in_progress",
+        "output_file_id": batch["files"].get("output") if done else None,
+        "error_file_id": batch["files"].get("error") if done else None,
+        "created_at": batch["created_at"],
+        "request_counts": counts,
+    }
+
+class FakeResponsesServer:
+    """
+    Runs the fake API on a daemon thread. Use as a context manager, or start()/stop().
+    base_url is what Settings.api_base_url should be set to.
+    """
+
+    def __init__(self, options: ServerOptions = None, host: str = "127.0.0.1", port: int = 0):
+        self.options = options or ServerOptions()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.options = self.options
+        self._httpd.lock = threading.Lock()
+        self._httpd.rng = random.Random(self.options.seed)
+        self._httpd.requests = self._httpd.errors = self._httpd.request_bytes = 0
+        self._httpd.prefixes = set()
+        self._httpd.files = {}          # file id -> (filename, content)
+        self._httpd.batches = {}        # batch id -> batch state
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def counters(self) -> dict:
+        with self._httpd.lock:
+            return {'requests': self._httpd.requests, 'errors': self._httpd.errors,
+                    'request_bytes': self._httpd.request_bytes, 'batches': len(self._httpd.batches)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI Responses API for benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=ServerOptions.latency)
+    parser.add_argument("--jitter", type=float, default=ServerOptions.jitter)
+    parser.add_argument("--error-rate", type=float, default=ServerOptions.error_rate)
+    parser.add_argument("--malformed-rate", type=float, default=ServerOptions.malformed_rate)
+    parser.add_argument("--input-tokens", type=int, default=ServerOptions.input_tokens)
+    parser.add_argument("--output-tokens", type=int, default=ServerOptions.output_tokens)
+    parser.add_argument("--batch-seconds", type=float, default=ServerOptions.batch_seconds)
+    args = parser.parse_args()
+    options = ServerOptions(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                            malformed_rate=args.malformed_rate,
+                            input_tokens=args.input_tokens, output_tokens=args.output_tokens,
+                            batch_seconds=args.batch_seconds)
+    server = FakeResponsesServer(options, port=args.port)
+    print(f"Fake Responses API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
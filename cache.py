@@ -0,0 +1,133 @@
+"""
+cache.py
+
+Persistent, content-addressed cache of describe_image() results:
+- Stored in a SQLite file next to the Altomatic config
+- Keyed by a hash of the image bytes plus every prompt input that affects the answer
+  (model, languages, name detail level, vision detail, upload format and quality,
+  OCR text, and a hash of the prompt and answer schema themselves)
+- Evicts entries by age and by total size
+- Counts hits and misses for the current session
+- Safe to share between worker threads
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.request import pathname2url
+
+from config import CONFIG_FILE
+
+CACHE_FILE = os.path.join(os.path.dirname(CONFIG_FILE), ".altomatic_cache.sqlite3")
+
+# Bump when the cached result format (or how keys are built) changes
+CACHE_VERSION = 2
+
+def make_cache_key(image_hash: str, prompt_inputs: dict) -> str:
+    """
+    Combines the image hash with the prompt inputs into a single cache key.
+    """
+    payload = json.dumps(
+        {"v": CACHE_VERSION, "image": image_hash, "inputs": prompt_inputs},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cache_contains(key: str, path: str = CACHE_FILE) -> bool:
+    """
+    Checks whether 'key' is cached, through a separate read-only connection, so it can
+    be called from worker processes. Doesn't count as a hit or touch last_used.
+    """
+    try:
+        conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return False
+    try:
+        return conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+class ResultCache:
+    """
+    A small SQLite-backed key/value store for model results.
+    'max_mb' caps the stored result size, 'max_age_days' drops entries not used for that long.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_mb: float = 50, max_age_days: float = 90):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns the cached result for 'key' (and marks it as used), or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        """
+        Stores (or replaces) the result for 'key'.
+        """
+        data = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        Removes entries unused for longer than max_age, then the least recently
+        used entries until the total size fits in max_bytes. Returns how many were removed.
+        """
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM results WHERE last_used < ?", (time.time() - self.max_age,)
+            ).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                doomed = []
+                for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                self._conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+                removed += len(doomed)
+            self._conn.commit()
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
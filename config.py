@@ -5,6 +5,7 @@ Handles saving and loading Altomatic's configuration:
 - Stores user preferences (Tesseract path, encrypted OpenAI API key, etc.)
 - Excludes temporary input paths
 - Supports resetting to defaults
+- Reads numeric settings safely from the UI, clamped to their ranges
 - Provides simple obfuscation for the API key
 - Allows opening config folder
 """
@@ -43,6 +44,8 @@ def deobfuscate_api_key(ciphertext: str) -> str:
 DEFAULT_CONFIG = {
     'custom_output_path': "",
     'output_folder_option': "Same as input",
+    'output_strategy': "copy",        # "copy", "hardlink", "reflink", "symlink" or "rename" (in place)
+    'result_formats': "",             # machine-readable result files: "jsonl", "csv", "sqlite", comma-separated
     'openai_api_key': "",  # will be obfuscated on disk
     'window_geometry': "900x600",
     'filename_language': "English",
@@ -54,8 +57,77 @@ DEFAULT_CONFIG = {
     'tesseract_path': "",
     'ocr_language': "eng",
     'ui_theme': "Light",
+    'monitor_max_lines': 5000,        # log lines the Monitor keeps (older ones are dropped)
+    'monitor_level': "Debug",         # lowest level the Monitor shows: Debug, Info, Warnings, Errors
+    'monitor_verbose': False,         # also keep the model's raw output for every image
+    'concurrency': 4,                 # number of API requests kept in flight
+    'images_per_request': 1,          # images packed into one API request (Sync mode, max 10)
+    'http_pool_size': 8,              # max pooled keep-alive connections to the API
+    'http_timeout': 60,               # read timeout per request, in seconds
+    'http2_enabled': False,           # needs 'pip install httpx[http2]'
+    'cache_bypass': False,            # skip cache lookups (fresh results are still stored)
+    'cache_max_mb': 50,               # size cap for the result cache
+    'cache_max_age_days': 90,         # drop cached results unused for this long
+    'upload_format': "JPEG",          # "JPEG", "WEBP", or "Original" (send files untouched)
+    'upload_quality': 85,             # re-encode quality for JPEG/WEBP uploads
+    'max_inflight_mb': 512,           # memory budget for image payloads in flight (0 = unlimited)
+    'prepare_workers': 2,             # processes that load, OCR and re-encode images
+    'prepare_prefetch': 8,            # images prepared ahead of the API requests
+    'dedup_enabled': False,           # send one image per group of near-duplicates
+    'dedup_hash': "phash",            # "ahash", "dhash" or "phash"
+    'dedup_distance': 6,              # max differing bits (of 64) to count as a near-duplicate
+    'metrics_enabled': True,          # time each stage and write metrics.json per session
+    'metrics_textfile': "",           # also write a Prometheus textfile here (empty = off)
+    'processing_mode': "Sync",        # "Sync" (interactive) or "Batch" (OpenAI Batch API, half price)
+    'api_base_url': "",               # empty = official OpenAI endpoint
+    'rate_limit_rpm': 500,            # requests per minute (0 = only what the API headers report)
+    'rate_limit_tpm': 200000,         # tokens per minute (0 = only what the API headers report)
+    'max_retries': 5,                 # retries for 429s, 5xx and connection errors
+    'budget_tokens': 0,               # stop sending requests after this many tokens per run (0 = no cap)
+    'budget_cost': 0.0,               # ... or after this much estimated spend per run, in USD (0 = no cap)
+    'scan_recursive': False,          # also process images in subfolders
+    'scan_include': "",               # glob patterns a file must match, comma-separated (empty = all images)
+    'scan_exclude': "",               # glob patterns for files/folders to skip, comma-separated
+    'scan_symlinks': "files",         # "skip", "files" (follow links to files only), or "follow"
 }
 
+# Allowed range of each numeric setting (the same as its spinbox in the UI)
+NUMERIC_RANGES = {
+    'monitor_max_lines': (100, 1000000),
+    'concurrency': (1, 32),
+    'images_per_request': (1, 10),
+    'http_pool_size': (1, 64),
+    'http_timeout': (5, 600),
+    'cache_max_mb': (1, 10000),
+    'cache_max_age_days': (1, 3650),
+    'upload_quality': (30, 100),
+    'max_inflight_mb': (0, 16384),
+    'prepare_workers': (1, 32),
+    'prepare_prefetch': (0, 256),
+    'dedup_distance': (0, 32),
+    'rate_limit_rpm': (0, 100000),
+    'rate_limit_tpm': (0, 100000000),
+    'max_retries': (0, 20),
+    'budget_tokens': (0, 1000000000),
+    'budget_cost': (0.0, 100000.0),
+}
+
+def read_setting(state, key, fallback=None):
+    """
+    Reads state[key], clamping a numeric setting to NUMERIC_RANGES.
+    If the widget holds something that isn't a number (a spinbox can be typed into),
+    returns 'fallback' instead, or DEFAULT_CONFIG[key] without one.
+    """
+    try:
+        value = state[key].get()
+        if key in NUMERIC_RANGES:
+            low, high = NUMERIC_RANGES[key]
+            value = max(low, min(type(low)(value), high))
+    except Exception:
+        # tkinter.TclError (e.g. "expected floating-point number"), ValueError
+        return DEFAULT_CONFIG[key] if fallback is None else fallback
+    return value
+
 def load_config():
     """
     Loads the config from disk, or returns defaults if not found/broken.
@@ -79,7 +151,9 @@ def save_config(state, geometry):
     """
     Saves the relevant config keys to disk.
     Obfuscates the openai_api_key, excludes ephemeral values like input path.
+    A number field left holding text keeps its last saved value.
     """
+    saved = load_config()
     data = {}
     for key in DEFAULT_CONFIG:
         if key == 'window_geometry':
@@ -88,7 +162,7 @@ def save_config(state, geometry):
             plain = state['openai_api_key'].get()
             data['openai_api_key'] = obfuscate_api_key(plain)
         else:
-            data[key] = state[key].get()
+            data[key] = read_setting(state, key, saved.get(key))
 
     try:
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -0,0 +1,196 @@
+"""
+dedup.py
+
+Near-duplicate detection, an optional pre-pass before any image is sent:
+- Computes a 64-bit perceptual hash per image (aHash, dHash or pHash), with NumPy,
+  in a pool of worker processes; JPEGs are decoded at reduced size, since the hash
+  only needs a tiny thumbnail
+- Groups images whose hashes are within a Hamming distance of each other: each image
+  joins the nearest earlier representative within the distance, or becomes one itself,
+  so a cluster never drifts away from its first image through a chain of small steps
+- Only representatives are described by the model; the engine gives every member
+  its representative's result
+- Writes the clusters to clusters.json in the session folder
+Needs numpy; without it the engine skips this pass and logs why.
+"""
+
+import os
+import json
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+CLUSTERS_FILE = "clusters.json"
+
+HASH_METHODS = ("ahash", "dhash", "phash")
+
+# Side of the thumbnail each method looks at
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+_dct_matrix = None
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+@dataclass
+class Cluster:
+    """
+    One representative and the near-duplicates that will reuse its result.
+    'members' holds (path, distance) pairs in input order.
+    """
+    representative: str
+    members: list = field(default_factory=list)
+
+def _thumbnail(path: str, size: tuple):
+    """
+    The image as a float grayscale array of 'size' (width, height).
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as img:
+        # Lets the JPEG decoder skip most of the pixels (a no-op for other formats)
+        img.draft("L", (size[0] * 4, size[1] * 4))
+        small = img.convert("L").resize(size, Image.Resampling.LANCZOS)
+        return np.asarray(small, dtype=np.float32)
+
+def _pack(bits) -> int:
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def _dct_rows():
+    """
+    The first HASH_SIZE rows of the PHASH_SIZE-point DCT-II matrix, which is all
+    the low-frequency corner of the 2D transform needs.
+    """
+    global _dct_matrix
+    if _dct_matrix is None:
+        import numpy as np
+        k = np.arange(HASH_SIZE)[:, None]
+        n = np.arange(PHASH_SIZE)[None, :]
+        _dct_matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * PHASH_SIZE))
+    return _dct_matrix
+
+def image_hash(path: str, method: str = "phash") -> int:
+    """
+    Returns the 64-bit perceptual hash of an image.
+    - ahash: 8x8 thumbnail, pixel brighter than the mean
+    - dhash: 9x8 thumbnail, pixel brighter than its left neighbour
+    - phash: 32x32 thumbnail, low-frequency DCT coefficient above their median
+    """
+    if method == "ahash":
+        pixels = _thumbnail(path, (HASH_SIZE, HASH_SIZE))
+        return _pack(pixels > pixels.mean())
+    if method == "dhash":
+        pixels = _thumbnail(path, (HASH_SIZE + 1, HASH_SIZE))
+        return _pack(pixels[:, 1:] > pixels[:, :-1])
+    if method == "phash":
+        import numpy as np
+        pixels = _thumbnail(path, (PHASH_SIZE, PHASH_SIZE))
+        dct = _dct_rows()
+        coeffs = dct @ pixels @ dct.T
+        # The DC term is the overall brightness; leave it out of the median
+        median = np.median(coeffs.ravel()[1:])
+        return _pack(coeffs > median)
+    raise ValueError(f"Unknown hash method: {method}")
+
+def _hash_worker(path: str, method: str):
+    try:
+        return image_hash(path, method), None
+    except Exception as e:
+        return None, str(e)
+
+def hash_images(paths: list, method: str, workers: int) -> list:
+    """
+    Hashes 'paths' in a process pool (a thread pool if processes can't be started).
+    Returns (hash or None, error or None) per path, in order.
+    """
+    workers = max(1, int(workers))
+    chunk = max(1, len(paths) // (workers * 4))
+    try:
+        # Spawned, like the preparation pool (prepare.PrepareStage)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    except (OSError, NotImplementedError):
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        return list(pool.map(_hash_worker, paths, [method] * len(paths), chunksize=chunk))
+
+def hamming_distances(hashes, value: int):
+    """
+    Bit differences between 'value' and every hash in a uint64 array.
+    """
+    import numpy as np
+    xor = hashes ^ np.uint64(value)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+def cluster_hashes(paths: list, hashes: list, max_distance: int) -> list:
+    """
+    Groups 'paths' (in input order) by their hashes. A path whose hash is None
+    (it couldn't be read) stays on its own, so the normal run reports the error.
+    Returns the clusters in order of their representatives.
+    """
+    import numpy as np
+
+    clusters = []
+    rep_hashes = np.zeros(max(1, len(paths)), dtype=np.uint64)
+    rep_clusters = []
+    for path, value in zip(paths, hashes):
+        if value is not None and rep_clusters:
+            distances = hamming_distances(rep_hashes[:len(rep_clusters)], value)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= max_distance:
+                rep_clusters[nearest].members.append((path, int(distances[nearest])))
+                continue
+        cluster = Cluster(path)
+        clusters.append(cluster)
+        if value is not None:
+            rep_hashes[len(rep_clusters)] = value
+            rep_clusters.append(cluster)
+    return clusters
+
+def find_clusters(paths: list, method: str = "phash", max_distance: int = 6,
+                  workers: int = 2, on_error=None) -> list:
+    """
+    Hashes and clusters 'paths'. on_error(path, message) is called for images that
+    couldn't be hashed (they are kept as their own cluster).
+    """
+    results = hash_images(paths, method, workers)
+    hashes = []
+    for path, (value, error) in zip(paths, results):
+        if error and on_error:
+            on_error(path, error)
+        hashes.append(value)
+    return cluster_hashes(paths, hashes, max_distance)
+
+def write_clusters(session_path: str, clusters: list, method: str, max_distance: int):
+    """
+    Records the clusters that have members in the session's clusters.json.
+    A resumed session adds its clusters to the ones already there.
+    """
+    path = os.path.join(session_path, CLUSTERS_FILE)
+    entries = []
+    if os.path.isfile(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get('clusters', [])
+        except (OSError, ValueError):
+            entries = []
+    entries.extend(
+        {
+            'representative': c.representative,
+            'members': [{'path': p, 'distance': d} for p, d in c.members],
+        }
+        for c in clusters if c.members
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({'hash': method, 'max_distance': max_distance, 'clusters': entries},
+                  f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -6,8 +6,7 @@ Adds drag-and-drop support for input image/folder entry in Altomatic.
 
 import os
 from tkinterdnd2 import DND_FILES
-from helpers import get_image_count_in_folder
-from ui_components import append_monitor_colored
+from ui_components import append_monitor_colored, refresh_image_count
 
 def configure_drag_and_drop(root, state):
     """
@@ -32,9 +31,8 @@ def _handle_input_drop(event, state):
         if os.path.isdir(clean_path):
             state['input_type'].set("Folder")
             state['input_path'].set(clean_path)
-            count = get_image_count_in_folder(clean_path)
-            state['image_count'].set(f"{count} image(s) found.")
-            append_monitor_colored(state, f"[DRAGDROP] Folder dropped: {clean_path} ({count} images)", "info")
+            refresh_image_count(state, "{count} image(s) found.")
+            append_monitor_colored(state, f"[DRAGDROP] Folder dropped: {clean_path}", "info")
             return
 
         elif os.path.isfile(clean_path):
@@ -64,6 +62,5 @@ def _handle_input_drop(event, state):
 
             state['input_type'].set("Folder")
             state['input_path'].set(drop_folder)
-            count = get_image_count_in_folder(drop_folder)
-            state['image_count'].set(f"{count} image(s) dropped.")
+            refresh_image_count(state, "{count} image(s) dropped.")
             append_monitor_colored(state, f"[DRAGDROP] {len(input_files)} files => {drop_folder}", "info")
@@ -0,0 +1,180 @@
+"""
+estimate.py
+
+Pre-flight estimates and the spending cap of a run:
+- Works out each image's vision tokens from its header alone (no decode): its size,
+  the vision detail tile math and what the upload format will resize it to
+- Adds the prompt and the expected answers per request, and projects the cost
+  (see ai_handler.PRICES_PER_MILLION) and the duration at the configured concurrency
+  and rate limits
+- RunBudget is the hard token/cost cap a run checks before sending each request,
+  so it stops dispatching cleanly instead of failing images
+"""
+
+import math
+import threading
+
+from ai_handler import build_prompt, token_cost, EXPECTED_OUTPUT_TOKENS, MODEL
+from imaging import image_header_size, estimate_upload_tokens
+from runstats import format_duration
+
+# Seconds one request is assumed to take, for duration estimates
+ASSUMED_LATENCY = 3.0
+
+def image_tokens(settings, path: str) -> int:
+    """
+    Image tokens 'path' will cost once prepared. Reads only its header.
+    Raises OSError if it can't be read as an image.
+    """
+    width, height = image_header_size(path)
+    return estimate_upload_tokens(width, height, settings.vision_detail.lower(), settings.upload_format)
+
+def request_tokens(settings, tokens_per_image: list) -> tuple:
+    """
+    (input tokens, output tokens) of one request for images of these token counts:
+    the prompt (~4 characters per token), the images and one typical answer each.
+    OCR text isn't known before preparation and isn't counted.
+    """
+    prompt = build_prompt(settings, len(tokens_per_image))
+    return len(prompt) // 4 + sum(tokens_per_image), EXPECTED_OUTPUT_TOKENS * len(tokens_per_image)
+
+def project(settings, tokens_per_image: list, per_request: int, concurrency: int,
+            latency: float = ASSUMED_LATENCY) -> dict:
+    """
+    Projects a run over images of these token counts: requests, tokens, cost (USD) and
+    duration (seconds; None in Batch mode, which completes within 24 hours).
+    'limited_by' says what sets the pace: "concurrency", "rpm", "tpm" or "batch".
+    Assumes nothing comes from the result cache or the prompt cache, so it errs high.
+    """
+    batch = settings.processing_mode == "Batch"
+    if batch:
+        per_request = 1
+    groups = [tokens_per_image[i:i + per_request] for i in range(0, len(tokens_per_image), per_request)]
+
+    input_tokens = output_tokens = 0
+    for group in groups:
+        tokens_in, tokens_out = request_tokens(settings, group)
+        input_tokens += tokens_in
+        output_tokens += tokens_out
+    total_tokens = input_tokens + output_tokens
+
+    estimate = {
+        'model': MODEL,
+        'images': len(tokens_per_image),
+        'requests': len(groups),
+        'image_tokens': sum(tokens_per_image),
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': total_tokens,
+        'cost': round(token_cost(input_tokens, output_tokens, batch=batch), 4),
+        'seconds': None,
+        'limited_by': "batch",
+        'assumed_latency': latency,
+    }
+    if batch:
+        return estimate
+
+    # Whichever is slowest sets the pace
+    bounds = {'concurrency': math.ceil(len(groups) / max(1, concurrency)) * latency}
+    if settings.rate_limit_rpm:
+        bounds['rpm'] = len(groups) / settings.rate_limit_rpm * 60
+    if settings.rate_limit_tpm:
+        bounds['tpm'] = total_tokens / settings.rate_limit_tpm * 60
+    limited_by = max(bounds, key=bounds.get)
+    estimate['seconds'] = round(bounds[limited_by], 1)
+    estimate['limited_by'] = limited_by
+    return estimate
+
+def format_estimate(estimate: dict) -> list:
+    """
+    Human-readable lines for an estimate from project() (plus 'unreadable', if set).
+    """
+    lines = [
+        f"Images: {estimate['images']}"
+        + (f" ({estimate['unreadable']} unreadable, not counted)" if estimate.get('unreadable') else ""),
+        f"Requests: {estimate['requests']}",
+        f"Tokens: ~{estimate['total_tokens']:,} ({estimate['image_tokens']:,} for images, "
+        f"{estimate['output_tokens']:,} for answers)",
+        f"Cost: ~${estimate['cost']:.{2 if estimate['cost'] >= 1 else 4}f} ({estimate['model']}"
+        + (", Batch API price" if estimate['limited_by'] == "batch" else "") + ")",
+    ]
+    if estimate['seconds'] is None:
+        lines.append("Duration: up to 24 h (Batch API)")
+    else:
+        pace = {'concurrency': f"{estimate['assumed_latency']:.0f}s per request assumed",
+                'rpm': "requests/minute limit", 'tpm': "tokens/minute limit"}[estimate['limited_by']]
+        lines.append(f"Duration: ~{format_duration(estimate['seconds'])} ({pace})")
+    return lines
+
+class RunBudget:
+    """
+    Hard token and cost cap for one run (0 = no cap). Before each request the engine
+    reserves its estimated tokens and cost; what was really used comes from the run's
+    counters ('tokens' and 'cost', see ai_handler). As requests finish, reservations are
+    scaled by how far the estimates fell short of the real usage so far. Once a request
+    would go over, the budget is exhausted and stays so. Safe to share between threads.
+    """
+
+    def __init__(self, max_tokens: int, max_cost: float, events, batch: bool = False):
+        self.max_tokens = max(0, int(max_tokens or 0))
+        self.max_cost = max(0.0, float(max_cost or 0))
+        self.events = events
+        self.batch = batch
+        self.exhausted = False
+        self._reserved_tokens = 0
+        self._reserved_cost = 0.0
+        self._released_tokens = 0   # estimates of the finished requests, for calibration
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_tokens or self.max_cost)
+
+    def try_acquire(self, input_tokens: int, output_tokens: int) -> tuple | None:
+        """
+        Reserves a request's estimated tokens and cost. Returns the reservation
+        (pass it to release() when the request is over), or None if it would go over.
+        """
+        if not self.enabled:
+            return (0, 0.0, 0)
+        counters = self.events.counters()
+        with self._lock:
+            if self.exhausted:
+                return None
+            # Never scale below the estimate: cache hits make usage look low, not estimates high
+            estimate = input_tokens + output_tokens
+            scale = max(1.0, counters.get('tokens', 0) / self._released_tokens) if self._released_tokens else 1.0
+            tokens = round(estimate * scale)
+            cost = token_cost(input_tokens, output_tokens, batch=self.batch) * scale
+            over_tokens = (self.max_tokens and
+                           counters.get('tokens', 0) + self._reserved_tokens + tokens > self.max_tokens)
+            over_cost = (self.max_cost and
+                         counters.get('cost', 0.0) + self._reserved_cost + cost > self.max_cost)
+            if over_tokens or over_cost:
+                self.exhausted = True
+                return None
+            self._reserved_tokens += tokens
+            self._reserved_cost += cost
+            return (tokens, cost, estimate)
+
+    def release(self, reservation: tuple):
+        """
+        Gives a reservation back once its request is over (its real usage is in the
+        counters by then).
+        """
+        tokens, cost, estimate = reservation
+        with self._lock:
+            self._reserved_tokens -= tokens
+            self._reserved_cost -= cost
+            self._released_tokens += estimate
+
+    def describe(self) -> str:
+        """
+        The caps, e.g. "200,000 tokens / $1.50".
+        """
+        caps = []
+        if self.max_tokens:
+            caps.append(f"{self.max_tokens:,} tokens")
+        if self.max_cost:
+            caps.append(f"${self.max_cost:.{2 if self.max_cost >= 1 else 4}f}")
+        return " / ".join(caps) or "none"
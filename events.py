@@ -0,0 +1,100 @@
+"""
+events.py
+
+Thread-safe channel between the processing engine and the UI:
+- The engine (running on a background thread) posts log lines, progress,
+  token counts and the final summary as events
+- The UI drains the queue from the Tk main loop via root.after
+- Run-wide counters (bytes saved, etc.) are kept alongside, for the end-of-run summary
+- Nothing in here touches Tk, so it is safe to use from any thread
+- JsonLinesEvents writes the same events to a stream as JSON lines instead,
+  for the headless command line (altomatic.py)
+"""
+
+import sys
+import json
+import queue
+import threading
+import time
+
+class EventQueue:
+    """
+    A FIFO of (kind, data) events.
+    Known kinds:
+      'log'      -> message, level ('raw' for the model's raw output)
+      'progress' -> value, maximum
+      'tokens'   -> used, cached (input tokens from the prompt cache)
+      'limiter'  -> rate limiter snapshot (see ratelimit.RateLimiter.snapshot)
+      'stages'   -> stages (see stages.StageTimes.snapshot)
+      'stats'    -> stats (see runstats.RunStats.snapshot)
+      'estimate' -> estimate (see logic.run_estimate)
+      'alert'    -> level ('info'/'warn'/'error'), title, message
+      'finished' -> summary (dict or None)
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._counters = {}
+        self._counters_lock = threading.Lock()
+
+    def emit(self, kind: str, **data):
+        """
+        Posts an event. Safe to call from any thread.
+        """
+        self._queue.put((kind, data))
+
+    def log(self, message: str, level: str = "info"):
+        """
+        Shortcut for a 'log' event, mirroring append_monitor_colored().
+        """
+        self.emit("log", message=message, level=level)
+
+    def drain(self, limit: int = 500):
+        """
+        Returns up to 'limit' pending events without blocking.
+        """
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def count(self, name: str, amount=1):
+        """
+        Adds 'amount' to a run-wide counter. Safe to call from any thread.
+        """
+        with self._counters_lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self) -> dict:
+        """
+        Returns a copy of all run-wide counters.
+        """
+        with self._counters_lock:
+            return dict(self._counters)
+
+class JsonLinesEvents(EventQueue):
+    """
+    Writes every event straight to 'stream' (stdout by default) as one JSON object
+    per line: {"event": kind, "time": unix seconds, ...data}. Nothing is queued.
+    """
+
+    def __init__(self, stream=None, kinds=None):
+        super().__init__()
+        self._stream = stream if stream is not None else sys.stdout
+        self._kinds = set(kinds) if kinds else None
+        self._write_lock = threading.Lock()
+
+    def emit(self, kind: str, **data):
+        if self._kinds is not None and kind not in self._kinds:
+            return
+        line = json.dumps({'event': kind, 'time': round(time.time(), 3), **data},
+                          ensure_ascii=False, default=str)
+        with self._write_lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def drain(self, limit: int = 500):
+        return []
@@ -2,18 +2,22 @@
 helpers.py
 
 Utility functions for Altomatic:
-1. Converting an image file to a base64 data URL
+1. Converting an in-memory or memory-mapped buffer to a base64 data URL in a single pass
 2. Generating a short random ID (for folder or filename)
 3. Creating session folder names with timestamp and random ID
 4. Generating output filename with timestamp and random ID
-5. Counting images in a folder
-6. Resolving the user-chosen output folder
-7. Slugify function for converting a text into a safe filename
-8. Extracting text from an image with Tesseract OCR
+5. Resolving the user-chosen output folder
+6. Slugify function for converting a text into a safe filename
+7. Extracting text from an image with Tesseract OCR
+8. Reading (and resetting) the process's peak memory usage
+9. Picking a filename that doesn't collide with one already in a folder
+
+(Finding the images to process lives in scanner.py.)
 """
 
 import os
-import base64
+import sys
+import binascii
 from datetime import datetime
 import random
 import string
@@ -24,14 +28,29 @@ def generate_short_id(length=4):
     """
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
-def image_to_base64(path):
-    """
-    Converts the given image file to a base64-encoded data URL for sending to the OpenAI vision model.
-    """
-    ext = os.path.splitext(path)[1].lower().replace('.', '')
-    with open(path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:image/{ext};base64,{encoded}"
+# Encode in slices that are a multiple of 3 bytes, so no slice needs padding
+_B64_CHUNK = 3 * 256 * 1024
+
+def buffer_to_data_url(buffer, mime):
+    """
+    Base64-encodes 'buffer' (bytes, memoryview or mmap) into a data URL.
+    The encoded text is written once into a preallocated buffer that already holds the
+    'data:' prefix, so the only full-size copies are that buffer and the final str.
+    """
+    prefix = f"data:{mime};base64,".encode("ascii")
+    size = len(buffer)
+    out = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+    out[:len(prefix)] = prefix
+    pos = len(prefix)
+    view = memoryview(buffer)
+    try:
+        for start in range(0, size, _B64_CHUNK):
+            chunk = binascii.b2a_base64(view[start:start + _B64_CHUNK], newline=False)
+            out[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    finally:
+        view.release()
+    return out.decode("ascii")
 
 def generate_session_folder_name():
     """
@@ -49,30 +68,6 @@ def generate_output_filename():
     stamp = datetime.now().strftime("%Y-%m-%d-%H-%M")
     return f"altomatic-output-{stamp}-{generate_short_id()}.txt"
 
-def get_image_count_in_folder(folder):
-    """
-    Counts how many valid images (png, jpg, jpeg, webp) exist in a folder.
-    """
-    if not os.path.isdir(folder):
-        return 0
-    return len([
-        f for f in os.listdir(folder)
-        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
-    ])
-
-def get_all_images(folder):
-    """
-    Returns a list of valid images in the specified folder,
-    ignoring non-image files and subfolders.
-    """
-    if not os.path.isdir(folder):
-        return []
-    return [
-        os.path.join(folder, f)
-        for f in os.listdir(folder)
-        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
-    ]
-
 def get_output_folder(state):
     """
     Resolves which folder to use for output, based on user preferences.
@@ -106,9 +101,22 @@ def slugify(text):
     text = re.sub(r'[-\s]+', '-', text)
     return text
 
+def unique_filename(folder, base_name, ext):
+    """
+    Returns base_name + ext, or base_name-2 + ext, base_name-3 + ext, ... if that
+    file already exists in 'folder'.
+    """
+    name = f"{base_name}{ext}"
+    n = 1
+    while os.path.exists(os.path.join(folder, name)):
+        n += 1
+        name = f"{base_name}-{n}{ext}"
+    return name
+
 def extract_text_from_image(image_path, tesseract_path="", lang="eng"):
     """
     Uses Tesseract OCR to extract text from an image.
+    'image_path' may also be an already opened PIL image (see imaging.LoadedImage).
     If tesseract_path is provided, sets it as the pytesseract command path.
     The 'lang' parameter is the Tesseract language code, e.g. 'eng', 'fas', etc.
     Returns the extracted text, or an error message starting with '⚠️ OCR failed:'.
@@ -118,8 +126,63 @@ def extract_text_from_image(image_path, tesseract_path="", lang="eng"):
         import pytesseract
         if tesseract_path:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
-        image = Image.open(image_path)
+        image = Image.open(image_path) if isinstance(image_path, str) else image_path
         text = pytesseract.image_to_string(image, lang=lang)
         return text.strip()
     except Exception as e:
         return f"⚠️ OCR failed: {e}"
+
+def reset_peak_rss():
+    """
+    Resets the kernel's peak-RSS counter for this process, so the next
+    peak_rss_bytes() covers only what follows. Best effort: Linux only.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident memory of this process in bytes, or 0 if unknown.
+    """
+    try:
+        if os.name == 'nt':
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+            return 0
+
+        if os.path.exists("/proc/self/status"):
+            # VmHWM honours reset_peak_rss(), unlike getrusage()
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS reports bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return 0
@@ -0,0 +1,258 @@
+"""
+imaging.py
+
+Prepares images for upload to the vision model:
+- LoadedImage memory-maps a file and decodes it at most once, so hashing, OCR,
+  resizing and encoding all share one copy, released explicitly afterwards
+- An image sent as is ("Original") is carried by its path and mapped again only while
+  its data URL is built, so a very large original is never held as a bytes object
+- Resizes to the largest size the chosen vision detail level can actually use
+  ("low" = 512px, "high"/"auto" = fit 2048px then 768px short side, snapped to 512px tiles)
+- Re-encodes to a compact JPEG or WebP at a configurable quality
+- Estimates vision tokens before/after, so savings can be reported, and from the
+  header alone, for pre-flight cost estimates
+- Estimates how much memory preparing and sending an image will hold, for the in-flight budget
+"""
+
+import io
+import os
+import math
+import mmap
+import hashlib
+from dataclasses import dataclass
+
+from helpers import buffer_to_data_url
+
+LOW_DETAIL_SIZE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+TILE_SIZE = 512
+
+# Shave at most this many pixels off a side to avoid paying for a nearly empty tile
+TILE_SNAP_PX = 64
+
+# Vision token pricing for tiled detail: a base cost plus a cost per 512px tile
+BASE_TOKENS = 85
+TOKENS_PER_TILE = 170
+
+UPLOAD_FORMATS = ("JPEG", "WEBP", "Original")
+
+class LoadedImage:
+    """
+    One image file, memory-mapped rather than read into a bytes object: hashing and
+    decoding read it from the mapping, and the pixels are decoded (lazily, on first
+    use of .image) at most once.
+    Call release() as soon as the image is no longer needed, or use it in a with block.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # An empty file can't be mapped
+                self.data = b""
+        self._image = None
+
+    @property
+    def image(self):
+        """
+        The PIL image. Opening only parses the header; the pixels are decoded
+        by the first operation that needs them and then kept.
+        """
+        if self._image is None:
+            from PIL import Image
+            # The mapping is a file object; a BytesIO would copy it
+            self._image = Image.open(self.data if self.data else io.BytesIO(self.data))
+        return self._image
+
+    @property
+    def mime(self) -> str:
+        ext = os.path.splitext(self.path)[1].lower().replace('.', '')
+        return f"image/{ext}"
+
+    def sha256(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    def release(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+@dataclass
+class PreparedImage:
+    """
+    The payload to upload (encoded file bytes, not yet base64) plus what preprocessing saved.
+    An original sent as is has no payload, only the 'path' it is read from when sent.
+    """
+    payload: bytes
+    mime: str
+    original_bytes: int
+    sent_bytes: int
+    original_size: tuple
+    sent_size: tuple
+    tokens_before: int
+    tokens_after: int
+    path: str | None = None
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.sent_bytes
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def to_data_url(self) -> str:
+        """
+        Base64 data URL for the request. Builds a new string each call.
+        """
+        if self.payload is None:
+            with LoadedImage(self.path) as loaded:
+                return buffer_to_data_url(loaded.data, self.mime)
+        return buffer_to_data_url(self.payload, self.mime)
+
+def target_size(width: int, height: int, detail: str, snap_to_tiles: bool = True) -> tuple:
+    """
+    Returns the largest (width, height) the model will use at this detail level.
+    With snap_to_tiles, a side that only just spills into another 512px tile is
+    shrunk slightly so that tile isn't paid for. Never upscales.
+    """
+    if detail == "low":
+        scale = min(1.0, LOW_DETAIL_SIZE / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    # "high" (and "auto", which may pick high): fit in 2048x2048, then short side <= 768
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    scale = min(scale, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+
+    if snap_to_tiles:
+        for side in (width, height):
+            scaled = side * scale
+            overhang = scaled % TILE_SIZE
+            if scaled > TILE_SIZE and 0 < overhang <= TILE_SNAP_PX:
+                scale = min(scale, (scaled - overhang) / side)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def estimate_vision_tokens(width: int, height: int, detail: str) -> int:
+    """
+    Estimates image input tokens for an image of this size from the tile math:
+    low detail is a flat base cost, high/auto cost the base plus a share per 512px
+    tile of the image after the model's own downscaling.
+    """
+    if detail == "low":
+        return BASE_TOKENS
+    w, h = target_size(width, height, detail, snap_to_tiles=False)
+    tiles = math.ceil(w / TILE_SIZE) * math.ceil(h / TILE_SIZE)
+    return BASE_TOKENS + TOKENS_PER_TILE * tiles
+
+def prepare_image(source, detail: str, fmt: str = "JPEG", quality: int = 85) -> PreparedImage:
+    """
+    Resizes the image for 'detail' and re-encodes it as 'fmt' ("JPEG"/"WEBP").
+    Sends the original file instead when fmt is "Original" or re-encoding wouldn't help.
+    'source' is a LoadedImage (reused as is, not released) or a path.
+    """
+    if isinstance(source, str):
+        with LoadedImage(source) as loaded:
+            return prepare_image(loaded, detail, fmt, quality)
+
+    from PIL import Image, ImageOps
+
+    original_bytes = len(source.data)
+    img = source.image
+    original_size = img.size
+    tokens_before = estimate_vision_tokens(*original_size, detail)
+
+    if fmt == "Original":
+        return _as_original(source, original_size, tokens_before)
+
+    new_size = target_size(*original_size, detail)
+    resized = new_size != original_size
+
+    img = ImageOps.exif_transpose(img)
+    if img.size != original_size:
+        # exif_transpose swapped the sides
+        new_size = (new_size[1], new_size[0])
+    if img.size != new_size:
+        img = img.resize(new_size, Image.LANCZOS)
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if fmt == "JPEG" and has_alpha:
+        # JPEG has no alpha: flatten onto white
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=int(quality))
+    del img
+    encoded = buffer.getvalue()
+
+    if not resized and len(encoded) >= original_bytes:
+        # Nothing gained: keep the original file
+        return _as_original(source, original_size, tokens_before)
+
+    tokens_after = estimate_vision_tokens(*new_size, detail)
+    return PreparedImage(encoded, f"image/{fmt.lower()}", original_bytes, len(encoded),
+                         original_size, new_size, tokens_before, tokens_after)
+
+def estimate_payload_memory(path: str, fmt: str) -> int:
+    """
+    Rough upper bound of the memory an image holds while it is prepared and sent.
+    Only the image header is read. Re-encoding is dominated by the decoded pixels;
+    sending the original by its base64 text held as buffer, str and request body.
+    """
+    file_size = os.path.getsize(path)
+    base64_size = 4 * ((file_size + 2) // 3)
+    if fmt == "Original":
+        return 3 * base64_size
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            width, height = img.size
+            bands = len(img.getbands())
+    except Exception:
+        return 3 * base64_size
+    return width * height * max(bands, 3) * 2 + file_size
+
+def image_header_size(path: str) -> tuple:
+    """
+    (width, height) of an image file, from its header only (no pixels are decoded).
+    Raises OSError if the file can't be read as an image.
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        return img.size
+
+def estimate_upload_tokens(width: int, height: int, detail: str, fmt: str) -> int:
+    """
+    Image tokens an image of this size will cost once prepare_image() has resized it
+    (or not, for "Original"), without preparing it.
+    """
+    if fmt == "Original":
+        return estimate_vision_tokens(width, height, detail)
+    return estimate_vision_tokens(*target_size(width, height, detail), detail)
+
+def payload_memory(prepared: PreparedImage) -> int:
+    """
+    Memory held by a prepared payload until its request completes:
+    the encoded bytes, plus the data URL str and the serialized request body.
+    """
+    return prepared.sent_bytes + 2 * 4 * ((prepared.sent_bytes + 2) // 3)
+
+def _as_original(loaded, size, tokens):
+    return PreparedImage(None, loaded.mime, len(loaded.data), len(loaded.data),
+                         size, size, tokens, tokens, path=loaded.path)
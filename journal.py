@@ -0,0 +1,156 @@
+"""
+journal.py
+
+Crash-safe record of a session's progress, kept next to its outputs:
+- journal.jsonl in the session folder, append-only, one JSON object per line
+- The first line describes the run (input, scan options, output file), so a session
+  can be resumed from its folder alone
+- One line per finished image, written as soon as its result is saved: 'done' with the
+  name/alt text, or 'failed' with the error
+- Lines are flushed immediately and fsync'ed at least every FSYNC_SECONDS, so a crash or
+  a sleeping laptop loses at most the last moment of work; a torn last line is ignored
+- Sessions from before the journal can still be retried from their failed.log
+"""
+
+import os
+import json
+import time
+import threading
+from dataclasses import asdict
+
+JOURNAL_FILE = "journal.jsonl"
+FAILED_LOG = "failed.log"
+FSYNC_SECONDS = 1.0
+
+# Settings a resumed run takes from the journal instead of the current UI/CLI values,
+# so it sees the same set of images
+RESUME_KEYS = ('input_path', 'input_type', 'scan_recursive', 'scan_include',
+               'scan_exclude', 'scan_symlinks', 'result_formats')
+
+class Journal:
+    """
+    Appends records to a session's journal.jsonl. Safe to share between threads.
+    """
+
+    def __init__(self, session_path: str):
+        self.path = os.path.join(session_path, JOURNAL_FILE)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+    def _append(self, record: dict):
+        record['time'] = round(time.time(), 3)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._last_sync >= FSYNC_SECONDS:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+
+    def start(self, settings, output_file: str):
+        """
+        Writes the header of a new session.
+        """
+        options = asdict(settings)
+        options.pop('openai_api_key', None)
+        self._append({'type': "session", 'output_file': output_file, 'settings': options})
+
+    def resumed(self, retry_failures: bool):
+        self._append({'type': "resume", 'retry_failures': retry_failures})
+
+    def done(self, img_path: str, name: str, alt: str, renamed: str, output_path: str = None):
+        record = {'type': "image", 'path': img_path, 'status': "done",
+                  'name': name, 'alt': alt, 'renamed': renamed}
+        if output_path:
+            record['output_path'] = output_path
+        self._append(record)
+
+    def failed(self, img_path: str, error):
+        self._append({'type': "image", 'path': img_path, 'status': "failed", 'error': str(error)})
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+class SessionState:
+    """
+    What a session's journal (or failed.log) says about it.
+    'images' maps each path to its latest record, in the order they were first recorded.
+    """
+
+    def __init__(self, header=None, images=None):
+        self.header = header or {}
+        self.images = images or {}
+
+    @property
+    def settings(self) -> dict:
+        return self.header.get('settings', {})
+
+    @property
+    def output_file(self):
+        return self.header.get('output_file')
+
+    def done(self) -> set:
+        return {path for path, rec in self.images.items() if rec['status'] == "done"}
+
+    def failed(self) -> list:
+        return [path for path, rec in self.images.items() if rec['status'] == "failed"]
+
+    def outputs(self) -> set:
+        """
+        Where done images were placed; after an in-place rename these are in the input
+        folder, and a resumed scan must not pick them up as new images.
+        """
+        return {rec['output_path'] for rec in self.images.values()
+                if rec['status'] == "done" and rec.get('output_path')}
+
+def has_journal(session_path: str) -> bool:
+    return os.path.isfile(os.path.join(session_path, JOURNAL_FILE))
+
+def read_session(session_path: str) -> SessionState:
+    """
+    Reads a session folder's journal.jsonl, falling back to failed.log for sessions
+    written before there was a journal. Raises FileNotFoundError if neither exists.
+    """
+    journal_path = os.path.join(session_path, JOURNAL_FILE)
+    if os.path.isfile(journal_path):
+        header, images = None, {}
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash; everything before it is intact
+                    continue
+                if record.get('type') == "session" and header is None:
+                    header = record
+                elif record.get('type') == "image":
+                    images[record['path']] = record
+        return SessionState(header, images)
+
+    failed_log = os.path.join(session_path, FAILED_LOG)
+    if os.path.isfile(failed_log):
+        images = {}
+        with open(failed_log, "r", encoding="utf-8") as f:
+            for line in f:
+                path, _, error = line.rstrip("\n").partition(" :: ")
+                if path:
+                    images[path] = {'path': path, 'status': "failed", 'error': error}
+        return SessionState(None, images)
+
+    raise FileNotFoundError(f"No {JOURNAL_FILE} or {FAILED_LOG} in {session_path}")
+
+def rewrite_failed_log(session_path: str, state: SessionState):
+    """
+    Replaces failed.log with the images that are still failed according to 'state',
+    so retried images that succeeded drop off the list.
+    """
+    tmp_path = os.path.join(session_path, FAILED_LOG + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for path in state.failed():
+            f.write(f"{path} :: {state.images[path].get('error', '')}\n")
+    os.replace(tmp_path, os.path.join(session_path, FAILED_LOG))
@@ -3,136 +3,698 @@ logic.py
 
 Coordinates the main loop of image processing in Altomatic:
 - Iterates over the images specified by the user
-- Calls describe_image() from ai_handler
-- Saves results in a new session folder
+- Calls describe_image() from ai_handler, keeping several requests in flight
+- Saves results in a new session folder, streaming one record per image to the
+  chosen machine-readable result files (see records.py)
 - Tracks total token usage
-- Optionally keeps a global image count
+
+This is the headless engine: it runs on a settings.Settings object and reports
+through an events.EventQueue, and never imports tkinter. The GUI drives it from
+ui_runner.py, the command line from altomatic.py.
 """
 
 import os
-import shutil
-from tkinter import messagebox
-from ai_handler import describe_image
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ai_handler import describe_image, describe_images, prewarm_client, open_prepare_stage
+from batch import run_batch
+from cache import ResultCache
+from membudget import ByteBudget
+from ratelimit import RateLimiter
+from settings import Settings
+from events import EventQueue
+from journal import Journal, read_session, rewrite_failed_log, FAILED_LOG, RESUME_KEYS
+from imaging import estimate_payload_memory, payload_memory
+from stages import StageTimes, NullStageTimes
+from outputs import OutputWriter
+from records import ResultWriters, parse_formats
+from metrics import build_metrics, write_metrics_json, write_prometheus_textfile
+from runstats import RunStats
+from estimate import RunBudget, image_tokens, request_tokens, project, format_estimate
+from dedup import find_clusters, write_clusters, numpy_available
+from scanner import BackgroundScan, iter_images, parse_patterns, is_session_folder
 from helpers import (
-    get_all_images,
-    get_output_folder,
     generate_session_folder_name,
     generate_output_filename,
-    slugify
+    slugify,
+    reset_peak_rss,
+    peak_rss_bytes
 )
-from ui_components import append_monitor_colored
 
-def process_images(state):
+MAX_CONCURRENCY = 32
+
+# Most images packed into one request (settings.images_per_request)
+MAX_IMAGES_PER_REQUEST = 10
+
+# How often the submit loop checks for newly scanned images while requests are in flight
+SCAN_POLL_SECONDS = 0.2
+
+def run_engine(settings: Settings, events: EventQueue, paths: list = None):
     """
-    Processes the images indicated by state['input_path'] and state['input_type'].
-    1) Resolves the images to be processed (single file or entire folder).
+    Processes the images indicated by settings.input_path and settings.input_type.
+    1) Starts scanning for the images to process (single file, or a folder, see scanner.py),
+       or takes exactly 'paths', if given (watch mode, see watcher.py): those are sent
+       even if a resumed session already has them (a file replaced since).
     2) Creates a session folder, including a 'renamed_images' subfolder.
-    3) For each image, calls describe_image(), saves the renamed copy, logs usage.
-    4) Summarizes results in a text file, and logs them to the monitor and a messagebox.
-    5) If 'global_images_count' is present, increments it by the number of processed images.
-    """
-
-    # Check for API Key
-    api_key = state['openai_api_key'].get().strip()
-    if not api_key:
-        append_monitor_colored(state, "[ERROR] Missing API Key.", "error")
-        messagebox.showerror("Missing API Key", "Please enter your OpenAI API key in the Settings tab.")
-        return
-
-    # Validate input path
-    in_path = state['input_path'].get()
-    if not os.path.exists(in_path):
-        append_monitor_colored(state, "[ERROR] Input path does not exist.", "error")
-        messagebox.showerror("Invalid Input", "Input path does not exist.")
-        return
-
-    # Gather images (single or multiple)
-    if state['input_type'].get() == "File":
-        images = [in_path]
-    else:
-        images = get_all_images(in_path)
-    if not images:
-        append_monitor_colored(state, "[WARN] No valid images found.", "warn")
-        messagebox.showwarning("No Images", "No valid image files found.")
-        return
+    3) Sends up to 'concurrency' images to describe_image() at once. Results are
+       written (renamed copy + summary entry) in input order, whatever order they finish in.
+       Images are submitted as the scan finds them, so large folders start right away.
+    4) Summarizes results in a text file (and in the settings.result_formats result
+       files, one record per image as it is saved) and reports progress/logs through 'events'.
+    In "Batch" processing mode, step 3 goes through the Batch API instead (see batch.py).
+    With settings.dedup_enabled, the whole scan is hashed first and only one image per
+    group of near-duplicates is sent; the others get copies of its result (see dedup.py).
+
+    Every saved result is also recorded in the session's journal (see journal.py).
+    With settings.resume_session, the run continues that session instead: images its
+    journal already has are skipped (or, with settings.retry_failures, only its failed
+    images are re-run) and results are appended to the same outputs.
 
-    append_monitor_colored(state, f"[INFO] Found {len(images)} images to process.", "info")
+    Returns a summary dict (processed, session_path, output_file), or None if there was nothing to do.
+    """
+    resume = None
+    if settings.resume_session:
+        resume, settings = _load_resume(settings, events)
 
-    # Reset total tokens for this run
-    state['total_tokens'].set(0)
+    # Find images (single or multiple), in the background
+    scan = _start_scan(settings, events, resume, paths)
+    if not scan.wait_for_first():
+        if resume:
+            events.log("[RESUME] Nothing left to process in this session.", "info")
+            events.emit("alert", level="info", title="Nothing to Resume",
+                        message="Every image of this session has already been processed.")
+        else:
+            events.log("[WARN] No valid images found.", "warn")
+            events.emit("alert", level="warn", title="No Images", message="No valid image files found.")
+        return None
 
-    # Create session folder
-    base_output_folder = get_output_folder(state)
-    session_name = generate_session_folder_name()
-    session_path = os.path.join(base_output_folder, session_name)
+    if resume:
+        session_path = settings.resume_session
+        txt_file_path = _find_output_file(session_path, resume)
+    else:
+        # Create session folder
+        session_name = generate_session_folder_name()
+        session_path = os.path.join(settings.output_folder, session_name)
+        txt_file_path = os.path.join(session_path, generate_output_filename())
     os.makedirs(session_path, exist_ok=True)
-    append_monitor_colored(state, f"[INFO] Session folder: {session_path}", "info")
+    events.log(f"[INFO] Session folder: {session_path}", "info")
 
     renamed_folder = os.path.join(session_path, "renamed_images")
     os.makedirs(renamed_folder, exist_ok=True)
+    outputs = OutputWriter(settings.output_strategy, renamed_folder, session_path, events)
+    records = ResultWriters(parse_formats(settings.result_formats), session_path, events)
 
-    txt_file_path = os.path.join(session_path, generate_output_filename())
-    log_file_path = os.path.join(session_path, "failed.log")
+    log_file_path = os.path.join(session_path, FAILED_LOG)
 
-    # Setup progress bar
-    state['progress_bar']['maximum'] = len(images)
-    state['progress_bar']['value'] = 0
+    journal = Journal(session_path)
+    if not (resume and resume.header):
+        journal.start(settings, os.path.basename(txt_file_path))
+    if resume:
+        journal.resumed(settings.retry_failures)
 
-    # Possibly track global images
-    if 'global_images_count' not in state:
-        from tkinter import IntVar
-        state['global_images_count'] = IntVar(value=0)
+    # Stage timings; with metrics off nothing is recorded
+    stages = StageTimes() if settings.metrics_enabled else NullStageTimes()
+    source_scan = scan
 
-    with open(txt_file_path, "w", encoding="utf-8") as txt_f, open(log_file_path, "w", encoding="utf-8") as log_f:
-        for idx, img_path in enumerate(images):
-            try:
-                append_monitor_colored(state, f"[PROCESS] Analyzing {img_path}", "info")
-                result = describe_image(state, img_path)
+    clusters = {}   # representative -> [(near-duplicate path, distance)]
+    if settings.dedup_enabled:
+        scan, clusters = _dedup_prepass(settings, scan, events, session_path, stages)
 
-                # Validate model response
-                if not result or "name" not in result or "alt" not in result:
-                    raise ValueError("Invalid or empty response from the model.")
+    events.emit("progress", value=0, maximum=scan.found)
 
-                # Construct new filename from 'name'
-                base_name = slugify(result['name'])[:100]
-                if not base_name:
-                    base_name = f"image-{idx+1}"
+    try:
+        cache = ResultCache(max_mb=settings.cache_max_mb, max_age_days=settings.cache_max_age_days)
+    except Exception as e:
+        events.log(f"[WARN] Result cache unavailable: {e}", "warn")
+        cache = None
+    if cache and settings.cache_bypass:
+        events.log("[CACHE] Bypass enabled: every image goes to the API (results are still stored).", "warn")
 
-                ext = os.path.splitext(img_path)[1].lower()
-                new_name = f"{base_name}{ext}"
-                new_path = os.path.join(renamed_folder, new_name)
+    # Payload memory budget shared by all workers (backpressure on huge images)
+    budget = ByteBudget(settings.max_inflight_mb * 1024 * 1024)
+    # Hard token/cost cap: past it, nothing more is sent and the rest stays resumable
+    spend = RunBudget(settings.budget_tokens, settings.budget_cost, events,
+                      batch=settings.processing_mode == "Batch")
+    if spend.enabled:
+        events.log(f"[BUDGET] This run stops sending requests at {spend.describe()}.", "info")
+    reset_peak_rss()
+    live = RunStats()
+    images = []     # paths in input order, filled as the scan delivers them
 
-                # Copy (or rename) the file
-                shutil.copy(img_path, new_path)
+    # A resumed session appends to its existing outputs
+    mode = "a" if resume else "w"
+    with open(txt_file_path, mode, encoding="utf-8") as txt_f, \
+            open(log_file_path, mode, encoding="utf-8") as log_f:
 
-                # Write to the summary text file
-                txt_f.write(f"[Original: {os.path.basename(img_path)}]\n")
-                txt_f.write(f"Name: {base_name}\n")
-                txt_f.write(f"Alt: {result['alt']}\n\n")
+        def write(idx, result, error, meta=None):
+            duplicates = clusters.get(images[idx], ())
+            failed = _write_result(events, idx, images[idx], result, error, outputs,
+                                   txt_f, log_f, journal, records, meta, duplicates, stages)
+            live.finished(1 + len(duplicates), failed)
 
-                append_monitor_colored(state, f"[SUCCESS] -> {new_name}", "success")
+        try:
+            if settings.processing_mode == "Batch":
+                events.log("[INFO] Batch mode: requests are submitted to the Batch API and collected when done.", "info")
+                # Every request goes into the batch files anyway, so wait for the full list
+                images.extend(scan)
+                events.log(f"[INFO] Found {len(images)} images to process.", "info")
+                if spend.enabled:
+                    _trim_to_budget(settings, images, events, spend)
+                outcomes = run_batch(settings, images, events, session_path, cache, stages=stages)
+                for idx in range(len(images)):
+                    write(idx, *outcomes[idx])
+                _emit_stats(events, live, 0, 0)
+                events.emit("progress", value=len(images), maximum=len(images))
+            else:
+                _run_sync(settings, scan, images, events, cache, budget, live, stages, write, spend)
+        finally:
+            journal.close()
+            outputs.close()
+            records.close()
 
-            except Exception as e:
-                log_f.write(f"{img_path} :: {e}\n")
-                append_monitor_colored(state, f"[FAIL] {img_path} :: {e}", "error")
-                print(f"⚠️ Failed to process {img_path}: {e}")
-
-            # Update progress
-            state['progress_bar']['value'] = idx + 1
-            state['progress_bar'].update_idletasks()
-
-    # Update global count
-    old_count = state['global_images_count'].get()
-    new_count = old_count + len(images)
-    state['global_images_count'].set(new_count)
-
-    total_tokens = state['total_tokens'].get()
-    msg = (
-        f"✅ Processed {len(images)} image(s).\n"
-        f"Session folder: {session_path}\n"
-        f"Output file: {os.path.basename(txt_file_path)}\n\n"
-        f"Token usage this run: {total_tokens}\n"
-        f"Total images analyzed overall: {new_count}"
+    if scan.error:
+        events.log(f"[WARN] Scanning stopped early: {scan.error}", "warn")
+    stages.add('scan', source_scan.seconds)
+
+    if resume:
+        # Images that failed before and succeeded now drop off failed.log
+        rewrite_failed_log(session_path, read_session(session_path))
+
+    cache_hits = cache_misses = 0
+    if cache:
+        cache_hits, cache_misses = cache.hits, cache.misses
+        events.log(f"[CACHE] {cache_hits} hit(s), {cache_misses} miss(es) this run", "info")
+        try:
+            evicted = cache.evict()
+            if evicted:
+                events.log(f"[CACHE] Evicted {evicted} old entries", "info")
+        finally:
+            cache.close()
+
+    # A budget stop trims `images` to what was sent; only those clusters got their result
+    sent = set(images)
+    duplicates = sum(len(members) for rep, members in clusters.items() if rep in sent)
+    unsent = 0
+    if spend.exhausted:
+        unsent = max(0, scan.found - len(images)) + sum(
+            len(members) for rep, members in clusters.items() if rep not in sent)
+    throughput = live.summary(events.counters().get('tokens', 0))
+    summary = {
+        'processed': len(images) + duplicates,
+        'duplicates': duplicates,
+        'failed': events.counters().get('failed', 0),
+        'skipped': _skipped_count(settings, resume) if paths is None else 0,
+        'session_path': session_path,
+        'output_file': txt_file_path,
+        'result_files': records.paths,
+        'avg_latency': throughput.pop('avg_latency'),
+        'cache_hits': cache_hits,
+        'cache_misses': cache_misses,
+        'bytes_saved': events.counters().get('bytes_saved', 0),
+        'bytes_written': outputs.bytes_written,
+        'output_methods': dict(outputs.methods),
+        'image_tokens_saved': events.counters().get('image_tokens_saved', 0),
+        'peak_rss': peak_rss_bytes(),
+        'peak_inflight': budget.peak,
+        'retries': events.counters().get('retries', 0),
+        'rate_limited': events.counters().get('rate_limited', 0),
+        'salvaged': events.counters().get('salvaged', 0),
+        'parse_retries': events.counters().get('parse_retries', 0),
+        'cached_tokens': events.counters().get('cached_tokens', 0),
+        'cost': round(events.counters().get('cost', 0.0), 4),
+        'budget_stopped': spend.exhausted,
+        # Found but not sent because of the budget (at least: the scan may have been cut short)
+        'unsent': unsent,
+        'stages': stages.snapshot(),
+        'throughput': throughput,
+    }
+    if settings.metrics_enabled:
+        _export_metrics(settings, summary, events, session_path)
+    return summary
+
+def run_estimate(settings: Settings, events: EventQueue) -> dict | None:
+    """
+    A dry run: finds the images run_engine() would process (same scan, same resume
+    rules), reads only their headers, and projects the tokens, cost and duration of
+    processing them (see estimate.py). Nothing is sent and no session is created.
+    Near-duplicates and cache hits aren't known without decoding, so they are counted
+    as requests: the estimate errs high.
+
+    Returns the estimate dict (estimate.project, plus 'unreadable'), or None if there
+    are no images.
+    """
+    resume = None
+    if settings.resume_session:
+        resume, settings = _load_resume(settings, events)
+    scan = _start_scan(settings, events, resume)
+    if not scan.wait_for_first():
+        events.log("[WARN] No valid images found.", "warn")
+        return None
+
+    def header_tokens(path):
+        try:
+            return image_tokens(settings, path)
+        except Exception:
+            return None
+
+    events.log("[ESTIMATE] Reading image headers...", "info")
+    tokens, unreadable = [], 0
+    # Header reads are I/O-bound, so a few threads keep slow disks busy
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for count in pool.map(header_tokens, scan):
+            if count is None:
+                unreadable += 1
+            else:
+                tokens.append(count)
+            if (len(tokens) + unreadable) % 500 == 0:
+                events.emit("progress", value=len(tokens) + unreadable, maximum=scan.found)
+    events.emit("progress", value=scan.found, maximum=scan.found)
+
+    per_request = max(1, min(int(settings.images_per_request), MAX_IMAGES_PER_REQUEST))
+    concurrency = max(1, min(int(settings.concurrency), MAX_CONCURRENCY))
+    estimate = project(settings, tokens, per_request, concurrency)
+    estimate['unreadable'] = unreadable
+    for line in format_estimate(estimate):
+        events.log(f"[ESTIMATE] {line}", "info")
+    return estimate
+
+def _export_metrics(settings, summary, events, session_path):
+    """
+    Writes metrics.json into the session folder and, if configured, the Prometheus textfile.
+    A failure here is only a warning; the run itself is done.
+    """
+    metrics = build_metrics(summary, events.counters(), settings)
+    try:
+        write_metrics_json(session_path, metrics)
+        if settings.metrics_textfile:
+            write_prometheus_textfile(settings.metrics_textfile, metrics)
+    except OSError as e:
+        events.log(f"[WARN] Couldn't write metrics: {e}", "warn")
+
+def _load_resume(settings, events):
+    """
+    Reads the journal (or failed.log) of settings.resume_session.
+    Returns (journal.SessionState, settings with the session's input and scan options).
+    """
+    resume = read_session(settings.resume_session)
+    recorded = {key: resume.settings[key] for key in RESUME_KEYS if key in resume.settings}
+    settings = settings.with_changes(**recorded)
+    if not settings.retry_failures and not resume.header:
+        raise ValueError("This session has no journal to resume from; only its failures can be retried.")
+    events.log(f"[RESUME] {len(resume.done())} image(s) done and {len(resume.failed())} failed "
+               f"in {settings.resume_session}", "info")
+    return resume, settings
+
+def _skipped_count(settings, resume) -> int:
+    """
+    Images of a resumed session this run left alone: everything its journal has, or,
+    when retrying failures, only the done ones (the failures are being re-run).
+    """
+    if not resume:
+        return 0
+    if settings.retry_failures:
+        return len(resume.done())
+    return len(resume.images)
+
+def _find_output_file(session_path, resume):
+    """
+    The summary txt a resumed session appends to: the one its journal names, else
+    the session's existing altomatic-output-*.txt, else a new one.
+    """
+    if resume.output_file:
+        return os.path.join(session_path, resume.output_file)
+    existing = sorted(name for name in os.listdir(session_path)
+                      if name.startswith("altomatic-output-") and name.endswith(".txt"))
+    return os.path.join(session_path, existing[0] if existing else generate_output_filename())
+
+def _start_scan(settings, events, resume=None, paths=None):
+    """
+    Starts a scanner.BackgroundScan over the input, with the scan settings, or over
+    'paths' if given. When resuming, images the session already recorded are left
+    out (but not given 'paths', which the caller wants done again); when retrying
+    failures, only the session's failed images are scanned.
+    """
+    if resume and settings.retry_failures:
+        failed = resume.failed()
+        missing = [path for path in failed if not os.path.isfile(path)]
+        for path in missing:
+            events.log(f"[WARN] Can't retry {path}: the file is gone", "warn")
+        return BackgroundScan([path for path in failed if path not in missing])
+
+    if paths is not None:
+        outputs = resume.outputs() if resume else ()
+        return BackgroundScan([p for p in paths if p not in outputs])
+    skip = set(resume.images) | resume.outputs() if resume else ()
+    if settings.input_type == "File":
+        return BackgroundScan([p for p in [settings.input_path] if p not in skip])
+
+    def on_error(path, error):
+        events.log(f"[WARN] Can't read folder {path}: {error}", "warn")
+
+    paths = iter_images(
+        settings.input_path,
+        recursive=settings.scan_recursive,
+        include=parse_patterns(settings.scan_include),
+        exclude=parse_patterns(settings.scan_exclude),
+        symlinks=settings.scan_symlinks,
+        prune=is_session_folder,
+        on_error=on_error,
     )
-    append_monitor_colored(state, "[PROCESS END] " + msg.replace("\n"," | "), "info")
-    messagebox.showinfo("Done", msg)
+    return BackgroundScan(path for path in paths if path not in skip)
+
+def _dedup_prepass(settings, scan, events, session_path, stages):
+    """
+    Waits for the whole scan and groups near-duplicate images (see dedup.py).
+    Returns (a scan over the representatives only, {representative: members}).
+    """
+    if not numpy_available():
+        events.log("[WARN] Near-duplicate detection needs numpy ('pip install numpy'); "
+                   "sending every image.", "warn")
+        return scan, {}
+
+    paths = list(scan)
+    if scan.error:
+        events.log(f"[WARN] Scanning stopped early: {scan.error}", "warn")
+    events.log(f"[DEDUP] Hashing {len(paths)} image(s) ({settings.dedup_hash}, "
+               f"distance <= {settings.dedup_distance})...", "info")
+
+    def on_error(path, error):
+        events.log(f"[WARN] Can't hash {path}: {error}", "warn")
+
+    start = time.perf_counter()
+    with stages.timed('hash'):
+        found = find_clusters(paths, settings.dedup_hash, int(settings.dedup_distance),
+                              workers=settings.prepare_workers, on_error=on_error)
+    duplicates = sum(len(c.members) for c in found)
+    events.log(f"[DEDUP] {len(found)} distinct image(s); {duplicates} near-duplicate(s) will reuse "
+               f"their result ({time.perf_counter() - start:.1f}s)", "info")
+    write_clusters(session_path, found, settings.dedup_hash, int(settings.dedup_distance))
+    return (BackgroundScan([c.representative for c in found]),
+            {c.representative: c.members for c in found if c.members})
+
+def _emit_stats(events, live, in_flight, remaining):
+    events.emit("stats", stats=live.snapshot(events.counters().get('tokens', 0), in_flight, remaining))
+
+def _run_sync(settings, scan, images, events, cache, budget, live, stages, write, spend):
+    """
+    The interactive mode: keeps up to 'concurrency' describe_image() calls in flight
+    and calls write(idx, result, error, meta) for each image, in input order.
+    Paths are taken from 'scan' as they are found and appended to 'images'.
+    Each image is first loaded, OCR'd and re-encoded by the preparation stage (a process
+    pool, see prepare.py), up to 'prepare_prefetch' images ahead of the requests, so that
+    work overlaps them. Its payload memory is reserved from 'budget' before it starts.
+    With settings.images_per_request > 1, images go out in groups of that many per
+    request (see ai_handler.describe_images).
+    Each request first reserves its estimated tokens and cost from 'spend' (an
+    estimate.RunBudget); once that is exhausted nothing more is sent, and images not
+    sent yet are dropped from 'images', so a resumed session picks them up.
+    """
+    concurrency = max(1, min(int(settings.concurrency), MAX_CONCURRENCY))
+    per_request = max(1, min(int(settings.images_per_request), MAX_IMAGES_PER_REQUEST))
+    events.log(f"[INFO] Running with {concurrency} parallel request(s)"
+               + (f" of up to {per_request} images each." if per_request > 1 else "."), "info")
+    prewarm_client(settings, events)
+
+    # Shared RPM/TPM scheduler; the response headers refine the configured limits
+    limiter = RateLimiter(settings.rate_limit_rpm, settings.rate_limit_tpm)
+
+    stage = open_prepare_stage(settings, cache)
+    prefetch = max(0, int(settings.prepare_prefetch))
+    events.log(f"[INFO] Preparing images with {stage.workers} worker(s), up to {prefetch} ahead.", "info")
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = {}        # future -> indices of the images in its request
+            in_flight = 0       # images in 'pending'
+            queued = deque()    # (index, preparation future, reserved bytes, image tokens) not yet sent
+            finished = {}       # index -> (result, error, meta), waiting for earlier images
+            next_write = 0
+            scan_done = False
+            held = None         # (path, estimate, image tokens) found but waiting for payload budget
+
+            while True:
+                # Take what the scan found and start preparing it, up to 'prefetch' images
+                # beyond those in flight and as far as the payload budget allows;
+                # only block on the scan when there is nothing else to do
+                while not scan_done and in_flight + len(queued) < concurrency * per_request + prefetch:
+                    if held is None:
+                        try:
+                            img_path = scan.take(block=not pending and len(queued) < per_request)
+                        except StopIteration:
+                            scan_done = True
+                            events.log(f"[INFO] Found {len(images)} images to process.", "info")
+                            break
+                        if img_path is None:
+                            break
+                        held = (img_path, _payload_estimate(settings, img_path),
+                                _token_estimate(settings, img_path) if spend.enabled else 0)
+                    reserved = budget.try_acquire(held[1])
+                    if reserved is None:
+                        break
+                    images.append(held[0])
+                    queued.append((len(images) - 1, stage.submit(held[0]), reserved, held[2]))
+                    held = None
+
+                # Keep up to 'concurrency' requests in flight; a request waits for a full
+                # group of images unless no more can come soon
+                while queued and len(pending) < concurrency:
+                    if len(queued) < per_request and pending and not scan_done and held is None:
+                        break
+                    group = [queued.popleft() for _ in range(min(per_request, len(queued)))]
+                    allowance = spend.try_acquire(*request_tokens(settings, [g[3] for g in group]))
+                    if allowance is None:
+                        queued.extendleft(reversed(group))
+                        _stop_for_budget(events, spend, images, queued, budget)
+                        scan_done = True
+                        held = None
+                        break
+                    if len(group) == 1:
+                        idx, work_future, reserved, _ = group[0]
+                        future = pool.submit(_analyze_image, settings, images[idx], events, stage,
+                                             work_future, cache, budget, reserved, limiter, stages)
+                    else:
+                        future = pool.submit(_analyze_group, settings, [images[g[0]] for g in group],
+                                             events, stage, [g[1] for g in group], cache, budget,
+                                             [g[2] for g in group], limiter, stages)
+                    pending[future] = ([g[0] for g in group], allowance)
+                    in_flight += len(group)
+
+                if not pending:
+                    break
+                # While the scan is still running, wake up now and then to submit what it found
+                done, _ = wait(pending, timeout=None if scan_done else SCAN_POLL_SECONDS,
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    indices, allowance = pending.pop(future)
+                    spend.release(allowance)
+                    in_flight -= len(indices)
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        for idx in indices:
+                            finished[idx] = (None, e, None)
+                        continue
+                    live.request(elapsed)
+                    if len(indices) == 1:
+                        finished[indices[0]] = result
+                    else:
+                        finished.update(zip(indices, result))
+
+                # Write everything that is now contiguous, in input order
+                while next_write in finished:
+                    write(next_write, *finished.pop(next_write))
+                    next_write += 1
+
+                # Update progress
+                # (once the scan is over, or stopped by the run budget, 'images' is the full list)
+                events.emit("progress", value=next_write, maximum=len(images) if scan_done else scan.found)
+                if done:
+                    events.emit("stages", stages=stages.snapshot())
+                if live.due() or not pending:
+                    # Until the scan is over, the number of images left isn't known
+                    remaining = len(images) - next_write if scan_done else None
+                    _emit_stats(events, live, len(pending), remaining)
+    finally:
+        stage.close()
+
+def _trim_to_budget(settings, images, events, spend):
+    """
+    Batch mode sends everything at once, so the run budget is applied up front: only
+    the images whose estimated cost (from their headers) fits are kept.
+    """
+    for idx, img_path in enumerate(images):
+        if spend.try_acquire(*request_tokens(settings, [_token_estimate(settings, img_path)])) is None:
+            del images[idx:]
+            events.log(f"[BUDGET] Run budget ({spend.describe()}) covers {idx} image(s); "
+                       "the rest are left for a resumed session.", "warn")
+            return
+
+def _stop_for_budget(events, spend, images, queued, budget):
+    """
+    Stops dispatching once the run budget is exhausted: the images that were found but
+    not sent are dropped, with their preparation and payload reservations, so they stay
+    unprocessed (not failed) and a resumed session sends them.
+    """
+    first = queued[0][0]
+    for _, work_future, reserved, _ in queued:
+        work_future.cancel()
+        budget.release(reserved)
+    queued.clear()
+    del images[first:]
+    events.log(f"[BUDGET] Run budget ({spend.describe()}) reached after {first} image(s); "
+               "no more requests are sent. Resume the session to continue.", "warn")
+
+def _token_estimate(settings, img_path):
+    """
+    Image tokens to reserve from the run budget for an image (reads only its header).
+    """
+    try:
+        return image_tokens(settings, img_path)
+    except Exception:
+        # Unreadable: preparation will fail and report it, at no cost
+        return 0
+
+def _payload_estimate(settings, img_path):
+    """
+    Bytes to reserve for an image before it is prepared (reads only its header).
+    """
+    try:
+        return estimate_payload_memory(img_path, settings.upload_format)
+    except OSError:
+        # Unreadable: preparation will fail and report it
+        return 0
+
+def _analyze_image(settings, img_path, events, stage, work_future, cache=None,
+                   budget=None, reserved=0, limiter=None, stages=None):
+    """
+    Worker-side step: waits for the image's preparation, then asks the model about it.
+    Releases the image's payload reservation when done.
+    Returns ((result, None, meta), seconds spent).
+    """
+    try:
+        events.log(f"[PROCESS] Analyzing {img_path}", "info")
+        start = time.perf_counter()
+        work = stage.result(work_future, events, stages)
+        # Hold only what the payload really takes (nothing for a cache hit)
+        actual = payload_memory(work.prepared) if work.prepared is not None else 0
+        reserved = budget.shrink(reserved, actual)
+        meta = {}
+        result = describe_image(settings, img_path, events, work, cache, limiter, stages, meta)
+        elapsed = time.perf_counter() - start
+        meta['latency'] = round(elapsed, 3)
+        return (result, None, meta), elapsed
+    finally:
+        budget.release(reserved)
+
+def _analyze_group(settings, img_paths, events, stage, work_futures, cache=None,
+                   budget=None, reserved=(), limiter=None, stages=None):
+    """
+    _analyze_image for several images sent in one request.
+    Returns ([(result, error, meta) per image], seconds spent): an image whose
+    preparation failed gets its error and is left out of the request.
+    """
+    reserved = list(reserved)
+    try:
+        start = time.perf_counter()
+        outcomes = [None] * len(img_paths)
+        sent, works = [], []
+        for i, (img_path, work_future) in enumerate(zip(img_paths, work_futures)):
+            events.log(f"[PROCESS] Analyzing {img_path}", "info")
+            try:
+                work = stage.result(work_future, events, stages)
+            except Exception as e:
+                outcomes[i] = (None, e, None)
+                reserved[i] = budget.shrink(reserved[i], 0)
+                continue
+            actual = payload_memory(work.prepared) if work.prepared is not None else 0
+            reserved[i] = budget.shrink(reserved[i], actual)
+            sent.append(i)
+            works.append(work)
+
+        if sent:
+            metas = [{} for _ in sent]
+            results = describe_images(settings, [img_paths[i] for i in sent], events, works,
+                                      cache, limiter, stages, metas)
+            elapsed = round(time.perf_counter() - start, 3)
+            for i, result, meta in zip(sent, results, metas):
+                meta['latency'] = elapsed
+                outcomes[i] = (result, None, meta)
+        return outcomes, time.perf_counter() - start
+    finally:
+        for held in reserved:
+            budget.release(held)
+
+def _write_result(events, idx, img_path, result, error, outputs, txt_f, log_f, journal,
+                  records, meta=None, duplicates=(), stages=None):
+    """
+    Saves the renamed file (see outputs.py) and the summary entry for one image,
+    or records the failure in failed.log. Either way the outcome goes to the result
+    files ('records', with the answer's 'meta') and then to the journal, after the
+    outputs are flushed, so a resumed run never skips unsaved work.
+    'duplicates' are the (path, distance) near-duplicates that share this image's result;
+    each gets its own file under a suffixed name.
+    Returns how many of the images (this one and its duplicates) failed.
+    """
+    try:
+        if error:
+            raise error
+
+        # Validate model response
+        if not result or "name" not in result or "alt" not in result:
+            raise ValueError("Invalid or empty response from the model.")
+
+        # Construct new filename from 'name'
+        base_name = slugify(result['name'])[:100]
+        if not base_name:
+            base_name = f"image-{idx+1}"
+    except Exception as e:
+        _record_failure(events, img_path, e, log_f, journal, records, meta)
+        for path, _ in duplicates:
+            _record_failure(events, path, e, log_f, journal, records, duplicate_of=img_path)
+        return 1 + len(duplicates)
+
+    failed = 0
+    for path in [img_path] + [path for path, _ in duplicates]:
+        duplicate_of = img_path if path != img_path else None
+        try:
+            _save_copy(events, path, base_name, result['alt'], outputs, txt_f, journal,
+                       records, meta, duplicate_of, stages)
+        except Exception as e:
+            _record_failure(events, path, e, log_f, journal, records, meta, duplicate_of)
+            failed += 1
+    return failed
+
+def _save_copy(events, img_path, base_name, alt, outputs, txt_f, journal, records,
+               meta=None, duplicate_of=None, stages=None):
+    if stages is None:
+        stages = NullStageTimes()
+
+    # Copy, link or rename the file; never over an earlier image with the same name
+    # (e.g. a near-duplicate)
+    with stages.timed('copy'):
+        new_path = outputs.place(img_path, base_name)
+    new_name = os.path.basename(new_path)
+    name = os.path.splitext(new_name)[0]
+
+    # Write to the summary text file
+    with stages.timed('write'):
+        txt_f.write(f"[Original: {os.path.basename(img_path)}]\n")
+        txt_f.write(f"Name: {name}\n")
+        txt_f.write(f"Alt: {alt}\n\n")
+        txt_f.flush()
+        records.done(img_path, name, alt, new_path, meta, duplicate_of)
+        journal.done(img_path, name, alt, new_name, new_path)
+
+    events.log(f"[SUCCESS] -> {new_name}", "success")
+
+def _record_failure(events, img_path, error, log_f, journal, records, meta=None, duplicate_of=None):
+    events.count('failed')
+    log_f.write(f"{img_path} :: {error}\n")
+    log_f.flush()
+    records.failed(img_path, error, meta, duplicate_of)
+    journal.failed(img_path, error)
+    events.log(f"[FAIL] {img_path} :: {error}", "error")
+    print(f"⚠️ Failed to process {img_path}: {error}", file=sys.stderr)
@@ -9,13 +9,14 @@ Features:
 - Drag-and-drop for image/folder input
 """
 
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinterdnd2 import TkinterDnD
 from config import load_config, save_config, reset_config
-from ui_components import build_ui
+from ui_components import build_ui, schedule_image_count, set_monitor_max_lines
 from dragdrop import configure_drag_and_drop
-from logic import process_images
+from ui_runner import process_images, estimate_cost, resume_session, schedule_prewarm
 
 # A set of harmonic themes for demonstration
 HARMONIC_THEMES = {
@@ -106,13 +107,29 @@ def main():
     state = build_ui(root, user_config)
     state['root'] = root  # for saving geometry, etc.
 
-    # 5) Connect "Describe Images" button to logic.process_images
+    # 5) Connect the "Describe Images" / "Estimate Cost" / "Resume Session" / "Retry Failures"
+    #    buttons to ui_runner
     state['process_button'].config(command=lambda: process_images(state))
+    state['estimate_button'].config(command=lambda: estimate_cost(state))
+    state['resume_button'].config(command=lambda: resume_session(state))
+    state['retry_button'].config(command=lambda: resume_session(state, retry_failures=True))
 
-    # 6) Enable drag-and-drop
+    # 6) Pre-warm the API connection whenever a key is entered (and now, if one is saved)
+    state['openai_api_key'].trace_add('write', lambda *_: schedule_prewarm(state))
+    if state['openai_api_key'].get().strip():
+        schedule_prewarm(state)
+
+    # 7) Re-count the input folder when the scan options change
+    for key in ('scan_recursive', 'scan_include', 'scan_exclude', 'scan_symlinks'):
+        state[key].trace_add('write', lambda *_: schedule_image_count(state))
+
+    # 8) Resize the Monitor's log buffer when its limit changes
+    state['monitor_max_lines'].trace_add('write', lambda *_: set_monitor_max_lines(state))
+
+    # 9) Enable drag-and-drop
     configure_drag_and_drop(root, state)
 
-    # 7) A callback to reset config from the UI
+    # 10) A callback to reset config from the UI
     def on_reset_config():
         if messagebox.askyesno("Reset Settings", "Are you sure you want to reset all settings?"):
             reset_config()
@@ -120,7 +137,7 @@ def main():
             root.destroy()
     state['reset_config_callback'] = on_reset_config
 
-    # 8) On closing, save config
+    # 11) On closing, save config
     def on_close():
         geometry = root.winfo_geometry().split('+')[0]  # e.g. '900x600'
         save_config(state, geometry)
@@ -130,4 +147,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # OCR runs in worker processes; needed for the PyInstaller .exe on Windows
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,56 @@
+"""
+membudget.py
+
+A global budget for the bytes held by in-flight image payloads:
+- The engine reserves an estimate before an image is decoded/encoded and the worker
+  releases it once the request is done, so a folder of huge scans can't exhaust memory
+- When the budget is full, further reservations are refused (backpressure) until
+  earlier requests finish; the engine then waits for one of them before preparing more
+- A single reservation larger than the whole budget is still allowed when nothing
+  else is in flight, so an oversized image slows the run down instead of stalling it
+- Tracks the peak number of reserved bytes for the end-of-run report
+"""
+
+import threading
+
+class ByteBudget:
+    """
+    A counting semaphore measured in bytes. A limit of 0 disables the budget.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit = int(limit_bytes)
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, amount: int) -> int | None:
+        """
+        Reserves 'amount' bytes if they fit in the budget, or returns None.
+        Returns the amount reserved (pass it back to release()/shrink()).
+        """
+        amount = max(0, int(amount))
+        with self._lock:
+            if self.limit > 0 and self.in_flight > 0 and self.in_flight + amount > self.limit:
+                return None
+            self.in_flight += amount
+            self.peak = max(self.peak, self.in_flight)
+        return amount
+
+    def shrink(self, reserved: int, actual: int) -> int:
+        """
+        Lowers a reservation to what the payload really needs once it is known.
+        Returns the new reservation. Never grows it.
+        """
+        actual = max(0, min(int(actual), reserved))
+        self.release(reserved - actual)
+        return actual
+
+    def release(self, amount: int):
+        """
+        Gives 'amount' bytes back.
+        """
+        if amount <= 0:
+            return
+        with self._lock:
+            self.in_flight -= amount
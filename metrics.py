@@ -0,0 +1,113 @@
+"""
+metrics.py
+
+Exports a run's measurements, so regressions can be tracked across versions:
+- metrics.json in the session folder: stage timings (see stages.py), run-wide
+  counters, throughput and the outcome counts
+- Optionally, the same figures as a Prometheus textfile for the node exporter's
+  textfile collector (written atomically, as the collector requires)
+"""
+
+import os
+import json
+import time
+
+METRICS_FILE = "metrics.json"
+
+# Bump when the layout of metrics.json changes
+METRICS_VERSION = 1
+
+# Summary keys copied into metrics.json as outcome counts
+_OUTCOME_KEYS = ('processed', 'duplicates', 'failed', 'skipped', 'cache_hits', 'cache_misses')
+
+def build_metrics(summary: dict, counters: dict, settings=None) -> dict:
+    """
+    Collects one run's measurements from the engine's summary and the run-wide counters.
+    """
+    metrics = {
+        'version': METRICS_VERSION,
+        'finished_at': round(time.time(), 3),
+        'images': {key: summary.get(key, 0) for key in _OUTCOME_KEYS},
+        'stages': summary.get('stages', {}),
+        'throughput': summary.get('throughput', {}),
+        'counters': counters,
+        'memory': {'peak_rss': summary.get('peak_rss', 0), 'peak_inflight': summary.get('peak_inflight', 0)},
+    }
+    if settings is not None:
+        metrics['run'] = {
+            'processing_mode': settings.processing_mode,
+            'concurrency': settings.concurrency,
+            'images_per_request': settings.images_per_request,
+            'prepare_workers': settings.prepare_workers,
+            'vision_detail': settings.vision_detail,
+            'upload_format': settings.upload_format,
+            'ocr_enabled': settings.ocr_enabled,
+            'output_strategy': settings.output_strategy,
+        }
+    return metrics
+
+def write_metrics_json(session_path: str, metrics: dict) -> str:
+    """
+    Writes metrics.json into the session folder. Returns its path.
+    """
+    path = os.path.join(session_path, METRICS_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    return path
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_text(metrics: dict) -> str:
+    """
+    The metrics in the Prometheus text exposition format. Everything describes the
+    last finished run, so every metric is a gauge.
+    """
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append(f"# HELP altomatic_{name} {help_text}")
+        lines.append(f"# TYPE altomatic_{name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"altomatic_{name}{{{label_text}}} {value}" if label_text else f"altomatic_{name} {value}")
+
+    throughput = metrics.get('throughput', {})
+    stages = metrics.get('stages', {})
+
+    metric("last_run_timestamp_seconds", "When the last run finished.",
+           [({}, metrics['finished_at'])])
+    metric("last_run_duration_seconds", "Wall time of the last run.",
+           [({}, throughput.get('elapsed', 0))])
+    metric("last_run_images", "Images in the last run by outcome.",
+           [({'outcome': key}, value) for key, value in metrics['images'].items()])
+    metric("last_run_stage_seconds", "Seconds spent per pipeline stage in the last run.",
+           [({'stage': name}, info['total']) for name, info in stages.items()])
+    metric("last_run_stage_calls", "Times each pipeline stage ran in the last run.",
+           [({'stage': name}, info['count']) for name, info in stages.items()])
+    metric("last_run_stage_max_seconds", "Slowest single pass through each stage in the last run.",
+           [({'stage': name}, info['max']) for name, info in stages.items()])
+    metric("last_run_images_per_second", "Images finished per second over the last run.",
+           [({}, throughput.get('images_per_sec', 0))])
+    metric("last_run_tokens_per_second", "Tokens used per second over the last run.",
+           [({}, throughput.get('tokens_per_sec', 0))])
+    metric("last_run_request_latency_seconds", "Request latency percentiles of the last run.",
+           [({'quantile': q}, throughput[key]) for q, key in (("0.5", 'p50'), ("0.95", 'p95'), ("0.99", 'p99'))
+            if throughput.get(key) is not None])
+    metric("last_run_error_ratio", "Share of images that failed in the last run.",
+           [({}, throughput.get('error_rate', 0))])
+    metric("last_run_counter", "Run-wide counters of the last run (bytes saved, retries, ...).",
+           [({'name': name}, value) for name, value in sorted(metrics.get('counters', {}).items())])
+    metric("last_run_peak_rss_bytes", "Peak resident memory of the last run.",
+           [({}, metrics['memory']['peak_rss'])])
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_textfile(path: str, metrics: dict):
+    """
+    Replaces 'path' (e.g. /var/lib/node_exporter/textfile/altomatic.prom) atomically,
+    so the collector never reads a half-written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(metrics))
+    os.replace(tmp_path, path)
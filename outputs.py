@@ -0,0 +1,222 @@
+"""
+outputs.py
+
+Puts each described image under its new name, as cheaply as the filesystem allows:
+- copy:     a full copy in renamed_images (the default)
+- hardlink: a second name for the same file in renamed_images, no bytes written
+            (the copy and the original are then the same file: editing one edits both)
+- reflink:  a copy-on-write clone (FICLONE on Linux btrfs/XFS, clonefile on macOS),
+            else os.copy_file_range, which lets the kernel copy without user-space buffers
+- symlink:  a link in renamed_images pointing at the original
+- rename:   renames the original in its own folder; every rename is appended to
+            undo_renames.jsonl in the session folder, so undo_renames() can put them back
+- A strategy that isn't possible (across devices, no permission, unsupported filesystem)
+  falls back to the next cheapest one, down to a plain copy, with one warning per run
+- Counts the bytes actually written and how each file was placed
+"""
+
+import os
+import sys
+import json
+import errno
+import shutil
+import threading
+
+from helpers import unique_filename
+
+OUTPUT_STRATEGIES = ("copy", "hardlink", "reflink", "symlink", "rename")
+
+UNDO_FILE = "undo_renames.jsonl"
+
+# What to try, in order, for each strategy
+_FALLBACKS = {
+    'copy': ("copy",),
+    'hardlink': ("hardlink", "reflink", "copy"),
+    'reflink': ("reflink", "copy"),
+    'symlink': ("symlink", "copy"),
+    'rename': ("rename", "copy"),
+}
+
+# Linux ioctl that clones a whole file (_IOW(0x94, 9, int))
+_FICLONE = 0x40049409
+
+class NotPossible(Exception):
+    """
+    A strategy can't be used for this file (the next one is tried).
+    """
+
+def _clone(src, dst):
+    """
+    Copy-on-write clone of src at dst. Returns the bytes written (0 when cloned,
+    the file size when the kernel had to copy). Raises NotPossible if neither works.
+    """
+    if sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if hasattr(libc, "clonefile"):
+            if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+                return 0
+            raise NotPossible(os.strerror(ctypes.get_errno()))
+        raise NotPossible("clonefile is not available")
+
+    if not sys.platform.startswith("linux"):
+        raise NotPossible("reflinks are only supported on Linux and macOS")
+
+    import fcntl
+    size = os.path.getsize(src)
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copymode(src, dst)
+            return 0
+        except OSError:
+            pass
+        if not hasattr(os, "copy_file_range"):
+            fdst.close()
+            os.remove(dst)
+            raise NotPossible("the filesystem can't clone files")
+        try:
+            copied = 0
+            while copied < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            fdst.close()
+            os.remove(dst)
+            raise NotPossible(str(e))
+    shutil.copymode(src, dst)
+    return size
+
+class OutputWriter:
+    """
+    Places the outputs of one run. Safe to share between threads.
+    """
+
+    def __init__(self, strategy: str, renamed_folder: str, session_path: str, events):
+        if strategy not in _FALLBACKS:
+            raise ValueError(f"Unknown output strategy: {strategy}")
+        self.strategy = strategy
+        self.renamed_folder = renamed_folder
+        self.session_path = session_path
+        self.events = events
+        self.bytes_written = 0
+        self.methods = {}           # method -> files placed that way
+        self._warned = set()
+        self._undo = None
+        self._lock = threading.Lock()
+
+    def place(self, img_path: str, base_name: str) -> str:
+        """
+        Materializes img_path under base_name (plus its extension, made unique).
+        Returns the new file's path.
+        """
+        ext = os.path.splitext(img_path)[1].lower()
+        last_error = None
+        for method in _FALLBACKS[self.strategy]:
+            # Names are picked and taken under the lock, so two images never get the same one
+            with self._lock:
+                folder = os.path.dirname(img_path) if method == "rename" else self.renamed_folder
+                new_path = os.path.join(folder, unique_filename(folder, base_name, ext))
+                try:
+                    written = self._apply(method, img_path, new_path)
+                except (NotPossible, OSError) as e:
+                    if isinstance(e, OSError) and e.errno in (errno.ENOENT,) and method in ("copy", "rename"):
+                        # The original itself is gone; no strategy can help
+                        raise
+                    last_error = e
+                    self._warn_fallback(method, e)
+                    continue
+                self.bytes_written += written
+                self.methods[method] = self.methods.get(method, 0) + 1
+            self.events.count('bytes_written', written)
+            return new_path
+        raise last_error
+
+    def _apply(self, method, src, dst) -> int:
+        if method == "copy":
+            shutil.copy(src, dst)
+            return os.path.getsize(dst)
+        if method == "hardlink":
+            os.link(src, dst)
+            return 0
+        if method == "reflink":
+            return _clone(src, dst)
+        if method == "symlink":
+            os.symlink(os.path.abspath(src), dst)
+            return 0
+        if method == "rename":
+            if os.path.exists(dst):
+                raise NotPossible(f"{dst} already exists")
+            self._record_rename(src, dst)
+            os.rename(src, dst)
+            return 0
+        raise ValueError(method)
+
+    def _record_rename(self, src, dst):
+        # Written (and flushed) before the rename, so a crash can't lose track of a file
+        if self._undo is None:
+            self._undo = open(os.path.join(self.session_path, UNDO_FILE), "a", encoding="utf-8")
+        self._undo.write(json.dumps({'from': os.path.abspath(src), 'to': os.path.abspath(dst)},
+                                    ensure_ascii=False) + "\n")
+        self._undo.flush()
+        os.fsync(self._undo.fileno())
+
+    def _warn_fallback(self, method, error):
+        if method in self._warned:
+            return
+        self._warned.add(method)
+        self.events.log(f"[WARN] Can't {method} outputs ({error}); falling back.", "warn")
+
+    def close(self):
+        with self._lock:
+            if self._undo is not None:
+                self._undo.close()
+                self._undo = None
+
+def format_output_methods(methods: dict) -> str:
+    """
+    One line like "12 hardlink, 3 copy" from OutputWriter.methods.
+    """
+    return ", ".join(f"{count} {method}" for method, count in
+                     sorted(methods.items(), key=lambda item: -item[1])) or "none"
+
+def undo_renames(session_path: str) -> tuple:
+    """
+    Puts back every image a 'rename' run renamed, newest first.
+    Returns (restored count, list of problems). The manifest is kept as
+    undo_renames.jsonl.undone afterwards.
+    """
+    path = os.path.join(session_path, UNDO_FILE)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No {UNDO_FILE} in {session_path}")
+
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Torn last line from a crash
+                continue
+
+    restored, problems = 0, []
+    for entry in reversed(entries):
+        src, dst = entry['from'], entry['to']
+        if not os.path.exists(dst):
+            if not os.path.exists(src):
+                problems.append(f"{dst} is gone")
+            # Else the rename never happened (or was already undone)
+            continue
+        if os.path.exists(src):
+            problems.append(f"{src} exists again; left {dst} as is")
+            continue
+        try:
+            os.rename(dst, src)
+            restored += 1
+        except OSError as e:
+            problems.append(f"{dst}: {e}")
+
+    os.replace(path, path + ".undone")
+    return restored, problems
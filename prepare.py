@@ -0,0 +1,177 @@
+"""
+prepare.py
+
+The preparation stage of the pipeline, run ahead of the API requests:
+- Each image is memory-mapped once and decoded at most once (imaging.LoadedImage); that one copy
+  is hashed for the cache key, handed to Tesseract (if OCR is on), then resized and
+  re-encoded for upload, and released as soon as the payload exists
+- Runs in a pool of worker processes, so decoding, OCR and encoding of upcoming images
+  overlap the requests already in flight (and use more than one core)
+- Images that are already in the result cache skip the resize/encode
+- The engine starts preparation a bounded number of images ahead (prefetch), so a fast
+  scan can't queue up work for a whole folder
+- Each result carries the seconds its steps took, for the Monitor's stage timings
+- Workers are spawned rather than forked (a fork copies the parent's threads and locks);
+  if worker processes can't be started, the stage falls back to a thread pool
+"""
+
+import time
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import CACHE_FILE, make_cache_key, cache_contains
+from helpers import extract_text_from_image
+from imaging import LoadedImage, PreparedImage, prepare_image
+
+OCR_FAILED_PREFIX = "⚠️ OCR failed:"
+
+@dataclass
+class PreparedWork:
+    """
+    Everything the preparation stage produced for one image.
+    'prepared' is None when the result was found in the cache.
+    """
+    path: str
+    ocr_text: str               # "" if OCR is off or failed
+    ocr_error: str | None
+    cache_key: str | None
+    cached: bool
+    prepared: PreparedImage | None
+    timings: dict               # stage -> seconds ('load', 'decode', 'ocr', 'prepare')
+
+def stage_options(settings, cache_key_inputs: dict | None, cache_path: str = CACHE_FILE) -> dict:
+    """
+    The plain (picklable) options prepare_worker() needs.
+    'cache_key_inputs' are the prompt inputs of the cache key, or None without a cache.
+    """
+    return {
+        'ocr_enabled': settings.ocr_enabled,
+        'tesseract_path': settings.tesseract_path,
+        'ocr_language': settings.ocr_language,
+        'detail': settings.vision_detail.lower(),
+        'upload_format': settings.upload_format,
+        'upload_quality': settings.upload_quality,
+        'cache_key_inputs': cache_key_inputs,
+        'cache_path': cache_path,
+        'cache_bypass': settings.cache_bypass,
+    }
+
+def _decode(loaded: LoadedImage, timings: dict):
+    """
+    Decodes the pixels now, so the decode shows up as its own stage.
+    """
+    if 'decode' not in timings:
+        start = time.perf_counter()
+        loaded.image.load()
+        timings['decode'] = time.perf_counter() - start
+
+def prepare_worker(image_path: str, options: dict) -> PreparedWork:
+    """
+    Runs in a worker process (or inline): load, hash, OCR, cache check, resize/encode.
+    """
+    timings = {}
+    start = time.perf_counter()
+    loaded = LoadedImage(image_path)
+    try:
+        timings['load'] = time.perf_counter() - start
+
+        ocr_text, ocr_error = "", None
+        if options['ocr_enabled']:
+            _decode(loaded, timings)
+            start = time.perf_counter()
+            text = extract_text_from_image(loaded.image, options['tesseract_path'], options['ocr_language'])
+            timings['ocr'] = time.perf_counter() - start
+            if text.startswith(OCR_FAILED_PREFIX):
+                ocr_error = text
+            else:
+                ocr_text = text
+
+        cache_key, cached = None, False
+        if options['cache_key_inputs'] is not None:
+            cache_key = make_cache_key(loaded.sha256(), {**options['cache_key_inputs'], "ocr_text": ocr_text})
+            cached = not options['cache_bypass'] and cache_contains(cache_key, options['cache_path'])
+
+        prepared = None
+        if not cached:
+            if options['upload_format'] != "Original":
+                _decode(loaded, timings)
+            start = time.perf_counter()
+            prepared = prepare_image(loaded, options['detail'], options['upload_format'],
+                                     options['upload_quality'])
+            timings['prepare'] = time.perf_counter() - start
+    finally:
+        loaded.release()
+    return PreparedWork(image_path, ocr_text, ocr_error, cache_key, cached, prepared, timings)
+
+class PrepareStage:
+    """
+    A process pool for preparation, shared by one run. Use submit() to start preparing
+    an image and result() (from any thread) to collect it.
+    """
+
+    def __init__(self, options: dict, workers: int):
+        self.options = options
+        self.workers = max(1, int(workers))
+        try:
+            # Spawned, not forked: a fork would copy the parent's threads and locks (the
+            # GUI, the HTTP pool) into a child that can then deadlock
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError):
+            # No multiprocessing on this platform/sandbox
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def submit(self, image_path: str) -> Future:
+        try:
+            return self._pool.submit(prepare_worker, image_path, self.options)
+        except BrokenProcessPool:
+            # A worker process died (or couldn't start); carry on with threads
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            return self._pool.submit(prepare_worker, image_path, self.options)
+
+    def result(self, future: Future, events, stages=None) -> PreparedWork:
+        """
+        Waits for an image's preparation, logs its OCR result and records its timings.
+        Time spent waiting is the 'prepare_wait' stage. Raises if preparation failed.
+        """
+        start = time.perf_counter()
+        try:
+            work = future.result()
+        finally:
+            if stages is not None:
+                stages.add('prepare_wait', time.perf_counter() - start)
+        if stages is not None:
+            for stage, seconds in work.timings.items():
+                stages.add(stage, seconds)
+
+        if work.ocr_error:
+            # Log error but continue with empty OCR text
+            events.log(work.ocr_error, "error")
+        elif self.options['ocr_enabled']:
+            events.log(f"[OCR RESULT] {work.ocr_text}", "warn")
+        return work
+
+    def prefetched(self, paths, prefetch: int, events, stages=None):
+        """
+        Yields (path, PreparedWork or the exception it raised) for 'paths' in order,
+        keeping up to 'prefetch' images in preparation ahead of the consumer.
+        """
+        window = []
+
+        def collect(path, future):
+            try:
+                return path, self.result(future, events, stages)
+            except Exception as e:
+                return path, e
+
+        for path in paths:
+            window.append((path, self.submit(path)))
+            if len(window) > prefetch:
+                yield collect(*window.pop(0))
+        for path, future in window:
+            yield collect(path, future)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,189 @@
+"""
+ratelimit.py
+
+Client-side scheduling against the account's API rate limits:
+- Token buckets for requests-per-minute and tokens-per-minute, shared by all workers
+- Limits and remaining budget are corrected from the x-ratelimit-* response headers
+- A 429's retry-after pauses every worker, not just the one that got it
+- Jittered exponential backoff for transient failures
+- A snapshot of the current state for the Monitor
+"""
+
+import re
+import time
+import random
+import threading
+
+# Backoff for retries without a retry-after: base * 2^attempt, capped, with full jitter
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value) -> float | None:
+    """
+    Parses rate-limit reset durations like '1s', '6m0s', '20ms' or plain seconds.
+    Returns seconds, or None if the value can't be read.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+def retry_after_seconds(headers) -> float | None:
+    """
+    Reads 'retry-after-ms' / 'retry-after' from response headers, if present.
+    """
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms is not None:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for the given (0-based) retry attempt.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+class _Bucket:
+    """
+    A per-minute token bucket. A capacity of 0 means unlimited.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now) -> float:
+        self.refill(now)
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount):
+        if self.capacity > 0:
+            self.level -= amount
+
+    def update(self, limit, remaining):
+        """
+        Applies the server's view: its limit replaces ours, and we never
+        believe we have more left than it says.
+        """
+        if limit:
+            if self.capacity <= 0:
+                self.level = float(limit)
+            self.capacity = float(limit)
+            self.level = min(self.level, self.capacity)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+class RateLimiter:
+    """
+    Shared by all worker threads of a run. Call acquire() before each request,
+    then update_from_headers()/record_usage() once it returns, or pause() on a 429.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self.waiting = 0
+        self.throttled_seconds = 0.0
+
+    def acquire(self, tokens: int):
+        """
+        Blocks until one request and 'tokens' tokens fit in both budgets
+        (and any retry-after pause is over), then takes them.
+        """
+        with self._cond:
+            started = time.monotonic()
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = max(
+                        self._paused_until - now,
+                        self._requests.wait_time(1, now),
+                        self._tokens.wait_time(tokens, now),
+                    )
+                    if delay <= 0:
+                        self._requests.take(1)
+                        self._tokens.take(tokens)
+                        self.throttled_seconds += now - started
+                        return
+                    self._cond.wait(delay)
+            finally:
+                self.waiting -= 1
+
+    def record_usage(self, estimated: int, actual: int):
+        """
+        Corrects the token bucket once the real usage of a request is known.
+        """
+        with self._cond:
+            self._tokens.take(actual - estimated)
+
+    def update_from_headers(self, headers):
+        """
+        Adopts the limits/remaining budget reported in x-ratelimit-* headers.
+        """
+        if not headers:
+            return
+
+        def number(name):
+            try:
+                return int(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        with self._cond:
+            self._requests.update(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+            self._tokens.update(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """
+        Holds back every worker for 'seconds' (e.g. a 429's retry-after).
+        """
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Current limiter state, for display in the Monitor.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return {
+                'rpm_limit': int(self._requests.capacity),
+                'rpm_available': int(max(0, self._requests.level)),
+                'tpm_limit': int(self._tokens.capacity),
+                'tpm_available': int(max(0, self._tokens.level)),
+                'paused_for': round(max(0.0, self._paused_until - now), 1),
+                'waiting': self.waiting,
+                'throttled_seconds': round(self.throttled_seconds, 1),
+            }
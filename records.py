@@ -0,0 +1,198 @@
+"""
+records.py
+
+Machine-readable result files of a session, streamed one record per image as it is
+saved (settings.result_formats, any of):
+- jsonl:  results.jsonl, one JSON object per line
+- csv:    results.csv, with a header row
+- sqlite: results.sqlite3, a 'results' table with one row per original path
+  (indexed), so a retried image replaces its earlier row
+- Each record holds the original path, new filename and path, name, alt text, status
+  (or error), tokens, latency and where the answer came from (API, cache or a
+  near-duplicate's result)
+- Every file is opened for appending and written through after each record, so a
+  resumed session adds to the same files and a crash loses at most a torn last line
+  (which the next append steps over)
+"""
+
+import os
+import csv
+import json
+import sqlite3
+import threading
+import time
+
+RESULT_FORMATS = ("jsonl", "csv", "sqlite")
+
+FIELDS = ("time", "original_path", "status", "new_name", "new_path", "name", "alt", "error",
+          "tokens", "cached_tokens", "latency", "source", "salvaged", "duplicate_of")
+
+def parse_formats(text: str) -> list:
+    """
+    The formats in a comma-separated list like "jsonl, csv" (case-insensitive).
+    Raises ValueError for an unknown one.
+    """
+    formats = []
+    for name in (text or "").split(","):
+        name = name.strip().lower()
+        if not name or name in formats:
+            continue
+        if name not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result format: {name} (choose from {', '.join(RESULT_FORMATS)})")
+        formats.append(name)
+    return formats
+
+def _open_append(path: str, newline=None):
+    """
+    Opens a text file for appending, first ending a torn last line (from a crash)
+    so the next record starts on a line of its own.
+    """
+    if os.path.isfile(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+        if torn:
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                f.write("\n")
+    return open(path, "a", encoding="utf-8", newline=newline)
+
+class JsonlWriter:
+    FILE = "results.jsonl"
+
+    def __init__(self, session_path: str):
+        self.path = os.path.join(session_path, self.FILE)
+        self._file = _open_append(self.path)
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class CsvWriter:
+    FILE = "results.csv"
+
+    def __init__(self, session_path: str):
+        self.path = os.path.join(session_path, self.FILE)
+        new = not os.path.isfile(self.path) or not os.path.getsize(self.path)
+        self._file = _open_append(self.path, newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if new:
+            self._writer.writeheader()
+
+    def write(self, record: dict):
+        self._writer.writerow({key: ("" if value is None else value) for key, value in record.items()})
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class SqliteWriter:
+    FILE = "results.sqlite3"
+
+    def __init__(self, session_path: str):
+        self.path = os.path.join(session_path, self.FILE)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL: an importer can read the table while the run is still writing it
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " time REAL NOT NULL,"
+            " original_path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " new_name TEXT,"
+            " new_path TEXT,"
+            " name TEXT,"
+            " alt TEXT,"
+            " error TEXT,"
+            " tokens INTEGER,"
+            " cached_tokens INTEGER,"
+            " latency REAL,"
+            " source TEXT,"
+            " salvaged INTEGER,"
+            " duplicate_of TEXT)"
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_results_original_path ON results(original_path)")
+        self._conn.commit()
+
+    def write(self, record: dict):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO results ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+            [record[key] for key in FIELDS])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+_WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter, 'sqlite': SqliteWriter}
+
+class ResultWriters:
+    """
+    The result files of one run. A file that can't be written any more is dropped
+    with a warning; the run goes on. Safe to share between threads.
+    """
+
+    def __init__(self, formats: list, session_path: str, events):
+        self.events = events
+        self._writers = {}
+        self._lock = threading.Lock()
+        for name in formats:
+            try:
+                self._writers[name] = _WRITERS[name](session_path)
+            except (OSError, sqlite3.Error) as e:
+                events.log(f"[WARN] Can't open the {name} result file: {e}", "warn")
+        self.paths = [writer.path for writer in self._writers.values()]
+
+    def done(self, img_path: str, name: str, alt: str, new_path: str, meta: dict = None,
+             duplicate_of: str = None):
+        """
+        Records a saved image. 'meta' is what ai_handler noted about its answer
+        (tokens, cached_tokens, latency, source, salvaged).
+        """
+        self._write(img_path, "done", meta, duplicate_of, name=name, alt=alt,
+                    new_name=os.path.basename(new_path), new_path=new_path)
+
+    def failed(self, img_path: str, error, meta: dict = None, duplicate_of: str = None):
+        self._write(img_path, "failed", meta, duplicate_of, error=str(error))
+
+    def _write(self, img_path, status, meta, duplicate_of, **values):
+        meta = meta or {}
+        record = dict.fromkeys(FIELDS)
+        record.update(
+            time=round(time.time(), 3),
+            original_path=img_path,
+            status=status,
+            tokens=meta.get('tokens', 0),
+            cached_tokens=meta.get('cached_tokens', 0),
+            latency=meta.get('latency'),
+            source="duplicate" if duplicate_of else meta.get('source'),
+            salvaged=bool(meta.get('salvaged')),
+            duplicate_of=duplicate_of,
+            **values,
+        )
+        if duplicate_of:
+            # The tokens were spent (and recorded) on the image whose result it shares
+            record['tokens'] = record['cached_tokens'] = 0
+        with self._lock:
+            for name, writer in list(self._writers.items()):
+                try:
+                    writer.write(record)
+                except (OSError, sqlite3.Error) as e:
+                    self.events.log(f"[WARN] Stopped writing {writer.path}: {e}", "warn")
+                    del self._writers[name]
+                    try:
+                        writer.close()
+                    except (OSError, sqlite3.Error):
+                        pass
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers.values():
+                try:
+                    writer.close()
+                except (OSError, sqlite3.Error):
+                    pass
+            self._writers.clear()
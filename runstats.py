@@ -0,0 +1,177 @@
+"""
+runstats.py
+
+Live throughput figures for a run, over a rolling window:
+- Images finished per second and tokens per second
+- p50/p95/p99 request latency
+- Error rate and the number of requests in flight
+- ETA for the images still to go
+- The same figures over the whole run, for the end-of-run summary
+- Thread-safe; nothing in here touches Tk
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+# Rolling window the live figures are computed over
+WINDOW_SECONDS = 60.0
+
+# Most latencies kept for the live percentiles (the whole-run ones use every request)
+MAX_WINDOW_SAMPLES = 2000
+
+# Minimum time between two 'stats' events
+EMIT_SECONDS = 0.5
+
+def percentile(sorted_values: list, pct: float):
+    """
+    Nearest-rank percentile of an already sorted list (None if it's empty).
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class RunStats:
+    """
+    Collects finished images, request latencies and token totals as they happen.
+    """
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self._finished = deque()    # (time, images, failed)
+        self._latencies = deque(maxlen=MAX_WINDOW_SAMPLES)  # (time, seconds)
+        self._all_latencies = []
+        self._tokens = deque()      # (time, run's token total at that time)
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def request(self, seconds: float):
+        """
+        Records one finished request and how long it took.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append((now, seconds))
+            self._all_latencies.append(seconds)
+
+    def finished(self, images: int = 1, failed: int = 0):
+        """
+        Records images whose outcome was written ('failed' of them unsuccessfully).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.done += images
+            self.failed += failed
+            self._finished.append((now, images, failed))
+
+    def due(self) -> bool:
+        """
+        True at most once every EMIT_SECONDS, to throttle 'stats' events.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_emit < EMIT_SECONDS:
+                return False
+            self._last_emit = now
+            return True
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        while self._finished and self._finished[0][0] < cutoff:
+            self._finished.popleft()
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        # Keep one token sample older than the window, as the baseline for the rate
+        while len(self._tokens) > 1 and self._tokens[1][0] < cutoff:
+            self._tokens.popleft()
+
+    def snapshot(self, tokens_total: int = 0, in_flight: int = 0, remaining=None) -> dict:
+        """
+        The live figures over the last 'window' seconds. 'remaining' is the number of
+        images still to go, or None if it isn't known yet (ETA is None then).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._tokens.append((now, tokens_total))
+            self._trim(now)
+            span = max(1e-6, min(self.window, now - self.started))
+            images = sum(n for _, n, _ in self._finished)
+            failed = sum(f for _, _, f in self._finished)
+            latencies = sorted(s for _, s in self._latencies)
+            first_time, first_tokens = self._tokens[0]
+            token_span = now - first_time
+            tokens_per_sec = (tokens_total - first_tokens) / token_span if token_span > 0 else 0.0
+
+        images_per_sec = images / span
+        eta = None
+        if remaining is not None and images_per_sec > 0:
+            eta = remaining / images_per_sec
+        return {
+            'images_per_sec': round(images_per_sec, 3),
+            'tokens_per_sec': round(tokens_per_sec, 1),
+            'p50': _rounded(percentile(latencies, 50)),
+            'p95': _rounded(percentile(latencies, 95)),
+            'p99': _rounded(percentile(latencies, 99)),
+            'error_rate': round(failed / images, 4) if images else 0.0,
+            'in_flight': in_flight,
+            'done': self.done,
+            'eta': round(eta, 1) if eta is not None else None,
+        }
+
+    def summary(self, tokens_total: int = 0) -> dict:
+        """
+        The same figures over the whole run.
+        """
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self.started)
+            latencies = sorted(self._all_latencies)
+            done, failed = self.done, self.failed
+        return {
+            'images_per_sec': round(done / elapsed, 3),
+            'tokens_per_sec': round(tokens_total / elapsed, 1),
+            'p50': _rounded(percentile(latencies, 50)),
+            'p95': _rounded(percentile(latencies, 95)),
+            'p99': _rounded(percentile(latencies, 99)),
+            'error_rate': round(failed / done, 4) if done else 0.0,
+            'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'elapsed': round(elapsed, 1),
+        }
+
+def _rounded(value):
+    return round(value, 3) if value is not None else None
+
+def format_duration(seconds) -> str:
+    """
+    '42s', '3m 05s' or '1h 02m'; '-' for None.
+    """
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+def format_stats(stats: dict) -> list:
+    """
+    Display lines for a snapshot() or summary() dict.
+    """
+    def ms(value):
+        return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+    lines = [
+        f"Throughput: {stats['images_per_sec']:.2f} images/s · {stats['tokens_per_sec']:.0f} tokens/s",
+        f"Latency: p50 {ms(stats['p50'])} · p95 {ms(stats['p95'])} · p99 {ms(stats['p99'])}",
+        f"Errors: {stats['error_rate'] * 100:.1f}%",
+    ]
+    if 'in_flight' in stats:
+        lines[-1] += f" · in flight: {stats['in_flight']} · ETA: {format_duration(stats['eta'])}"
+    else:
+        lines[-1] += f" · elapsed: {format_duration(stats['elapsed'])}"
+    return lines
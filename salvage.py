@@ -0,0 +1,135 @@
+"""
+salvage.py
+
+Recovers name/alt answers from model output that isn't clean JSON, without another
+request:
+- Code fences and text before or after the JSON object
+- Output cut off mid-way (a max_output_tokens stop): the open string is closed, a
+  dangling key or comma dropped and the open brackets closed
+- Anything else: "name" and "alt" values picked out field by field
+- Cleans what it finds: names and alt texts are trimmed to the length limits, alt text
+  cut at a word boundary
+"""
+
+import re
+import json
+
+# Longest 'name' and 'alt' kept (the schema asks for less; see ai_handler)
+MAX_NAME_CHARS = 100
+MAX_ALT_CHARS = 300
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+
+# A "key": "value" pair, the value possibly cut off before its closing quote
+_FIELD = r'"{key}"\s*:\s*"((?:[^"\\]|\\.)*)'
+
+def _close_truncated(text: str) -> str:
+    """
+    Closes whatever a cut-off JSON text left open: the last string (without its last,
+    probably partial word), then each bracket, innermost first. A trailing comma,
+    colon or key without a value is dropped.
+    """
+    stack = []
+    in_string = escaped = False
+    string_start = 0
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            string_start = i
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        if escaped:
+            text = text[:-1]
+        space = text.rfind(" ")
+        if space > string_start:
+            text = text[:space]
+        text += '"'
+    text = text.rstrip()
+    if stack and stack[-1] == "}":
+        # A key with no value yet: '"key"' or '"key":'
+        text = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", text)
+    text = text.rstrip().rstrip(",").rstrip()
+    return text + "".join(reversed(stack))
+
+def _loads(text: str):
+    """
+    The first JSON value in 'text', ignoring anything after it. Raises ValueError.
+    """
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("no JSON object in the output")
+    value, _ = json.JSONDecoder().raw_decode(text, start)
+    return value
+
+def _fields(text: str) -> dict | None:
+    """
+    Last resort: the first "name" and "alt" string values found anywhere in 'text'.
+    """
+    found = {}
+    for key in ("name", "alt"):
+        match = re.search(_FIELD.format(key=key), text)
+        if not match:
+            return None
+        try:
+            found[key] = json.loads('"' + match.group(1).rstrip("\\") + '"')
+        except ValueError:
+            found[key] = match.group(1)
+    return found
+
+def parse_answer(output_text: str) -> tuple:
+    """
+    Parses an answer. Returns (value, salvaged): 'salvaged' is False when the output
+    was valid JSON as it stood. Raises ValueError if nothing can be recovered.
+    """
+    try:
+        return json.loads(output_text), False
+    except (TypeError, ValueError):
+        pass
+    if not isinstance(output_text, str) or not output_text.strip():
+        raise ValueError("empty output")
+
+    text = _FENCE.sub("", output_text)
+    for candidate in (text, _close_truncated(text)):
+        try:
+            return _loads(candidate), True
+        except ValueError:
+            continue
+    fields = _fields(text)
+    if fields is None:
+        raise ValueError("output isn't JSON and holds no name/alt")
+    return fields, True
+
+def _trim(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:-")
+
+def clean_result(entry) -> dict | None:
+    """
+    {"name", "alt"} from one parsed entry, trimmed to the length limits, or None if
+    either is missing or blank.
+    """
+    if not isinstance(entry, dict):
+        return None
+    name, alt = entry.get("name"), entry.get("alt")
+    if not isinstance(name, str) or not isinstance(alt, str):
+        return None
+    name, alt = _trim(name, MAX_NAME_CHARS), _trim(alt, MAX_ALT_CHARS)
+    if not name or not alt:
+        return None
+    return {"name": name, "alt": alt}
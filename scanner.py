@@ -0,0 +1,201 @@
+"""
+scanner.py
+
+Finds the images to process, streaming, with os.scandir:
+- Yields image paths as they are discovered instead of building a list first
+- Optional recursion into subfolders
+- Include/exclude glob patterns (a pattern with a '/' matches the path relative
+  to the input folder, otherwise just the name; excludes also prune folders)
+- Symlink policy: skip them, follow links to files only, or follow everything
+  (with loop protection)
+- Deterministic order: each folder's entries are sorted by name, its files come
+  before its subfolders, so every run sees the images in the same order
+- BackgroundScan runs a scan on its own thread, so processing can start while
+  a large (e.g. network) folder is still being listed
+"""
+
+import os
+import time
+import queue
+import threading
+from fnmatch import fnmatch
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# "skip": ignore symlinks, "files": follow links to files but not to folders,
+# "follow": follow both
+SYMLINK_POLICIES = ("skip", "files", "follow")
+
+def parse_patterns(text: str) -> list:
+    """
+    Splits a user-entered pattern list ("*.jpg, raw/*; tmp*") on commas, semicolons
+    and newlines.
+    """
+    if not text:
+        return []
+    for sep in (";", "\n"):
+        text = text.replace(sep, ",")
+    return [p.strip() for p in text.split(",") if p.strip()]
+
+def _matches(rel_path, name, patterns):
+    for pattern in patterns:
+        if fnmatch(rel_path if "/" in pattern else name, pattern):
+            return True
+    return False
+
+def wanted_image(rel_path: str, include=(), exclude=()) -> bool:
+    """
+    Whether iter_images() takes a file at 'rel_path' ('/'-separated, relative to the
+    input folder) by its extension and the patterns. Its folders aren't checked.
+    """
+    name = rel_path.rsplit("/", 1)[-1]
+    if not name.lower().endswith(IMAGE_EXTENSIONS):
+        return False
+    if include and not _matches(rel_path, name, include):
+        return False
+    return not _matches(rel_path, name, exclude)
+
+def wanted_folder(path: str, rel_path: str, exclude=(), prune=None) -> bool:
+    """
+    Whether a recursive iter_images() goes into the folder at 'path' ('rel_path'
+    relative to the input folder), symlinks aside.
+    """
+    name = os.path.basename(path)
+    return not _matches(rel_path, name, exclude) and not (prune and prune(path, name))
+
+def iter_images(root: str, recursive: bool = False, include=(), exclude=(),
+                symlinks: str = "files", prune=None, on_error=None):
+    """
+    Yields the paths of the images under 'root', in a deterministic order.
+    - include: if given, a file must match one of these patterns
+    - exclude: files and folders matching any of these are skipped
+    - prune(path, name): return True to skip a subfolder (e.g. our own output)
+    - on_error(path, error): called for folders that can't be read (default: skipped)
+    """
+    include, exclude = tuple(include), tuple(exclude)
+    visited = set()
+    stack = [(root, "")]
+
+    while stack:
+        folder, rel_folder = stack.pop()
+        if symlinks == "follow":
+            # Don't walk the same folder twice through a symlink loop
+            try:
+                st = os.stat(folder)
+            except OSError as e:
+                if on_error:
+                    on_error(folder, e)
+                continue
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            if on_error:
+                on_error(folder, e)
+            continue
+
+        subfolders = []
+        for entry in entries:
+            rel_path = f"{rel_folder}{entry.name}"
+            try:
+                is_link = entry.is_symlink()
+                if is_link and symlinks == "skip":
+                    continue
+                if entry.is_dir(follow_symlinks=True):
+                    if recursive and (symlinks == "follow" or not is_link) \
+                            and wanted_folder(entry.path, rel_path, exclude, prune):
+                        subfolders.append((entry.path, rel_path + "/"))
+                    continue
+                if not entry.is_file(follow_symlinks=True):
+                    continue
+            except OSError:
+                # Broken symlink or the entry vanished while we looked at it
+                continue
+
+            if not wanted_image(rel_path, include, exclude):
+                continue
+            yield entry.path
+
+        # Reversed, so the first subfolder is popped (and walked) first
+        stack.extend(reversed(subfolders))
+
+def is_session_folder(path: str, name: str) -> bool:
+    """
+    True for Altomatic's own output folders, so a recursive scan over an input folder
+    that is also the output folder doesn't pick up renamed copies from earlier runs.
+    """
+    return name.startswith("session-") and os.path.isdir(os.path.join(path, "renamed_images"))
+
+def count_images(root: str, **options) -> int:
+    """
+    Number of images iter_images() would yield, without keeping the paths.
+    """
+    return sum(1 for _ in iter_images(root, **options))
+
+_END = object()
+
+class BackgroundScan:
+    """
+    Consumes a path iterator (usually iter_images) on a daemon thread.
+    The engine takes paths as they arrive; 'found' counts everything discovered so far,
+    'seconds' is how long the scan took once it is finished.
+    """
+
+    def __init__(self, paths):
+        self.found = 0
+        self.finished = False
+        self.error = None
+        self.seconds = 0.0
+        self._started = time.perf_counter()
+        self._queue = queue.Queue()
+        self._first = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(paths,), daemon=True)
+        self._thread.start()
+
+    def _run(self, paths):
+        try:
+            for path in paths:
+                self.found += 1
+                self._queue.put(path)
+                self._first.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.seconds = time.perf_counter() - self._started
+            self.finished = True
+            self._queue.put(_END)
+            self._first.set()
+
+    def wait_for_first(self) -> bool:
+        """
+        Blocks until the first image is found or the scan ends.
+        Returns False if the scan found nothing.
+        """
+        self._first.wait()
+        return self.found > 0
+
+    def take(self, block: bool = True):
+        """
+        Returns the next path, or None if 'block' is False and none is ready yet.
+        Raises StopIteration once the scan is over and every path was taken.
+        """
+        try:
+            item = self._queue.get(block=block)
+        except queue.Empty:
+            return None
+        if item is _END:
+            # Leave the marker for any later call
+            self._queue.put(_END)
+            raise StopIteration
+        return item
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.take()
+            except StopIteration:
+                return
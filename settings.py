@@ -0,0 +1,122 @@
+"""
+settings.py
+
+The plain settings object the processing engine runs on:
+- One field per engine-relevant option, with the same defaults as config.DEFAULT_CONFIG
+- Built from the saved config (CLI) or from the Tk variables (GUI), so the engine
+  itself never needs tkinter
+- Field metadata (help text, choices) drives the command-line options in altomatic.py
+"""
+
+from dataclasses import dataclass, field, fields, replace
+
+from config import DEFAULT_CONFIG
+
+def _option(key, help, choices=None, cli=True):
+    """
+    A dataclass field defaulting to DEFAULT_CONFIG[key], with CLI metadata.
+    """
+    return field(default=DEFAULT_CONFIG[key], metadata={'help': help, 'choices': choices, 'cli': cli})
+
+@dataclass
+class Settings:
+    """
+    Everything one processing run needs, as plain values.
+    """
+    # Run inputs (not stored in the config file)
+    input_path: str = field(default="", metadata={'cli': False})
+    input_type: str = field(default="Folder", metadata={'cli': False})  # "Folder" or "File"
+    output_folder: str = field(default="", metadata={'cli': False})
+    resume_session: str = field(default="", metadata={
+        'cli': True, 'help': "session folder to continue, skipping images its journal already has"})
+    retry_failures: bool = field(default=False, metadata={
+        'cli': True, 'help': "with --resume-session: only re-run the images that failed"})
+
+    openai_api_key: str = _option('openai_api_key', "OpenAI API key", cli=False)
+    api_base_url: str = _option('api_base_url', "API base URL (empty = official OpenAI endpoint)")
+
+    # Output
+    output_strategy: str = _option('output_strategy', "how renamed files are made (rename = in place, undoable)",
+                                   choices=("copy", "hardlink", "reflink", "symlink", "rename"))
+    result_formats: str = _option('result_formats', "result files to stream: jsonl, csv, sqlite, comma-separated")
+
+    # Input scan
+    scan_recursive: bool = _option('scan_recursive', "also process images in subfolders")
+    scan_include: str = _option('scan_include', "glob patterns a file must match, comma-separated")
+    scan_exclude: str = _option('scan_exclude', "glob patterns for files/folders to skip, comma-separated")
+    scan_symlinks: str = _option('scan_symlinks', "symlinks to skip or follow",
+                                 choices=("skip", "files", "follow"))
+
+    # Prompt
+    filename_language: str = _option('filename_language', "language of the generated filenames",
+                                     choices=("English", "Persian"))
+    alttext_language: str = _option('alttext_language', "language of the alt text",
+                                    choices=("English", "Persian"))
+    name_detail_level: str = _option('name_detail_level', "how descriptive filenames are",
+                                     choices=("Minimal", "Normal", "Detailed"))
+    vision_detail: str = _option('vision_detail', "image detail the model looks at",
+                                 choices=("low", "high", "auto"))
+
+    # OCR
+    ocr_enabled: bool = _option('ocr_enabled', "add Tesseract OCR text to the prompt")
+    tesseract_path: str = _option('tesseract_path', "path to the tesseract executable")
+    ocr_language: str = _option('ocr_language', "Tesseract language code, e.g. eng, fas")
+
+    # Upload
+    upload_format: str = _option('upload_format', "re-encode uploads as", choices=("JPEG", "WEBP", "Original"))
+    upload_quality: int = _option('upload_quality', "re-encode quality for JPEG/WEBP")
+    max_inflight_mb: int = _option('max_inflight_mb', "memory budget for payloads in flight, MB (0 = unlimited)")
+    prepare_workers: int = _option('prepare_workers', "processes that load, OCR and re-encode images")
+    prepare_prefetch: int = _option('prepare_prefetch', "images prepared ahead of the API requests")
+
+    # Near-duplicates
+    dedup_enabled: bool = _option('dedup_enabled', "describe one image per group of near-duplicates")
+    dedup_hash: str = _option('dedup_hash', "perceptual hash for near-duplicates", choices=("ahash", "dhash", "phash"))
+    dedup_distance: int = _option('dedup_distance', "max differing hash bits (of 64) for a near-duplicate")
+
+    # Throughput
+    processing_mode: str = _option('processing_mode', "interactive requests or the Batch API",
+                                   choices=("Sync", "Batch"))
+    concurrency: int = _option('concurrency', "API requests kept in flight")
+    images_per_request: int = _option('images_per_request', "images sent together in one request (Sync mode, max 10)")
+    http_pool_size: int = _option('http_pool_size', "max pooled keep-alive connections")
+    http_timeout: int = _option('http_timeout', "read timeout per request, seconds")
+    http2_enabled: bool = _option('http2_enabled', "use HTTP/2 (needs httpx[http2])")
+    rate_limit_rpm: int = _option('rate_limit_rpm', "requests per minute (0 = from API headers only)")
+    rate_limit_tpm: int = _option('rate_limit_tpm', "tokens per minute (0 = from API headers only)")
+    max_retries: int = _option('max_retries', "retries for 429s, 5xx and connection errors")
+
+    # Budget
+    budget_tokens: int = _option('budget_tokens', "stop sending requests after this many tokens (0 = no cap)")
+    budget_cost: float = _option('budget_cost', "stop sending requests after this much estimated spend, USD (0 = no cap)")
+
+    # Result cache
+    cache_bypass: bool = _option('cache_bypass', "skip cache lookups (fresh results are still stored)")
+    cache_max_mb: int = _option('cache_max_mb', "size cap for the result cache, MB")
+    cache_max_age_days: int = _option('cache_max_age_days', "drop cached results unused for this many days")
+
+    # Metrics
+    metrics_enabled: bool = _option('metrics_enabled', "time each stage and write metrics.json per session")
+    metrics_textfile: str = _option('metrics_textfile', "also write a Prometheus textfile to this path")
+
+    @classmethod
+    def from_config(cls, config: dict, **overrides) -> "Settings":
+        """
+        Picks the engine settings out of a config dict (see config.load_config),
+        then applies 'overrides'.
+        """
+        values = {f.name: config[f.name] for f in fields(cls) if f.name in config}
+        values.update(overrides)
+        return cls(**values)
+
+    def with_changes(self, **changes) -> "Settings":
+        """
+        Returns a copy with some fields changed.
+        """
+        return replace(self, **changes)
+
+def setting_names() -> tuple:
+    """
+    Names of all settings fields.
+    """
+    return tuple(f.name for f in fields(Settings))
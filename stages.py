@@ -0,0 +1,100 @@
+"""
+stages.py
+
+Per-stage timing for the processing pipeline:
+- Workers add the seconds each image spent in a stage (scanning, loading, decoding,
+  OCR, re-encoding, waiting for preparation, the API call, parsing the answer,
+  copying the file, writing the summary, ...)
+- A snapshot with count/total/average/max per stage is posted to the Monitor as a
+  'stages' event and kept for the end-of-run summary and metrics.json (see metrics.py)
+- NullStageTimes has the same interface and records nothing, for runs with
+  metrics turned off
+- Thread-safe; nothing in here touches Tk
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Display order in the Monitor (other stages are listed after these)
+STAGE_ORDER = ("scan", "hash", "load", "decode", "ocr", "prepare", "prepare_wait",
+               "api", "parse", "copy", "write")
+
+STAGE_LABELS = {
+    'scan': "scan",
+    'hash': "duplicate hashing",
+    'load': "load",
+    'decode': "decode",
+    'ocr': "OCR",
+    'prepare': "re-encode",
+    'prepare_wait': "waiting for preparation",
+    'api': "API",
+    'parse': "parse",
+    'copy': "file copy",
+    'write': "summary write",
+}
+
+class StageTimes:
+    """
+    Accumulates seconds per stage name.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._counts = {}
+        self._max = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._max[stage] = max(self._max.get(stage, 0.0), seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """
+        Adds the time spent in the with block to 'stage' (also when it raises).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        {stage: {'count', 'total', 'avg', 'max'}} in display order, seconds rounded to µs.
+        """
+        with self._lock:
+            names = [s for s in STAGE_ORDER if s in self._totals]
+            names += sorted(s for s in self._totals if s not in STAGE_ORDER)
+            return {
+                name: {
+                    'count': self._counts[name],
+                    'total': round(self._totals[name], 6),
+                    'avg': round(self._totals[name] / self._counts[name], 6),
+                    'max': round(self._max[name], 6),
+                }
+                for name in names
+            }
+
+class NullStageTimes(StageTimes):
+    """
+    A StageTimes that ignores everything (metrics turned off).
+    """
+
+    def add(self, stage: str, seconds: float):
+        pass
+
+    @contextmanager
+    def timed(self, stage: str):
+        yield
+
+def format_stage_times(snapshot: dict) -> str:
+    """
+    One line of average seconds per stage, e.g. 'OCR 1.20s · preprocess 0.05s · API 0.80s'.
+    """
+    return " · ".join(
+        f"{STAGE_LABELS.get(name, name)} {info['avg']:.2f}s" for name, info in snapshot.items()
+    )
@@ -0,0 +1,37 @@
+"""
+Shared test setup: the modules live at the repository root (and the fake API in
+benchmarks/), and HOME points at a temporary folder so the user's config and result
+cache are never touched.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Before config.py is imported: it places the config and cache files under HOME
+os.environ["HOME"] = tempfile.mkdtemp(prefix="altomatic-test-home-")
+
+import pytest
+
+@pytest.fixture
+def make_images(tmp_path):
+    """
+    Writes 'count' small, distinct PNG files into a folder and returns their paths.
+    """
+    from PIL import Image
+
+    def make(count, folder="input"):
+        base = tmp_path / folder
+        base.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for i in range(count):
+            path = base / f"image_{i:03d}.png"
+            Image.new("RGB", (64, 48), (i * 40 % 256, 90, 200)).save(path)
+            paths.append(str(path))
+        return paths
+
+    return make
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+import batch
+from batch import BatchTransport, OpenAIBatchTransport, run_batch, BATCH_JOBS_FILE
+from ai_handler import get_client
+from events import EventQueue
+from fake_server import FakeResponsesServer, ServerOptions
+from settings import Settings
+
+@pytest.fixture
+def server():
+    with FakeResponsesServer(ServerOptions(latency=0, batch_seconds=0.2)) as server:
+        yield server
+
+def _settings(server, **changes):
+    return Settings(openai_api_key="sk-test", api_base_url=server.base_url, processing_mode="Batch",
+                    prepare_workers=1, upload_format="JPEG", **changes)
+
+class CrashingTransport(OpenAIBatchTransport):
+    """
+    Submits normally, then dies on the first poll, like a process killed mid-wait.
+    """
+
+    def status(self, batch_id):
+        raise KeyboardInterrupt
+
+class FlakyTransport(OpenAIBatchTransport):
+    """
+    Fails the first 'failures' status checks, like a connection that drops for a while.
+    """
+
+    def __init__(self, client, failures):
+        super().__init__(client)
+        self.failures = failures
+
+    def status(self, batch_id):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return super().status(batch_id)
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        BatchTransport()
+
+def test_split_submit_poll_collect(server, make_images, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "MAX_BATCH_REQUESTS", 2)
+    images = make_images(5)
+    session = tmp_path / "session"
+    session.mkdir()
+
+    outcomes = run_batch(_settings(server), images, EventQueue(), str(session), poll_interval=0.05)
+
+    assert sorted(outcomes) == list(range(5))
+    for result, error, meta in outcomes.values():
+        assert error is None
+        assert result["name"].startswith("benchmark image")
+    assert server.counters()["batches"] == 3
+    with open(session / BATCH_JOBS_FILE, encoding="utf-8") as f:
+        jobs = json.load(f)
+    assert [job["requests"] for job in jobs] == [2, 2, 1]
+    recorded = [path for job in jobs for path, _ in job["images"].values()]
+    assert recorded == images
+    # The uploaded request files are removed once submitted
+    assert not [name for name in os.listdir(session) if name.startswith("batch_input_")]
+
+def test_failed_requests_come_back_as_errors(server, make_images, tmp_path):
+    server.options.error_rate = 1.0
+    images = make_images(2)
+
+    outcomes = run_batch(_settings(server), images, EventQueue(), str(tmp_path), poll_interval=0.05)
+
+    assert all(result is None and error for result, error, _ in outcomes.values())
+
+def test_resume_collects_batches_of_a_crashed_run(server, make_images, tmp_path):
+    images = make_images(3)
+    settings = _settings(server)
+    transport = CrashingTransport(get_client(settings))
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(settings, images, EventQueue(), str(tmp_path), transport=transport, poll_interval=0.05)
+    assert server.counters()["batches"] == 1
+
+    # The resumed run gets the images the journal doesn't have yet, in a new order
+    remaining = [images[2], images[0]]
+    outcomes = run_batch(settings, remaining, EventQueue(), str(tmp_path), poll_interval=0.05)
+
+    assert server.counters()["batches"] == 1
+    assert sorted(outcomes) == [0, 1]
+    assert all(error is None for _, error, _ in outcomes.values())
+
+def test_retry_failures_submits_again(server, make_images, tmp_path):
+    images = make_images(2)
+    run_batch(_settings(server), images, EventQueue(), str(tmp_path), poll_interval=0.05)
+
+    run_batch(_settings(server, retry_failures=True), images[:1], EventQueue(), str(tmp_path),
+              poll_interval=0.05)
+
+    assert server.counters()["batches"] == 2
+
+def test_status_check_is_retried(server, make_images, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "backoff_delay", lambda attempt: 0)
+    images = make_images(2)
+    settings = _settings(server, max_retries=0)
+    events = EventQueue()
+
+    outcomes = run_batch(settings, images, events, str(tmp_path),
+                         transport=FlakyTransport(get_client(settings), 3), poll_interval=0.05)
+
+    assert all(error is None for _, error, _ in outcomes.values())
+    assert events.counters()["retries"] == 3
+
+def test_status_gives_up_and_points_at_the_jobs_file(server, make_images, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "backoff_delay", lambda attempt: 0)
+    images = make_images(1)
+    settings = _settings(server)
+    events = EventQueue()
+
+    with pytest.raises(ConnectionError):
+        run_batch(settings, images, events, str(tmp_path),
+                  transport=FlakyTransport(get_client(settings), 1000), poll_interval=0.05)
+
+    errors = [data["message"] for kind, data in events.drain() if kind == "log" and data["level"] == "error"]
+    assert len(errors) == 1 and BATCH_JOBS_FILE in errors[0]
+    # The batch is still on record, so the resumed session collects it
+    outcomes = run_batch(settings, images, EventQueue(), str(tmp_path), poll_interval=0.05)
+    assert outcomes[0][1] is None
+    assert server.counters()["batches"] == 1
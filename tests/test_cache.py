@@ -0,0 +1,33 @@
+import ai_handler
+from ai_handler import cache_key_inputs
+from cache import ResultCache, make_cache_key
+from settings import Settings
+
+def _key(settings):
+    return make_cache_key("image-sha", cache_key_inputs(settings))
+
+def test_key_follows_upload_options():
+    base = _key(Settings())
+    assert _key(Settings()) == base
+    assert _key(Settings(upload_quality=60)) != base
+    assert _key(Settings(upload_format="Original")) != base
+
+def test_key_follows_prompt_and_schema(monkeypatch):
+    base = _key(Settings())
+    monkeypatch.setattr(ai_handler, "_MULTI_TASK", ai_handler._MULTI_TASK + "Be brief.\n")
+    assert _key(Settings()) != base
+    monkeypatch.undo()
+
+    schema = dict(ai_handler._SINGLE_SCHEMA, properties={**ai_handler._ANSWER_PROPERTIES, "tags": {"type": "string"}})
+    monkeypatch.setattr(ai_handler, "_SINGLE_SCHEMA", schema)
+    assert _key(Settings()) != base
+
+def test_get_put_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        assert cache.get("k") is None
+        cache.put("k", {"name": "cat", "alt": "A cat."})
+        assert cache.get("k") == {"name": "cat", "alt": "A cat."}
+        assert (cache.hits, cache.misses) == (1, 1)
+    finally:
+        cache.close()
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from altomatic import main, build_parser
+from fake_server import FakeResponsesServer, ServerOptions
+
+def _run(server, folder, output, *extra):
+    return main([folder, "--output", str(output), "--no-config", "--api-key", "sk-test",
+                 "--api-base-url", server.base_url, "--cache-bypass", "--no-metrics-enabled",
+                 "--concurrency", "1", "--prepare-workers", "1", "--events", "finished", *extra])
+
+def test_exit_code_is_0_when_every_image_succeeds(make_images, tmp_path, capsys):
+    images = make_images(2)
+    with FakeResponsesServer(ServerOptions(latency=0)) as server:
+        assert _run(server, os.path.dirname(images[0]), tmp_path / "out") == 0
+
+def test_exit_code_is_1_when_the_budget_stops_the_run(make_images, tmp_path, capsys):
+    images = make_images(6)
+    with FakeResponsesServer(ServerOptions(latency=0)) as server:
+        # Enough for about one request of the fake API's 940 tokens
+        code = _run(server, os.path.dirname(images[0]), tmp_path / "out", "--budget-tokens", "1500")
+        sent = server.counters()['requests']
+
+    assert 0 < sent < 6
+    assert code == 1
+    assert '"budget_stopped": true' in capsys.readouterr().out
+
+@pytest.mark.parametrize("option, value", [
+    ("--concurrency", "0"),
+    ("--concurrency", "1000"),
+    ("--images-per-request", "11"),
+    ("--upload-quality", "5"),
+    ("--budget-cost", "-1"),
+    ("--max-retries", "two"),
+])
+def test_numbers_outside_the_settings_ranges_are_refused(option, value, capsys):
+    with pytest.raises(SystemExit) as exit:
+        build_parser().parse_args(["input", option, value])
+    assert exit.value.code == 2
+    assert option in capsys.readouterr().err
+
+def test_numbers_inside_the_ranges_are_kept():
+    args = build_parser().parse_args(["input", "--concurrency", "32", "--budget-cost", "0.5"])
+    assert (args.concurrency, args.budget_cost) == (32, 0.5)
@@ -0,0 +1,54 @@
+import os
+import random
+import shutil
+
+from dedup import hash_images, image_hash
+from events import EventQueue
+from fake_server import FakeResponsesServer, ServerOptions
+from logic import run_engine
+from settings import Settings
+
+def _noise_pairs(folder, count):
+    """
+    Writes 'count' pairs of identical images; the pairs are random noise, so no two
+    pairs hash alike.
+    """
+    from PIL import Image
+
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(7)
+    for i in range(count):
+        image = Image.new("L", (64, 64))
+        image.putdata([rng.randrange(256) for _ in range(64 * 64)])
+        first = folder / f"pair_{i}_a.png"
+        image.save(first)
+        shutil.copy(first, folder / f"pair_{i}_b.png")
+    return str(folder)
+
+def test_budget_stop_counts_only_written_duplicates(tmp_path):
+    folder = _noise_pairs(tmp_path / "input", 4)
+    with FakeResponsesServer(ServerOptions(latency=0)) as server:
+        settings = Settings(input_path=folder, input_type="Folder", output_folder=str(tmp_path),
+                            openai_api_key="sk-test", api_base_url=server.base_url, concurrency=1,
+                            max_retries=0, cache_bypass=True, metrics_enabled=False,
+                            prepare_workers=1, dedup_enabled=True, dedup_distance=0,
+                            budget_tokens=1500)
+        summary = run_engine(settings, EventQueue())
+        sent = server.counters()['requests']
+
+    assert summary['budget_stopped']
+    assert sent >= 1
+    # Each sent representative brings its one copy along; everything else is unsent
+    assert summary['duplicates'] == sent
+    assert summary['processed'] == 2 * sent
+    assert summary['unsent'] == 8 - 2 * sent
+
+def test_hash_pool_matches_in_process_hashes(tmp_path):
+    folder = _noise_pairs(tmp_path / "input", 3)
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+
+    # Two spawned workers: the worker function and its results must survive pickling
+    results = hash_images(paths, "dhash", workers=2)
+
+    assert [error for _, error in results] == [None] * len(paths)
+    assert [value for value, _ in results] == [image_hash(path, "dhash") for path in paths]
@@ -0,0 +1,62 @@
+import os
+
+from events import EventQueue
+from fake_server import FakeResponsesServer, ServerOptions
+from journal import Journal, read_session, rewrite_failed_log, FAILED_LOG
+from logic import run_engine
+from settings import Settings
+
+def test_read_session_splits_done_and_failed(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.start(Settings(input_path="in"), "out.txt")
+    journal.done("a.png", "a", "alt a", "a.jpg")
+    journal.failed("b.png", "HTTP 500")
+    journal.failed("c.png", "timeout")
+    # A later record of the same image wins
+    journal.done("c.png", "c", "alt c", "c.jpg")
+    journal.close()
+    # A torn last line from a crash is ignored
+    with open(tmp_path / "journal.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"type": "image", "path": "d.png", "sta')
+
+    state = read_session(str(tmp_path))
+
+    assert state.done() == {"a.png", "c.png"}
+    assert state.failed() == ["b.png"]
+    assert list(state.images) == ["a.png", "b.png", "c.png"]
+    assert state.output_file == "out.txt"
+    assert state.settings['input_path'] == "in"
+
+def test_rewrite_failed_log_keeps_only_current_failures(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.failed("a.png", "HTTP 500")
+    journal.failed("b.png", "HTTP 500")
+    journal.done("a.png", "a", "alt a", "a.jpg")
+    journal.close()
+
+    rewrite_failed_log(str(tmp_path), read_session(str(tmp_path)))
+
+    with open(tmp_path / FAILED_LOG, encoding="utf-8") as f:
+        text = f.read()
+    assert "b.png" in text and "a.png" not in text
+
+def test_retry_failures_counts_only_skipped_images(make_images, tmp_path):
+    images = make_images(20)
+    output = tmp_path / "out"
+    output.mkdir()
+    with FakeResponsesServer(ServerOptions(latency=0, error_rate=0.5, rate_limit_share=0)) as server:
+        settings = Settings(input_path=os.path.dirname(images[0]), input_type="Folder",
+                            output_folder=str(output), openai_api_key="sk-test",
+                            api_base_url=server.base_url, max_retries=0, cache_bypass=True,
+                            metrics_enabled=False, prepare_workers=1)
+        first = run_engine(settings, EventQueue())
+        failed = len(read_session(first['session_path']).failed())
+        assert 0 < failed < 20
+
+        server.options.error_rate = 0.0
+        retry = run_engine(settings.with_changes(resume_session=first['session_path'], retry_failures=True),
+                           EventQueue())
+
+    assert retry['processed'] == failed
+    assert retry['skipped'] == 20 - failed
+    assert read_session(first['session_path']).failed() == []
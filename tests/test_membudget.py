@@ -0,0 +1,54 @@
+import threading
+
+from membudget import ByteBudget
+
+def test_reservations_are_refused_once_the_budget_is_full():
+    budget = ByteBudget(100)
+    first = budget.try_acquire(60)
+    assert first == 60
+    assert budget.try_acquire(50) is None
+    second = budget.try_acquire(40)
+    assert budget.in_flight == 100
+
+    budget.release(first)
+    budget.release(second)
+    assert budget.in_flight == 0
+    assert budget.peak == 100
+
+def test_an_oversized_reservation_fits_when_nothing_else_is_in_flight():
+    budget = ByteBudget(100)
+    assert budget.try_acquire(500) == 500
+    assert budget.try_acquire(1) is None
+    budget.release(500)
+    assert budget.try_acquire(1) == 1
+
+def test_shrink_gives_back_the_difference_and_never_grows():
+    budget = ByteBudget(100)
+    reserved = budget.try_acquire(80)
+    reserved = budget.shrink(reserved, 30)
+    assert (reserved, budget.in_flight) == (30, 30)
+    assert budget.shrink(reserved, 90) == 30
+    assert budget.in_flight == 30
+    assert budget.peak == 80
+
+def test_zero_limit_disables_the_budget():
+    budget = ByteBudget(0)
+    assert budget.try_acquire(10 ** 12) == 10 ** 12
+    assert budget.try_acquire(10 ** 12) == 10 ** 12
+
+def test_accounting_balances_across_threads():
+    budget = ByteBudget(1000)
+
+    def work():
+        for _ in range(500):
+            reserved = budget.try_acquire(10)
+            if reserved is not None:
+                budget.release(budget.shrink(reserved, 5))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert budget.in_flight == 0
+    assert 0 < budget.peak <= 1000
@@ -0,0 +1,30 @@
+import os
+
+from events import EventQueue
+from fake_server import FakeResponsesServer, ServerOptions
+from logic import run_engine
+from settings import Settings
+
+def _settings(server, folder, output, **changes):
+    return Settings(input_path=folder, input_type="Folder", output_folder=str(output),
+                    openai_api_key="sk-test", api_base_url=server.base_url, images_per_request=4,
+                    concurrency=1, max_retries=0, cache_bypass=True, metrics_enabled=False,
+                    prepare_workers=1, **changes)
+
+def test_failed_group_request_is_not_repeated_per_image(make_images, tmp_path):
+    images = make_images(4)
+    with FakeResponsesServer(ServerOptions(latency=0, error_rate=1.0, rate_limit_share=0)) as server:
+        summary = run_engine(_settings(server, os.path.dirname(images[0]), tmp_path), EventQueue())
+        requests = server.counters()['requests']
+
+    assert requests == 1
+    assert summary['failed'] == 4
+
+def test_malformed_group_answer_falls_back_per_image(make_images, tmp_path):
+    images = make_images(4)
+    # Every answer is cut off or wrapped in prose; the group answer is salvaged or re-asked
+    with FakeResponsesServer(ServerOptions(latency=0, malformed_rate=1.0)) as server:
+        summary = run_engine(_settings(server, os.path.dirname(images[0]), tmp_path), EventQueue())
+
+    assert summary['failed'] == 0
+    assert summary['processed'] == 4
@@ -0,0 +1,106 @@
+import errno
+import json
+import os
+
+import pytest
+
+import outputs
+from events import EventQueue
+from outputs import OutputWriter, NotPossible, undo_renames, UNDO_FILE
+
+@pytest.fixture
+def session(tmp_path):
+    renamed = tmp_path / "session" / "renamed_images"
+    renamed.mkdir(parents=True)
+    return tmp_path / "session"
+
+def _original(tmp_path, name="photo.JPG", data=b"image bytes"):
+    folder = tmp_path / "input"
+    folder.mkdir(exist_ok=True)
+    path = folder / name
+    path.write_bytes(data)
+    return str(path)
+
+def _writer(strategy, session, events=None):
+    return OutputWriter(strategy, str(session / "renamed_images"), str(session), events or EventQueue())
+
+def _fail(*args, **kwargs):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+def _no_clone(src, dst):
+    raise NotPossible("the filesystem can't clone files")
+
+def test_hardlink_shares_the_file_and_writes_nothing(tmp_path, session):
+    src = _original(tmp_path)
+    writer = _writer("hardlink", session)
+
+    new_path = writer.place(src, "a-cat")
+
+    assert os.path.basename(new_path) == "a-cat.jpg"
+    assert os.path.samefile(new_path, src)
+    assert writer.methods == {'hardlink': 1} and writer.bytes_written == 0
+
+def test_hardlink_falls_back_to_reflink_then_copy(tmp_path, session, monkeypatch):
+    monkeypatch.setattr(os, "link", _fail)
+    monkeypatch.setattr(outputs, "_clone", _no_clone)
+    events = EventQueue()
+    writer = _writer("hardlink", session, events)
+
+    first = writer.place(_original(tmp_path, "a.png"), "same")
+    second = writer.place(_original(tmp_path, "b.png"), "same")
+
+    assert os.path.basename(first) != os.path.basename(second)
+    assert writer.methods == {'copy': 2}
+    assert writer.bytes_written == 2 * len(b"image bytes")
+    warnings = [data['message'] for kind, data in events.drain() if kind == "log"]
+    # One warning per unavailable method, not per file
+    assert len(warnings) == 2
+    assert "hardlink" in warnings[0] and "reflink" in warnings[1]
+
+def test_symlink_falls_back_to_copy(tmp_path, session, monkeypatch):
+    monkeypatch.setattr(os, "symlink", _fail)
+    writer = _writer("symlink", session)
+
+    new_path = writer.place(_original(tmp_path), "x")
+
+    assert not os.path.islink(new_path)
+    assert writer.methods == {'copy': 1}
+
+def test_a_missing_original_fails_without_falling_back(tmp_path, session):
+    writer = _writer("copy", session)
+
+    with pytest.raises(OSError):
+        writer.place(str(tmp_path / "gone.png"), "x")
+
+def test_rename_records_a_manifest_that_undo_reverts(tmp_path, session):
+    originals = [_original(tmp_path, "a.png", b"a"), _original(tmp_path, "b.png", b"b")]
+    writer = _writer("rename", session)
+    renamed = [writer.place(src, f"new-{i}") for i, src in enumerate(originals)]
+    writer.close()
+
+    assert all(not os.path.exists(src) for src in originals)
+    assert [os.path.dirname(path) for path in renamed] == [str(tmp_path / "input")] * 2
+    with open(session / UNDO_FILE, encoding="utf-8") as f:
+        manifest = [json.loads(line) for line in f]
+    assert [entry['from'] for entry in manifest] == originals
+    # A torn last line from a crash is skipped
+    with open(session / UNDO_FILE, "a", encoding="utf-8") as f:
+        f.write('{"from": "x')
+
+    restored, problems = undo_renames(str(session))
+
+    assert (restored, problems) == (2, [])
+    assert [open(src, "rb").read() for src in originals] == [b"a", b"b"]
+    assert os.path.isfile(session / (UNDO_FILE + ".undone"))
+
+def test_undo_leaves_a_file_alone_when_the_original_name_is_taken(tmp_path, session):
+    src = _original(tmp_path, "a.png", b"a")
+    writer = _writer("rename", session)
+    new_path = writer.place(src, "new")
+    writer.close()
+    _original(tmp_path, "a.png", b"someone else's")
+
+    restored, problems = undo_renames(str(session))
+
+    assert restored == 0 and len(problems) == 1
+    assert os.path.exists(new_path)
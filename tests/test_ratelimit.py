@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from ratelimit import RateLimiter, backoff_delay, parse_duration, retry_after_seconds, BACKOFF_CAP
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m", 3720.0), ("2.5", 2.5), (3, 3.0),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+def test_unreadable_durations_are_none():
+    assert parse_duration("soon") is None
+    assert parse_duration(None) is None
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after_seconds({"retry-after": "2"}) == 2.0
+    assert retry_after_seconds({}) is None
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt) for attempt in range(20) for _ in range(5)]
+    assert all(0 <= delay <= BACKOFF_CAP for delay in delays)
+    assert backoff_delay(0) <= 1.0
+
+def test_unlimited_limiter_never_waits():
+    limiter = RateLimiter()
+    start = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire(10 ** 6)
+    assert time.monotonic() - start < 1.0
+
+def test_token_bucket_waits_for_refill():
+    # 600 tokens a minute: the bucket starts full and refills 10 a second
+    limiter = RateLimiter(tpm=600)
+    limiter.acquire(600)
+    start = time.monotonic()
+    limiter.acquire(3)
+    assert time.monotonic() - start >= 0.25
+    assert limiter.throttled_seconds > 0
+
+def test_pause_holds_back_requests():
+    limiter = RateLimiter()
+    limiter.pause(0.3)
+    start = time.monotonic()
+    limiter.acquire(1)
+    assert time.monotonic() - start >= 0.25
+
+def test_headers_replace_the_limits():
+    limiter = RateLimiter(rpm=100, tpm=1000)
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "50", "x-ratelimit-remaining-requests": "7",
+        "x-ratelimit-limit-tokens": "2000", "x-ratelimit-remaining-tokens": "oops",
+    })
+    snapshot = limiter.snapshot()
+    assert (snapshot["rpm_limit"], snapshot["rpm_available"]) == (50, 7)
+    assert (snapshot["tpm_limit"], snapshot["tpm_available"]) == (2000, 1000)
+
+def test_record_usage_corrects_the_estimate():
+    limiter = RateLimiter(tpm=6000)
+    limiter.acquire(100)
+    limiter.record_usage(100, 1100)
+    assert limiter.snapshot()["tpm_available"] < 5000
@@ -0,0 +1,89 @@
+import csv
+import errno
+import json
+import sqlite3
+
+import pytest
+
+from events import EventQueue
+from records import ResultWriters, parse_formats, FIELDS
+
+def test_parse_formats():
+    assert parse_formats(" JSONL, csv,jsonl,, sqlite ") == ["jsonl", "csv", "sqlite"]
+    assert parse_formats("") == []
+    with pytest.raises(ValueError):
+        parse_formats("jsonl, xml")
+
+def _write_run(session, meta=None):
+    writers = ResultWriters(["jsonl", "csv", "sqlite"], str(session), EventQueue())
+    writers.done("/in/a.png", "a cat", "A cat.", "/out/a-cat.png", meta)
+    writers.failed("/in/b.png", RuntimeError("HTTP 500"))
+    writers.done("/in/c.png", "a cat", "A cat.", "/out/a-cat-2.png", meta, duplicate_of="/in/a.png")
+    writers.close()
+    return writers
+
+def test_every_format_gets_one_record_per_image(tmp_path):
+    meta = {'tokens': 940, 'cached_tokens': 200, 'latency': 0.5, 'source': "api", 'salvaged': True}
+    writers = _write_run(tmp_path, meta)
+
+    assert sorted(writers.paths) == sorted(str(tmp_path / name) for name in
+                                           ("results.jsonl", "results.csv", "results.sqlite3"))
+    with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['status'] for line in lines] == ["done", "failed", "done"]
+    assert set(lines[0]) == set(FIELDS)
+    assert lines[0]['new_name'] == "a-cat.png" and lines[0]['tokens'] == 940 and lines[0]['salvaged']
+    assert lines[1]['error'] == "HTTP 500" and lines[1]['tokens'] == 0
+    # A near-duplicate's tokens were spent on the image it shares the result with
+    assert lines[2]['source'] == "duplicate" and lines[2]['tokens'] == 0
+
+    with open(tmp_path / "results.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row['original_path'] for row in rows] == ["/in/a.png", "/in/b.png", "/in/c.png"]
+    assert rows[1]['name'] == ""
+
+    with sqlite3.connect(tmp_path / "results.sqlite3") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3
+
+def test_a_resumed_run_appends_and_replaces_sqlite_rows(tmp_path):
+    _write_run(tmp_path)
+    # The first run crashed mid-record
+    with open(tmp_path / "results.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"time": 1, "orig')
+    with open(tmp_path / "results.csv", "a", encoding="utf-8", newline="") as f:
+        f.write('1,/in/d.png,do')
+
+    writers = ResultWriters(["jsonl", "csv", "sqlite"], str(tmp_path), EventQueue())
+    writers.done("/in/b.png", "b", "B.", "/out/b.png")
+    writers.close()
+
+    with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[-1])['original_path'] == "/in/b.png"
+    assert len(lines) == 5
+    with open(tmp_path / "results.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    # One header, the torn row, then the new one
+    assert rows[-1]['original_path'] == "/in/b.png" and rows[-1]['status'] == "done"
+    with sqlite3.connect(tmp_path / "results.sqlite3") as conn:
+        rows = conn.execute("SELECT status FROM results WHERE original_path = '/in/b.png'").fetchall()
+    assert rows == [("done",)]
+
+def test_a_file_that_fails_is_dropped_with_a_warning(tmp_path):
+    events = EventQueue()
+    writers = ResultWriters(["jsonl", "sqlite"], str(tmp_path), events)
+    jsonl = writers._writers['jsonl']
+
+    def disk_full(record):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    jsonl.write = disk_full
+
+    writers.done("/in/a.png", "a", "A.", "/out/a.png")
+    writers.done("/in/b.png", "b", "B.", "/out/b.png")
+    writers.close()
+
+    warnings = [data['message'] for kind, data in events.drain() if kind == "log" and data['level'] == "warn"]
+    assert len(warnings) == 1 and "results.jsonl" in warnings[0]
+    with sqlite3.connect(tmp_path / "results.sqlite3") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 2
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from ai_handler import parse_multi_result
+from salvage import parse_answer, clean_result, MAX_ALT_CHARS, MAX_NAME_CHARS
+
+ANSWER = {"name": "red bicycle by a wall", "alt": "A red bicycle leaning against a brick wall."}
+
+def test_clean_json_is_not_salvaged():
+    assert parse_answer(json.dumps(ANSWER)) == (ANSWER, False)
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + json.dumps(ANSWER) + "\n```",
+    "Here is the JSON you asked for:\n" + json.dumps(ANSWER) + "\nLet me know if you need more.",
+])
+def test_fences_and_prose_are_stripped(text):
+    assert parse_answer(text) == (ANSWER, True)
+
+def test_cut_off_string_is_closed_without_its_partial_word():
+    text = '{"name": "red bicycle by a wall", "alt": "A red bicycle leaning agai'
+
+    value, salvaged = parse_answer(text)
+
+    assert salvaged
+    assert value == {"name": "red bicycle by a wall", "alt": "A red bicycle leaning"}
+
+def test_dangling_key_is_dropped():
+    value, salvaged = parse_answer('{"name": "red bicycle", "alt": "A bicycle.", "extra":')
+
+    assert salvaged and value == {"name": "red bicycle", "alt": "A bicycle."}
+
+def test_cut_off_multi_image_answer_keeps_the_complete_entries():
+    text = ('{"images": [{"index": 0, "name": "a cat", "alt": "A cat asleep."}, '
+            '{"index": 1, "name": "a dog", "alt": "A dog runn')
+
+    results, salvaged = parse_multi_result(text, 3)
+
+    assert salvaged
+    assert results[0] == {"name": "a cat", "alt": "A cat asleep."}
+    assert results[1] == {"name": "a dog", "alt": "A dog"}
+    assert results[2] is None
+
+def test_multi_image_answer_drops_bad_indexes():
+    text = json.dumps({"images": [
+        {"index": 1, "name": "b", "alt": "B."},
+        {"index": 1, "name": "again", "alt": "Repeated."},
+        {"index": 7, "name": "x", "alt": "Out of range."},
+        {"index": "zero", "name": "x", "alt": "Not a number."},
+        {"index": 0, "name": "a"},
+    ]})
+
+    results, salvaged = parse_multi_result(text, 2)
+
+    assert not salvaged
+    assert results == [None, {"name": "b", "alt": "B."}]
+
+def test_fields_are_picked_out_of_broken_json():
+    value, salvaged = parse_answer('name: "x", {"name": "a cat", "alt": "A cat \\"asleep\\"." oops}}')
+
+    assert salvaged and value == {"name": "a cat", "alt": 'A cat "asleep".'}
+
+@pytest.mark.parametrize("text", ["", "   ", "I can't describe this image.", None])
+def test_nothing_to_recover_raises(text):
+    with pytest.raises(ValueError):
+        parse_answer(text)
+
+def test_clean_result_trims_at_word_boundaries():
+    long_alt = "word " * 200
+    cleaned = clean_result({"name": "  a   cat  ", "alt": long_alt})
+
+    assert cleaned["name"] == "a cat"
+    assert len(cleaned["alt"]) <= MAX_ALT_CHARS
+    assert cleaned["alt"].endswith("word")
+    assert len(clean_result({"name": "n" * 500, "alt": "A."})["name"]) == MAX_NAME_CHARS
+
+@pytest.mark.parametrize("entry", [None, [], {"name": "a"}, {"name": "a", "alt": 3}, {"name": " ", "alt": "A."}])
+def test_clean_result_rejects_unusable_entries(entry):
+    assert clean_result(entry) is None
@@ -0,0 +1,71 @@
+import os
+
+from scanner import iter_images, parse_patterns, is_session_folder, BackgroundScan
+
+def _touch(root, *rel_paths):
+    for rel in rel_paths:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+def _rel(root, paths):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path in paths]
+
+def test_parse_patterns_splits_on_commas_semicolons_and_newlines():
+    assert parse_patterns("*.jpg, raw/*; tmp*\n*.png,") == ["*.jpg", "raw/*", "tmp*", "*.png"]
+    assert parse_patterns("") == []
+
+def test_files_before_subfolders_in_name_order(tmp_path):
+    _touch(tmp_path, "b.png", "a.JPG", "notes.txt", "sub/c.webp", "sub/deeper/d.jpeg", "a_sub/e.png")
+
+    assert _rel(tmp_path, iter_images(str(tmp_path))) == ["a.JPG", "b.png"]
+    assert _rel(tmp_path, iter_images(str(tmp_path), recursive=True)) == [
+        "a.JPG", "b.png", "a_sub/e.png", "sub/c.webp", "sub/deeper/d.jpeg"]
+
+def test_include_and_exclude_patterns(tmp_path):
+    _touch(tmp_path, "keep.jpg", "skip.png", "raw/x.jpg", "raw/y.png", "other/z.jpg")
+
+    found = iter_images(str(tmp_path), recursive=True, include=["*.jpg"], exclude=["raw/x.jpg"])
+
+    assert _rel(tmp_path, found) == ["keep.jpg", "other/z.jpg"]
+
+def test_exclude_prunes_folders(tmp_path):
+    _touch(tmp_path, "a.png", "cache/b.png", "cache/inner/c.png", "keep/d.png")
+
+    found = iter_images(str(tmp_path), recursive=True, exclude=["cache"])
+
+    assert _rel(tmp_path, found) == ["a.png", "keep/d.png"]
+
+def test_prune_skips_session_folders(tmp_path):
+    _touch(tmp_path, "a.png", "session-2025-01-01-00-00-ABCD/renamed_images/a-renamed.png",
+           "session-notes/b.png")
+
+    found = iter_images(str(tmp_path), recursive=True, prune=is_session_folder)
+
+    assert _rel(tmp_path, found) == ["a.png", "session-notes/b.png"]
+
+def test_symlink_policies(tmp_path):
+    _touch(tmp_path, "real/a.png", "outside.png")
+    os.symlink(tmp_path / "outside.png", tmp_path / "real" / "link.png")
+    # A loop back to the top
+    os.symlink(tmp_path / "real", tmp_path / "real" / "loop")
+    root = str(tmp_path / "real")
+
+    assert _rel(root, iter_images(root, recursive=True, symlinks="skip")) == ["a.png"]
+    assert _rel(root, iter_images(root, recursive=True, symlinks="files")) == ["a.png", "link.png"]
+    assert _rel(root, iter_images(root, recursive=True, symlinks="follow")) == ["a.png", "link.png"]
+
+def test_unreadable_folder_is_reported(tmp_path):
+    errors = []
+
+    assert list(iter_images(str(tmp_path / "missing"), on_error=lambda path, e: errors.append(path))) == []
+    assert errors == [str(tmp_path / "missing")]
+
+def test_background_scan_delivers_everything(tmp_path):
+    _touch(tmp_path, *(f"{i:03d}.png" for i in range(50)))
+
+    scan = BackgroundScan(iter_images(str(tmp_path)))
+
+    assert scan.wait_for_first()
+    assert len(list(scan)) == 50
+    assert scan.found == 50 and scan.finished
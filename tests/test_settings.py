@@ -0,0 +1,74 @@
+import io
+import json
+import threading
+
+from altomatic import build_parser, settings_from_args
+from config import DEFAULT_CONFIG
+from events import EventQueue, JsonLinesEvents
+from settings import Settings, setting_names
+
+def test_defaults_come_from_the_config_defaults():
+    settings = Settings()
+    for name in setting_names():
+        if name in DEFAULT_CONFIG:
+            assert getattr(settings, name) == DEFAULT_CONFIG[name], name
+
+def test_from_config_ignores_ui_only_keys_and_applies_overrides():
+    config = {**DEFAULT_CONFIG, 'concurrency': 7, 'ui_theme': "Dark", 'window_geometry': "1x1"}
+
+    settings = Settings.from_config(config, concurrency=2, input_path="photos")
+
+    assert settings.concurrency == 2
+    assert settings.input_path == "photos"
+    assert not hasattr(settings, 'ui_theme')
+
+def test_with_changes_returns_a_copy():
+    settings = Settings(concurrency=3)
+
+    changed = settings.with_changes(concurrency=9)
+
+    assert (settings.concurrency, changed.concurrency) == (3, 9)
+
+def test_cli_flags_override_the_saved_config(tmp_path):
+    args = build_parser().parse_args([str(tmp_path), "--no-config", "--api-key", "sk-x",
+                                      "--concurrency", "12", "--no-scan-recursive", "--vision-detail", "low"])
+
+    settings = settings_from_args(args)
+
+    assert settings.concurrency == 12
+    assert settings.scan_recursive is False
+    assert settings.vision_detail == "low"
+    assert settings.input_type == "Folder"
+    assert settings.output_folder == str(tmp_path)
+
+def test_event_queue_keeps_order_and_counts_across_threads():
+    events = EventQueue()
+    events.log("first")
+    events.emit("progress", value=1, maximum=2)
+
+    def count():
+        for _ in range(1000):
+            events.count('tokens', 2)
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert events.drain() == [("log", {'message': "first", 'level': "info"}),
+                              ("progress", {'value': 1, 'maximum': 2})]
+    assert events.drain() == []
+    assert events.counters() == {'tokens': 8000}
+
+def test_json_lines_events_filter_by_kind():
+    stream = io.StringIO()
+    events = JsonLinesEvents(stream, kinds=["finished"])
+
+    events.log("dropped")
+    events.emit("finished", summary={'processed': 1})
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line['event'] for line in lines] == ["finished"]
+    assert lines[0]['summary'] == {'processed': 1}
+    assert events.drain() == []
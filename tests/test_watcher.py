@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from events import EventQueue
+from fake_server import FakeResponsesServer, ServerOptions
+from journal import read_session
+from settings import Settings
+from watcher import WatchRunner, SeenSet, PollWatch
+
+def _wait_for(condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def _image(path, color, size=(64, 48)):
+    Image.new("RGB", size, color).save(path)
+
+@pytest.fixture
+def watch(tmp_path):
+    """
+    Starts a polling WatchRunner over tmp_path/inbox against the fake API; yields
+    (inbox, server, runner) and stops it afterwards.
+    """
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    with FakeResponsesServer(ServerOptions(latency=0)) as server:
+        settings = Settings(input_path=str(inbox), output_folder=str(tmp_path / "out"),
+                            openai_api_key="sk-test", api_base_url=server.base_url, cache_bypass=True,
+                            metrics_enabled=False, prepare_workers=1)
+        stop = threading.Event()
+        runner = WatchRunner(settings, EventQueue, stop, settle=0.1, batch=0.0, poll=0.1)
+        thread = threading.Thread(target=runner.run, daemon=True)
+        thread.start()
+        try:
+            yield inbox, server, runner
+        finally:
+            stop.set()
+            thread.join(timeout=15)
+
+def test_new_images_are_processed_once(watch):
+    inbox, server, runner = watch
+    _image(inbox / "a.png", (200, 0, 0))
+    _image(inbox / "b.png", (0, 200, 0))
+
+    assert _wait_for(lambda: server.counters()['requests'] == 2)
+    time.sleep(0.5)
+    assert server.counters()['requests'] == 2
+    assert _wait_for(lambda: runner.session and len(read_session(runner.session).done()) == 2)
+
+def test_a_replaced_image_is_done_again(watch):
+    inbox, server, runner = watch
+    _image(inbox / "a.png", (200, 0, 0))
+    assert _wait_for(lambda: server.counters()['requests'] == 1)
+
+    _image(inbox / "a.png", (0, 0, 200), size=(80, 60))
+    stamp = time.time() + 5
+    os.utime(inbox / "a.png", (stamp, stamp))
+
+    assert _wait_for(lambda: server.counters()['requests'] == 2)
+    session = runner.session
+    assert _wait_for(lambda: len(os.listdir(os.path.join(session, "renamed_images"))) == 2)
+
+def test_seen_set_survives_a_restart(tmp_path):
+    seen = SeenSet(str(tmp_path / "seen.sqlite3"))
+    seen.mark([("/in/a.png", (10, 1), "done")], "/out/session-1")
+    seen.close()
+
+    seen = SeenSet(str(tmp_path / "seen.sqlite3"))
+    assert not seen.is_new("/in/a.png", (10, 1))
+    assert seen.is_new("/in/a.png", (11, 2))
+    assert seen.is_new("/in/b.png", (10, 1))
+    assert seen.last_session()[0] == "/out/session-1"
+    seen.close()
+
+def test_rename_strategy_is_refused(tmp_path):
+    settings = Settings(input_path=str(tmp_path), output_folder=str(tmp_path), output_strategy="rename")
+
+    with pytest.raises(ValueError):
+        WatchRunner(settings, EventQueue, threading.Event())
+
+def test_poll_watch_keeps_no_listing_and_asks_the_seen_set(tmp_path):
+    for name in ("a.png", "b.png", "c.png"):
+        _image(tmp_path / name, (1, 2, 3))
+    handled = {str(tmp_path / "a.png")}
+    watch = PollWatch(lambda: sorted(str(p) for p in tmp_path.iterdir()),
+                      lambda path, signature: path not in handled, interval=0)
+
+    assert watch.wait(0) == [str(tmp_path / "b.png"), str(tmp_path / "c.png")]
+    handled.add(str(tmp_path / "b.png"))
+    assert watch.wait(0) == [str(tmp_path / "c.png")]
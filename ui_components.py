@@ -5,18 +5,30 @@ Builds the main UI for Altomatic, with:
 - Tabs (Input, Output, Settings)
 - A separate floating Monitor window for logs
 - Additional UI controls for:
-  - Clearing / copying logs
+  - Clearing / copying logs, filtering them by level, showing raw model output
   - Resetting token usage, resetting global stats
   - Opening config folder
   - Selecting UI theme
 """
 
+import os
+import threading
+from collections import deque
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pyperclip
 
 from config import save_config, open_config_folder
-from helpers import get_image_count_in_folder
+from scanner import count_images, parse_patterns, is_session_folder
+from stages import format_stage_times
+from runstats import format_stats
+
+# Queued Monitor lines are written to the Text widget in one go this often
+MONITOR_FLUSH_MS = 150
+
+# Order of log levels for the Monitor's level filter
+LOG_LEVEL_RANK = {'debug': 0, 'raw': 0, 'info': 1, 'token': 1, 'success': 1, 'warn': 2, 'error': 3}
+MONITOR_LEVELS = {"Debug": 0, "Info": 1, "Warnings": 2, "Errors": 3}
 
 ################################################################################
 # MAIN BUILD_UI
@@ -50,10 +62,16 @@ def build_ui(root, user_config):
         'input_type':        tk.StringVar(value="Folder"),
         'input_path':        tk.StringVar(value=""),
         'image_count':       tk.StringVar(value=''),
+        'scan_recursive':    tk.BooleanVar(value=user_config.get('scan_recursive', False)),
+        'scan_include':      tk.StringVar(value=user_config.get('scan_include', "")),
+        'scan_exclude':      tk.StringVar(value=user_config.get('scan_exclude', "")),
+        'scan_symlinks':     tk.StringVar(value=user_config.get('scan_symlinks', "files")),
 
         # Output
         'custom_output_path': tk.StringVar(value=user_config.get('custom_output_path', "")),
         'output_folder_option': tk.StringVar(value=user_config.get('output_folder_option', "Same as input")),
+        'output_strategy':   tk.StringVar(value=user_config.get('output_strategy', "copy")),
+        'result_formats':    tk.StringVar(value=user_config.get('result_formats', "")),
 
         # Settings
         'openai_api_key':    tk.StringVar(value=user_config.get('openai_api_key', "")),
@@ -65,15 +83,49 @@ def build_ui(root, user_config):
         'ui_language':       tk.StringVar(value=user_config.get('ui_language', "English")),
         'tesseract_path':    tk.StringVar(value=user_config.get('tesseract_path', "")),
         'ocr_language':      tk.StringVar(value=user_config.get('ocr_language', "eng")),
+        'prepare_workers':   tk.IntVar(value=user_config.get('prepare_workers', 2)),
+        'prepare_prefetch':  tk.IntVar(value=user_config.get('prepare_prefetch', 8)),
         'ui_theme':          tk.StringVar(value=user_config.get('ui_theme', "Light")),
+        'concurrency':       tk.IntVar(value=user_config.get('concurrency', 4)),
+        'images_per_request': tk.IntVar(value=user_config.get('images_per_request', 1)),
+        'http_pool_size':    tk.IntVar(value=user_config.get('http_pool_size', 8)),
+        'http_timeout':      tk.IntVar(value=user_config.get('http_timeout', 60)),
+        'http2_enabled':     tk.BooleanVar(value=user_config.get('http2_enabled', False)),
+        'cache_bypass':      tk.BooleanVar(value=user_config.get('cache_bypass', False)),
+        'cache_max_mb':      tk.IntVar(value=user_config.get('cache_max_mb', 50)),
+        'cache_max_age_days': tk.IntVar(value=user_config.get('cache_max_age_days', 90)),
+        'metrics_enabled':   tk.BooleanVar(value=user_config.get('metrics_enabled', True)),
+        'metrics_textfile':  tk.StringVar(value=user_config.get('metrics_textfile', "")),
+        'upload_format':     tk.StringVar(value=user_config.get('upload_format', "JPEG")),
+        'upload_quality':    tk.IntVar(value=user_config.get('upload_quality', 85)),
+        'max_inflight_mb':   tk.IntVar(value=user_config.get('max_inflight_mb', 512)),
+        'dedup_enabled':     tk.BooleanVar(value=user_config.get('dedup_enabled', False)),
+        'dedup_hash':        tk.StringVar(value=user_config.get('dedup_hash', "phash")),
+        'dedup_distance':    tk.IntVar(value=user_config.get('dedup_distance', 6)),
+        'processing_mode':   tk.StringVar(value=user_config.get('processing_mode', "Sync")),
+        'api_base_url':      tk.StringVar(value=user_config.get('api_base_url', "")),
+        'rate_limit_rpm':    tk.IntVar(value=user_config.get('rate_limit_rpm', 500)),
+        'rate_limit_tpm':    tk.IntVar(value=user_config.get('rate_limit_tpm', 200000)),
+        'max_retries':       tk.IntVar(value=user_config.get('max_retries', 5)),
+        'budget_tokens':     tk.IntVar(value=user_config.get('budget_tokens', 0)),
+        'budget_cost':       tk.DoubleVar(value=user_config.get('budget_cost', 0.0)),
 
         # Logs and monitor
-        'logs': [],
+        'monitor_max_lines': tk.IntVar(value=user_config.get('monitor_max_lines', 5000)),
+        'monitor_level':     tk.StringVar(value=user_config.get('monitor_level', "Debug")),
+        'monitor_verbose':   tk.BooleanVar(value=user_config.get('monitor_verbose', False)),
+        'logs': deque(maxlen=max(100, user_config.get('monitor_max_lines', 5000))),
+        'monitor_pending': [],
+        'monitor_flush_id': None,
         'monitor_window': None,
         'monitor_text': None,
+        'limiter_status': tk.StringVar(value="Rate limiter: idle"),
+        'stage_status':   tk.StringVar(value="Stage times: -"),
+        'live_stats':     tk.StringVar(value="No run yet."),
 
         # Token usage
         'total_tokens': tk.IntVar(value=0),
+        'cached_tokens': tk.IntVar(value=0),
 
         # menubar
         'menubar': menubar
@@ -91,11 +143,11 @@ def build_ui(root, user_config):
     # Fill each tab
     _build_tab_input(tab_input, state)
     _build_tab_output(tab_output, state)
-    _build_tab_settings(tab_settings, state)
+    _build_tab_settings(_make_scrollable(tab_settings), state)
 
     # In the Output tab, let's place a label to show token usage
     state['lbl_token_usage'] = ttk.Label(tab_output, text="Tokens used: 0")
-    state['lbl_token_usage'].grid(row=2, column=0, columnspan=2, sticky='w', padx=5, pady=10)
+    state['lbl_token_usage'].grid(row=4, column=0, columnspan=2, sticky='w', padx=5, pady=10)
 
     # Status bar (bottom)
     status_frame = ttk.Frame(main_frame)
@@ -153,10 +205,48 @@ def _build_tab_input(frame, state):
     state['input_entry'] = input_entry  # for drag&drop
     ttk.Button(frame, text="Browse", command=lambda: _select_input(state)).grid(row=row, column=2, padx=5, pady=2)
 
+
+    # Folder scan options
+    row += 1
+    ttk.Checkbutton(
+        frame,
+        text="Include Subfolders",
+        variable=state['scan_recursive']
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=2)
+
+    row += 1
+    ttk.Label(frame, text="Only Files Matching:").grid(row=row, column=0, sticky='w', padx=5, pady=2)
+    ttk.Entry(frame, textvariable=state['scan_include'], width=30).grid(row=row, column=1, sticky='ew', padx=5, pady=2)
+
+    row += 1
+    ttk.Label(frame, text="Skip Matching:").grid(row=row, column=0, sticky='w', padx=5, pady=2)
+    ttk.Entry(frame, textvariable=state['scan_exclude'], width=30).grid(row=row, column=1, sticky='ew', padx=5, pady=2)
+
+    row += 1
+    ttk.Label(frame, text="Symlinks:").grid(row=row, column=0, sticky='w', padx=5, pady=2)
+    ttk.OptionMenu(
+        frame,
+        state['scan_symlinks'],
+        state['scan_symlinks'].get(),
+        "skip", "files", "follow"
+    ).grid(row=row, column=1, sticky='w')
+
     row += 1
     process_btn = ttk.Button(frame, text="Describe Images")
     process_btn.grid(row=row, column=1, pady=10)
     state['process_button'] = process_btn
+    # Dry run: projects tokens, cost and duration from the image headers alone
+    state['estimate_button'] = ttk.Button(frame, text="Estimate Cost")
+    state['estimate_button'].grid(row=row, column=2, padx=5, pady=10)
+
+    # Continue an interrupted session (commands are connected in main.py)
+    row += 1
+    session_frame = ttk.Frame(frame)
+    session_frame.grid(row=row, column=1, pady=(0, 10))
+    state['resume_button'] = ttk.Button(session_frame, text="Resume Session...")
+    state['resume_button'].pack(side='left', padx=5)
+    state['retry_button'] = ttk.Button(session_frame, text="Retry Failures...")
+    state['retry_button'].pack(side='left', padx=5)
 
 ################################################################################
 # TABS: OUTPUT
@@ -184,7 +274,29 @@ def _build_tab_output(frame, state):
     custom_out_entry.grid(row=row, column=1, sticky='ew', padx=5, pady=2)
     ttk.Button(frame, text="Browse", command=lambda: _select_output_folder(state)).grid(row=row, column=2, padx=5, pady=2)
 
-    # A label for token usage is placed in build_ui at the end
+    # How the renamed files are made; hardlink/reflink/symlink fall back to a copy when
+    # the filesystem can't do them
+    row += 1
+    ttk.Label(frame, text="Output Files:").grid(row=row, column=0, sticky='w', padx=5, pady=2)
+    ttk.OptionMenu(
+        frame,
+        state['output_strategy'],
+        state['output_strategy'].get(),
+        "copy", "hardlink", "reflink", "symlink", "rename"
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=2)
+
+    # Machine-readable result files, written one record per image as it is saved
+    row += 1
+    ttk.Label(frame, text="Result Files:").grid(row=row, column=0, sticky='w', padx=5, pady=2)
+    ttk.Entry(frame, textvariable=state['result_formats'], width=30).grid(row=row, column=1, sticky='ew', padx=5, pady=2)
+    ttk.Label(frame, text="jsonl, csv, sqlite").grid(row=row, column=2, sticky='w', padx=5, pady=2)
+
+    # A label for token usage is placed in build_ui at the end (row 4)
+
+    # Live throughput, latency and ETA of the current run
+    stats_frame = ttk.LabelFrame(frame, text="Live Stats", padding=5)
+    stats_frame.grid(row=5, column=0, columnspan=3, sticky='ew', padx=5, pady=5)
+    ttk.Label(stats_frame, textvariable=state['live_stats'], justify='left').pack(anchor='w')
 
 ################################################################################
 # TABS: SETTINGS
@@ -260,7 +372,21 @@ def _build_tab_settings(frame, state):
         "low", "high", "auto"
     ).grid(row=row, column=1, sticky='w')
 
-    # 7) OCR
+    # 7) Upload format & quality
+    row += 1
+    ttk.Label(frame, text="Upload Format:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.OptionMenu(
+        frame,
+        state['upload_format'],
+        state['upload_format'].get(),
+        "JPEG", "WEBP", "Original"
+    ).grid(row=row, column=1, sticky='w')
+
+    row += 1
+    ttk.Label(frame, text="Upload Quality:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=30, to=100, textvariable=state['upload_quality'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 8) OCR
     row += 1
     ocr_checkbox = ttk.Checkbutton(
         frame,
@@ -279,7 +405,133 @@ def _build_tab_settings(frame, state):
     ttk.Label(frame, text="OCR Language:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
     ttk.Entry(frame, textvariable=state['ocr_language'], width=10).grid(row=row, column=1, sticky='w', padx=5, pady=5)
 
-    # 8) Reset token usage & stats
+    row += 1
+    ttk.Label(frame, text="Prep Workers:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=32, textvariable=state['prepare_workers'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Prep Look-ahead:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=256, textvariable=state['prepare_prefetch'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 9) Near-duplicates
+    row += 1
+    ttk.Checkbutton(
+        frame,
+        text="Reuse Results for Near-Duplicates",
+        variable=state['dedup_enabled']
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Duplicate Hash:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.OptionMenu(
+        frame,
+        state['dedup_hash'],
+        state['dedup_hash'].get(),
+        "ahash", "dhash", "phash"
+    ).grid(row=row, column=1, sticky='w')
+
+    row += 1
+    ttk.Label(frame, text="Duplicate Distance:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=32, textvariable=state['dedup_distance'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 10) Processing mode & concurrency
+    row += 1
+    ttk.Label(frame, text="Processing Mode:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.OptionMenu(
+        frame,
+        state['processing_mode'],
+        state['processing_mode'].get(),
+        "Sync", "Batch"
+    ).grid(row=row, column=1, sticky='w')
+
+    row += 1
+    ttk.Label(frame, text="Parallel Requests:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=32, textvariable=state['concurrency'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Images per Request:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=10, textvariable=state['images_per_request'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="In-flight Memory (MB):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=16384, textvariable=state['max_inflight_mb'], width=6).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 11) Connection
+    row += 1
+    ttk.Label(frame, text="API Base URL:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Entry(frame, textvariable=state['api_base_url'], width=40).grid(row=row, column=1, sticky='ew', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Connection Pool Size:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=64, textvariable=state['http_pool_size'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Request Timeout (s):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=5, to=600, textvariable=state['http_timeout'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Checkbutton(
+        frame,
+        text="Use HTTP/2",
+        variable=state['http2_enabled']
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 12) Rate limits & retries
+    row += 1
+    ttk.Label(frame, text="Requests / Minute:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=100000, textvariable=state['rate_limit_rpm'], width=8).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Tokens / Minute:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=100000000, increment=10000, textvariable=state['rate_limit_tpm'], width=10).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Max Retries:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=20, textvariable=state['max_retries'], width=5).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 13) Budget (0 = no cap)
+    row += 1
+    ttk.Label(frame, text="Token Budget per Run:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=1000000000, increment=100000, textvariable=state['budget_tokens'], width=12).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Cost Budget per Run ($):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=0, to=100000, increment=0.5, format="%.2f", textvariable=state['budget_cost'], width=10).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 14) Result cache
+    row += 1
+    ttk.Checkbutton(
+        frame,
+        text="Bypass Result Cache",
+        variable=state['cache_bypass']
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Cache Size Limit (MB):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=10000, textvariable=state['cache_max_mb'], width=6).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Cache Max Age (days):").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=1, to=3650, textvariable=state['cache_max_age_days'], width=6).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 15) Metrics
+    row += 1
+    ttk.Checkbutton(
+        frame,
+        text="Record Stage Metrics (metrics.json)",
+        variable=state['metrics_enabled']
+    ).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    row += 1
+    ttk.Label(frame, text="Prometheus Textfile:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Entry(frame, textvariable=state['metrics_textfile'], width=40).grid(row=row, column=1, sticky='ew', padx=5, pady=5)
+
+    # 16) Monitor
+    row += 1
+    ttk.Label(frame, text="Monitor Max Lines:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
+    ttk.Spinbox(frame, from_=100, to=1000000, increment=1000, textvariable=state['monitor_max_lines'], width=8).grid(row=row, column=1, sticky='w', padx=5, pady=5)
+
+    # 17) Reset token usage & stats
     row += 1
     ttk.Button(frame, text="Reset Token Usage", command=lambda: _reset_token_usage(state)).grid(row=row, column=1, sticky='e', padx=5, pady=5)
     row += 1
@@ -289,6 +541,32 @@ def _build_tab_settings(frame, state):
 # HELPER FUNCTIONS FOR TABS
 ################################################################################
 
+def _make_scrollable(frame):
+    """
+    Fills 'frame' with a vertically scrollable canvas and returns the inner frame
+    to build widgets into (the Settings tab is taller than the window).
+    """
+    frame.columnconfigure(0, weight=1)
+    frame.rowconfigure(0, weight=1)
+    canvas = tk.Canvas(frame, highlightthickness=0, borderwidth=0)
+    scrollbar = ttk.Scrollbar(frame, orient='vertical', command=canvas.yview)
+    inner = ttk.Frame(canvas)
+
+    window_id = canvas.create_window((0, 0), window=inner, anchor='nw')
+    inner.bind('<Configure>', lambda e: canvas.configure(scrollregion=canvas.bbox('all')))
+    canvas.bind('<Configure>', lambda e: canvas.itemconfigure(window_id, width=e.width))
+    canvas.configure(yscrollcommand=scrollbar.set)
+
+    canvas.grid(row=0, column=0, sticky='nsew')
+    scrollbar.grid(row=0, column=1, sticky='ns')
+
+    # Scroll with the mouse wheel while the pointer is over the tab
+    def on_wheel(event):
+        canvas.yview_scroll(int(-event.delta / 120) or (-1 if event.delta > 0 else 1), 'units')
+    inner.bind('<Enter>', lambda e: canvas.bind_all('<MouseWheel>', on_wheel))
+    inner.bind('<Leave>', lambda e: canvas.unbind_all('<MouseWheel>'))
+    return inner
+
 def _select_input(state):
     """
     Lets the user pick either a folder or a single file, based on input_type.
@@ -300,10 +578,55 @@ def _select_input(state):
     if path:
         state['input_path'].set(path)
         if state['input_type'].get() == "Folder":
-            count = get_image_count_in_folder(path)
+            refresh_image_count(state, "{count} image(s) selected.")
         else:
-            count = 1
-        state['image_count'].set(f"{count} image(s) selected.")
+            state['image_count'].set("1 image(s) selected.")
+
+def refresh_image_count(state, template="{count} image(s) found."):
+    """
+    Counts the images the current scan options select in the input folder and shows
+    the result in state['image_count']. The count runs on a background thread,
+    so a huge (network) folder doesn't freeze the window; a newer count replaces an older one.
+    """
+    path = state['input_path'].get()
+    if state['input_type'].get() != "Folder" or not os.path.isdir(path):
+        return
+    options = {
+        'recursive': state['scan_recursive'].get(),
+        'include': parse_patterns(state['scan_include'].get()),
+        'exclude': parse_patterns(state['scan_exclude'].get()),
+        'symlinks': state['scan_symlinks'].get(),
+        'prune': is_session_folder,
+    }
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(count=count_images(path, **options)), daemon=True)
+    state['count_worker'] = worker
+    state['image_count'].set("Counting images...")
+    worker.start()
+
+    def poll():
+        if state.get('count_worker') is not worker:
+            return  # a newer count took over
+        if worker.is_alive():
+            state['root'].after(100, poll)
+            return
+        state['image_count'].set(template.format(count=result.get('count', 0)))
+    state['root'].after(100, poll)
+
+def schedule_image_count(state, delay_ms=600):
+    """
+    Re-counts the input folder once the scan options stop changing
+    (called from traces on the scan_* variables).
+    """
+    root = state['root']
+    if state.get('count_after_id'):
+        root.after_cancel(state['count_after_id'])
+
+    def start():
+        state['count_after_id'] = None
+        refresh_image_count(state)
+
+    state['count_after_id'] = root.after(delay_ms, start)
 
 def _select_output_folder(state):
     path = filedialog.askdirectory()
@@ -338,6 +661,7 @@ def _reset_token_usage(state):
     Reset the total token usage to 0.
     """
     state['total_tokens'].set(0)
+    state['cached_tokens'].set(0)
     if 'lbl_token_usage' in state:
         state['lbl_token_usage'].config(text="Tokens used: 0")
     append_monitor_colored(state, "Token usage reset to 0", "warn")
@@ -370,7 +694,30 @@ def show_monitor_window(state):
     win.geometry("950x500")
     win.resizable(True, True)
 
-    text_area = tk.Text(win, wrap='word')
+    # Live rate-limiter state (updated from engine events)
+    ttk.Label(win, textvariable=state['limiter_status'], anchor='w').pack(side='top', fill='x', padx=5, pady=2)
+    # Average time per pipeline stage (OCR, preprocessing, API)
+    ttk.Label(win, textvariable=state['stage_status'], anchor='w').pack(side='top', fill='x', padx=5, pady=2)
+
+    # Level filter and raw output toggle
+    filter_frame = ttk.Frame(win)
+    filter_frame.pack(side='top', fill='x', padx=5, pady=2)
+    ttk.Label(filter_frame, text="Show:").pack(side='left')
+    ttk.OptionMenu(
+        filter_frame,
+        state['monitor_level'],
+        state['monitor_level'].get(),
+        *MONITOR_LEVELS,
+        command=lambda _: _render_monitor(state)
+    ).pack(side='left', padx=5)
+    ttk.Checkbutton(
+        filter_frame,
+        text="Keep raw model output",
+        variable=state['monitor_verbose'],
+        command=lambda: _render_monitor(state)
+    ).pack(side='left', padx=5)
+
+    text_area = tk.Text(win, wrap='word', state='disabled')
     text_area.pack(side='left', fill='both', expand=True)
     scrollbar = ttk.Scrollbar(win, command=text_area.yview)
     scrollbar.pack(side='right', fill='y')
@@ -383,6 +730,7 @@ def show_monitor_window(state):
     text_area.tag_config("success", foreground="green")
     text_area.tag_config("debug", foreground="purple")
     text_area.tag_config("token", foreground="#009688")
+    text_area.tag_config("raw", foreground="gray")
 
     # Buttons for clearing and copying logs
     btn_frame = ttk.Frame(win)
@@ -396,16 +744,50 @@ def show_monitor_window(state):
     state['monitor_text'] = text_area
 
     # Show existing logs
-    for msg in state['logs']:
-        _write_monitor_line_colored(state, msg)
+    _render_monitor(state)
+
+def update_limiter_status(state, snapshot: dict):
+    """
+    Shows a ratelimit.RateLimiter snapshot in the Monitor's status line.
+    """
+    def budget(available, limit):
+        return f"{available:,}/{limit:,}" if limit else "unlimited"
+
+    text = (
+        f"Rate limiter — requests/min: {budget(snapshot['rpm_available'], snapshot['rpm_limit'])}"
+        f" · tokens/min: {budget(snapshot['tpm_available'], snapshot['tpm_limit'])}"
+        f" · waiting: {snapshot['waiting']}"
+        f" · throttled: {snapshot['throttled_seconds']}s"
+    )
+    if snapshot['paused_for'] > 0:
+        text += f" · paused {snapshot['paused_for']}s (retry-after)"
+    state['limiter_status'].set(text)
+
+def update_stage_status(state, snapshot: dict):
+    """
+    Shows a stages.StageTimes snapshot (average seconds per stage) in the Monitor.
+    """
+    state['stage_status'].set("Stage times (avg) — " + (format_stage_times(snapshot) or "-"))
+
+def update_live_stats(state, snapshot):
+    """
+    Shows a runstats.RunStats snapshot in the Output tab (None resets it for a new run).
+    """
+    if snapshot is None:
+        state['live_stats'].set("Waiting for the first results…")
+    else:
+        state['live_stats'].set("\n".join(format_stats(snapshot)))
 
 def _clear_monitor(state):
     """
     Clears both the in-memory logs and the text widget content.
     """
     state['logs'].clear()
+    state['monitor_pending'].clear()
     if state['monitor_text']:
+        state['monitor_text'].config(state='normal')
         state['monitor_text'].delete('1.0', 'end')
+        state['monitor_text'].config(state='disabled')
 
 def _copy_monitor(state):
     """
@@ -417,25 +799,87 @@ def _copy_monitor(state):
     pyperclip.copy(text)
     messagebox.showinfo("Copied", "Log text copied to clipboard.")
 
+def set_monitor_max_lines(state):
+    """
+    Applies a new state['monitor_max_lines'] to the log ring buffer, keeping the newest lines.
+    """
+    try:
+        max_lines = max(100, int(state['monitor_max_lines'].get()))
+    except (tk.TclError, ValueError):
+        return
+    if max_lines != state['logs'].maxlen:
+        state['logs'] = deque(state['logs'], maxlen=max_lines)
+
 def append_monitor_colored(state, message: str, level: str = "info"):
     """
-    Appends a message to logs and writes it in the text widget with a color tag.
-    level can be: 'info', 'warn', 'error', 'success', 'debug', 'token'
+    Appends a message to logs and queues it for the text widget with a color tag.
+    level can be: 'info', 'warn', 'error', 'success', 'debug', 'token', 'raw'
+    The logs are a ring buffer of the newest 'monitor_max_lines' lines; raw model output
+    is only kept in verbose mode. Queued lines reach the widget on a timer, in one insert.
     """
+    if level == "raw" and not state['monitor_verbose'].get():
+        return
     formatted = f"[{level.upper()}] {message}"
     state['logs'].append((formatted, level))
-    _write_monitor_line_colored(state, (formatted, level))
+    if not state['monitor_text']:
+        return
+
+    state['monitor_pending'].append((formatted, level))
+    if state['monitor_flush_id'] is None:
+        root = state.get('root')
+        if root is None:
+            _flush_monitor(state)
+        else:
+            state['monitor_flush_id'] = root.after(MONITOR_FLUSH_MS, lambda: _flush_monitor(state))
 
-def _write_monitor_line_colored(state, log_item):
+def _visible(state, level):
     """
-    Writes a single line to the monitor text widget with color coding.
+    Whether the Monitor's current filter shows lines of 'level'.
     """
-    if not state['monitor_text']:
+    if level == "raw" and not state['monitor_verbose'].get():
+        return False
+    return LOG_LEVEL_RANK.get(level, 1) >= MONITOR_LEVELS.get(state['monitor_level'].get(), 0)
+
+def _flush_monitor(state):
+    """
+    Writes the queued lines to the monitor text widget with one insert, then trims
+    the widget to 'monitor_max_lines' lines.
+    """
+    state['monitor_flush_id'] = None
+    pending = state['monitor_pending'][-state['logs'].maxlen:]
+    state['monitor_pending'] = []
+    text_widget = state['monitor_text']
+    if not text_widget or not text_widget.winfo_exists():
+        state['monitor_text'] = None
         return
+    _insert_lines(state, text_widget, pending)
+
+def _render_monitor(state):
+    """
+    Rewrites the monitor text widget from the ring buffer (after the filter changed).
+    """
     text_widget = state['monitor_text']
-    text, level = log_item
+    if not text_widget:
+        return
+    state['monitor_pending'].clear()
+    text_widget.config(state='normal')
+    text_widget.delete('1.0', 'end')
+    text_widget.config(state='disabled')
+    _insert_lines(state, text_widget, state['logs'])
+
+def _insert_lines(state, text_widget, lines):
+    chunks = []
+    for text, level in lines:
+        if _visible(state, level):
+            chunks.extend((text + '\n', level))
+    if not chunks:
+        return
     text_widget.config(state='normal')
-    text_widget.insert('end', text + '\n', level)
+    text_widget.insert('end', *chunks)
+    # Each line can span several widget lines (raw output), so trim by widget lines
+    excess = int(text_widget.index('end-1c').split('.')[0]) - state['logs'].maxlen
+    if excess > 0:
+        text_widget.delete('1.0', f'{excess + 1}.0')
     text_widget.see('end')
     text_widget.config(state='disabled')
 
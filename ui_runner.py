@@ -0,0 +1,274 @@
+"""
+ui_runner.py
+
+Runs the processing engine (logic.run_engine) for the Tk UI:
+- Validates the input and copies the Tk variables into a settings.Settings object
+- Resumes an earlier session, or retries only its failures
+- Runs a dry-run cost estimate (logic.run_estimate) and shows its projection
+- Starts the engine on a background thread
+- Drains its events with root.after and applies them to the widgets
+  (monitor log, progress bar, token label, live stats, rate-limiter and stage-time status,
+  dialogs)
+- Pre-warms the API connection when a key is entered
+"""
+
+import os
+import threading
+from tkinter import messagebox, filedialog
+from ai_handler import prewarm_client
+from events import EventQueue
+from helpers import get_output_folder
+from journal import has_journal, FAILED_LOG
+from config import DEFAULT_CONFIG, read_setting
+from logic import run_engine, run_estimate
+from settings import Settings, setting_names
+from stages import format_stage_times
+from outputs import format_output_methods
+from runstats import format_stats
+from estimate import format_estimate
+from ui_components import (
+    append_monitor_colored,
+    update_limiter_status,
+    update_stage_status,
+    update_live_stats,
+)
+
+# How often (ms) the UI drains engine events
+EVENT_POLL_MS = 50
+
+def snapshot_settings(state) -> Settings:
+    """
+    Copies everything the engine needs out of the Tk variables into a Settings object.
+    Numbers are clamped to their ranges; one that isn't a number falls back to its default.
+    Must be called on the Tk thread.
+    """
+    values = {name: (read_setting(state, name) if name in DEFAULT_CONFIG else state[name].get())
+              for name in setting_names() if name in state}
+    values['openai_api_key'] = values['openai_api_key'].strip()
+    values['api_base_url'] = values['api_base_url'].strip()
+    values['output_folder'] = get_output_folder(state)
+    return Settings(**values)
+
+def process_images(state):
+    """
+    Button callback: validates the input on the Tk thread, then starts the engine
+    on a background thread and polls its events until it finishes.
+    """
+
+    if not _check_api_key(state):
+        return
+
+    # Validate input path
+    in_path = state['input_path'].get()
+    if not os.path.exists(in_path):
+        append_monitor_colored(state, "[ERROR] Input path does not exist.", "error")
+        messagebox.showerror("Invalid Input", "Input path does not exist.")
+        return
+
+    _start_run(state, snapshot_settings(state))
+
+def resume_session(state, retry_failures=False):
+    """
+    Button callback: asks for an earlier session folder and continues it, skipping
+    the images its journal already has (or re-running only its failures).
+    """
+    if not _check_api_key(state):
+        return
+
+    session_path = filedialog.askdirectory(title="Choose a session folder")
+    if not session_path:
+        return
+    if not has_journal(session_path) and not (
+            retry_failures and os.path.isfile(os.path.join(session_path, FAILED_LOG))):
+        what = "a journal or failed.log" if retry_failures else "a journal"
+        append_monitor_colored(state, f"[ERROR] {session_path} has no {what}.", "error")
+        messagebox.showerror("Not a Session", f"This folder has no {what} to resume from.")
+        return
+
+    settings = snapshot_settings(state).with_changes(
+        resume_session=session_path, retry_failures=retry_failures)
+    _start_run(state, settings)
+
+def estimate_cost(state):
+    """
+    Button callback: a dry run over the input that reads only image headers and shows
+    the projected tokens, cost and duration. Nothing is sent to the API.
+    """
+    in_path = state['input_path'].get()
+    if not os.path.exists(in_path):
+        append_monitor_colored(state, "[ERROR] Input path does not exist.", "error")
+        messagebox.showerror("Invalid Input", "Input path does not exist.")
+        return
+
+    _set_run_buttons(state, 'disabled')
+    events = EventQueue()
+    worker = threading.Thread(target=_estimate_thread, args=(snapshot_settings(state), events), daemon=True)
+    worker.start()
+    state['root'].after(EVENT_POLL_MS, _pump_events, state, events)
+
+def _check_api_key(state) -> bool:
+    if state['openai_api_key'].get().strip():
+        return True
+    append_monitor_colored(state, "[ERROR] Missing API Key.", "error")
+    messagebox.showerror("Missing API Key", "Please enter your OpenAI API key in the Settings tab.")
+    return False
+
+def _start_run(state, settings):
+    """
+    Resets the per-run UI, then runs the engine on a background thread.
+    """
+    # Reset total tokens for this run
+    state['total_tokens'].set(0)
+    state['cached_tokens'].set(0)
+    _update_token_label(state)
+    state['progress_bar']['value'] = 0
+    update_live_stats(state, None)
+
+    # Possibly track global images
+    if 'global_images_count' not in state:
+        from tkinter import IntVar
+        state['global_images_count'] = IntVar(value=0)
+
+    # Don't let a second click start another run while this one is going
+    _set_run_buttons(state, 'disabled')
+
+    events = EventQueue()
+    worker = threading.Thread(target=_engine_thread, args=(settings, events), daemon=True)
+    worker.start()
+    state['root'].after(EVENT_POLL_MS, _pump_events, state, events)
+
+def _pump_events(state, events):
+    """
+    Applies pending engine events to the UI, then re-schedules itself
+    until the engine reports 'finished'.
+    """
+    for kind, data in events.drain():
+        if kind == "log":
+            append_monitor_colored(state, data['message'], data['level'])
+        elif kind == "progress":
+            state['progress_bar']['maximum'] = data['maximum']
+            state['progress_bar']['value'] = data['value']
+        elif kind == "tokens":
+            state['total_tokens'].set(state['total_tokens'].get() + data['used'])
+            state['cached_tokens'].set(state['cached_tokens'].get() + data.get('cached', 0))
+            _update_token_label(state)
+        elif kind == "limiter":
+            update_limiter_status(state, data)
+        elif kind == "stages":
+            update_stage_status(state, data['stages'])
+        elif kind == "stats":
+            update_live_stats(state, data['stats'])
+        elif kind == "estimate":
+            messagebox.showinfo("Estimate", "\n".join(format_estimate(data['estimate'])))
+        elif kind == "alert":
+            _show_alert(data['level'], data['title'], data['message'])
+        elif kind == "finished":
+            _set_run_buttons(state, 'normal')
+            if data['summary']:
+                _show_summary(state, data['summary'])
+            return
+    state['root'].after(EVENT_POLL_MS, _pump_events, state, events)
+
+def _set_run_buttons(state, button_state):
+    for key in ('process_button', 'estimate_button', 'resume_button', 'retry_button'):
+        if key in state:
+            state[key].config(state=button_state)
+
+def _update_token_label(state):
+    if 'lbl_token_usage' in state:
+        cached = state['cached_tokens'].get()
+        state['lbl_token_usage'].config(
+            text=f"Tokens used: {state['total_tokens'].get()}" + (f" ({cached} cached)" if cached else ""))
+
+def _show_alert(level, title, message):
+    if level == "error":
+        messagebox.showerror(title, message)
+    elif level == "warn":
+        messagebox.showwarning(title, message)
+    else:
+        messagebox.showinfo(title, message)
+
+def _show_summary(state, summary):
+    """
+    Updates the global count and shows the end-of-run message.
+    """
+    old_count = state['global_images_count'].get()
+    new_count = old_count + summary['processed']
+    state['global_images_count'].set(new_count)
+
+    total_tokens = state['total_tokens'].get()
+    msg = (
+        f"✅ Processed {summary['processed']} image(s)"
+        + (f" ({summary['skipped']} already in this session)" if summary['skipped'] else "") + ".\n"
+        + (f"Near-duplicates that reused a result: {summary['duplicates']}\n" if summary['duplicates'] else "") +
+        f"Session folder: {summary['session_path']}\n"
+        f"Output file: {os.path.basename(summary['output_file'])}\n"
+        + (f"Result files: {', '.join(os.path.basename(p) for p in summary['result_files'])}\n"
+           if summary['result_files'] else "") + "\n"
+        f"Token usage this run: {total_tokens}"
+        + (f" ({summary['cached_tokens']} input tokens from the prompt cache)" if summary['cached_tokens'] else "") + "\n"
+        f"Cost: ~${summary['cost']:.4f}\n"
+        + (f"Run budget reached: {summary['unsent']} image(s) not sent; resume the session to continue.\n"
+           if summary['budget_stopped'] else "") +
+        f"Average time per image: {summary['avg_latency']:.2f}s\n"
+        f"Cache: {summary['cache_hits']} hit(s), {summary['cache_misses']} miss(es)\n"
+        f"Upload saved: {summary['bytes_saved'] / (1024 * 1024):.1f} MB, "
+        f"~{summary['image_tokens_saved']} image tokens\n"
+        f"Output files: {format_output_methods(summary['output_methods'])}, "
+        f"{summary['bytes_written'] / (1024 * 1024):.1f} MB written\n"
+        f"Retries: {summary['retries']} ({summary['rate_limited']} rate-limited)\n"
+        f"Malformed answers: {summary['salvaged']} salvaged locally, {summary['parse_retries']} asked again\n"
+        f"Stage times (avg): {format_stage_times(summary['stages']) or '-'}\n"
+        + "".join(line + "\n" for line in format_stats(summary['throughput'])) +
+        f"Peak memory: {summary['peak_rss'] / (1024 * 1024):.0f} MB "
+        f"(in-flight payloads: {summary['peak_inflight'] / (1024 * 1024):.0f} MB)\n"
+        f"Total images analyzed overall: {new_count}"
+    )
+    append_monitor_colored(state, "[PROCESS END] " + msg.replace("\n"," | "), "info")
+    messagebox.showinfo("Done", msg)
+
+def schedule_prewarm(state, delay_ms=800):
+    """
+    Pre-warms the shared API connection in the background once the API key
+    stops changing (called from a trace on state['openai_api_key']).
+    """
+    root = state['root']
+    if state.get('prewarm_after_id'):
+        root.after_cancel(state['prewarm_after_id'])
+
+    def start():
+        state['prewarm_after_id'] = None
+        api_key = state['openai_api_key'].get().strip()
+        if not api_key:
+            return
+        settings = snapshot_settings(state)
+        threading.Thread(target=prewarm_client, args=(settings,), daemon=True).start()
+
+    state['prewarm_after_id'] = root.after(delay_ms, start)
+
+def _estimate_thread(settings, events):
+    """
+    Thread target for estimate_cost(): posts an 'estimate' event, then 'finished'.
+    """
+    try:
+        estimate = run_estimate(settings, events)
+        if estimate:
+            events.emit("estimate", estimate=estimate)
+    except Exception as e:
+        events.log(f"[ERROR] Estimate failed: {e}", "error")
+        events.emit("alert", level="error", title="Estimate Error", message=str(e))
+    finally:
+        events.emit("finished", summary=None)
+
+def _engine_thread(settings, events):
+    """
+    Thread target: runs the engine and always finishes with a 'finished' event.
+    """
+    summary = None
+    try:
+        summary = run_engine(settings, events)
+    except Exception as e:
+        events.log(f"[ERROR] Processing stopped: {e}", "error")
+        events.emit("alert", level="error", title="Processing Error", message=str(e))
+    finally:
+        events.emit("finished", summary=summary)
@@ -0,0 +1,466 @@
+"""
+watcher.py
+
+Watch mode: keeps processing the images dropped into a folder, for as long as it runs:
+- Hears about new files from inotify (Linux, through ctypes), or by polling the folder
+  where inotify isn't available or sees nothing (e.g. files written to a network share
+  by another machine)
+- Picks a file up only once it has stopped changing (same size and mtime for
+  'settle' seconds) and can be opened, so half-copied images are never sent
+- Gathers what arrives within 'batch' seconds and sends it through the normal engine
+  (logic.run_engine), so only new images reach describe_image
+- Writes into a rolling session folder: one a day (or every SESSION_MAX_IMAGES images),
+  continued batch after batch like a resumed session
+- Remembers every image it handled, with its size and mtime, in watch_seen.sqlite3 next
+  to the session folders: a restart doesn't redo them, a replaced file is done again
+- Keeps nothing per image in memory beyond the files still settling or waiting for
+  their batch (polling checks the listing against the seen-set on disk), so memory
+  stays flat however long it runs and however big the folder grows
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import sqlite3
+
+from journal import read_session, has_journal
+from logic import run_engine
+from scanner import iter_images, parse_patterns, is_session_folder, wanted_image, wanted_folder
+
+SEEN_FILE = "watch_seen.sqlite3"
+
+# A rolling session is closed after this many images (or at midnight)
+SESSION_MAX_IMAGES = 2000
+
+# Most images sent in one batch; more wait for the next one
+MAX_BATCH_IMAGES = 500
+
+# Seconds between two looks at the folder when polling
+DEFAULT_POLL_SECONDS = 5.0
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+
+class SeenSet:
+    """
+    The images watch mode has handled, on disk: path -> size, mtime, status, session.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Opened by WatchRunner.__init__, used by run(), possibly on another thread
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " session TEXT,"
+            " time REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_time ON seen(time)")
+        self._conn.commit()
+
+    def is_new(self, path: str, signature: tuple) -> bool:
+        """
+        True unless 'path' was handled before with this (size, mtime_ns).
+        """
+        row = self._conn.execute("SELECT size, mtime_ns FROM seen WHERE path = ?", (path,)).fetchone()
+        return row is None or tuple(row) != tuple(signature)
+
+    def mark(self, items: list, session: str):
+        """
+        Records (path, (size, mtime_ns), status) items as handled in 'session'.
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO seen (path, size, mtime_ns, status, session, time) VALUES (?, ?, ?, ?, ?, ?)",
+            [(path, size, mtime_ns, status, session, now) for path, (size, mtime_ns), status in items])
+        self._conn.commit()
+
+    def last_session(self) -> tuple:
+        """
+        (session folder, time) of the most recently handled image, or (None, None).
+        """
+        row = self._conn.execute("SELECT session, time FROM seen ORDER BY time DESC LIMIT 1").fetchone()
+        return tuple(row) if row else (None, None)
+
+    def close(self):
+        self._conn.close()
+
+def _signature(st) -> tuple:
+    return st.st_size, st.st_mtime_ns
+
+def _readable(path: str) -> bool:
+    # Windows keeps files locked while they are being copied in
+    try:
+        with open(path, "rb") as f:
+            f.read(1)
+        return True
+    except OSError:
+        return False
+
+class PollWatch:
+    """
+    Finds new and changed images by listing the folder every 'interval' seconds.
+    Nothing is kept between looks: each listed image is checked with is_new(path,
+    signature) (the seen-set), so the cost of a look is one stat and one lookup per file.
+    """
+
+    def __init__(self, list_images, is_new, interval: float = DEFAULT_POLL_SECONDS):
+        self.list_images = list_images
+        self.is_new = is_new
+        self.interval = interval
+        self._next = 0.0
+
+    def wait(self, timeout: float) -> list | None:
+        """
+        The images not handled yet in their current state (an empty list if it isn't
+        time to look yet; waits up to 'timeout' first).
+        """
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if self._next > time.monotonic():
+                return []
+        self._next = time.monotonic() + self.interval
+
+        changed = []
+        for path in self.list_images():
+            try:
+                signature = _signature(os.stat(path))
+            except OSError:
+                continue
+            if self.is_new(path, signature):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatch:
+    """
+    Finds new and rewritten images with inotify, one watch per (wanted) folder.
+    Raises OSError if inotify isn't available or the watch limit is reached.
+    """
+
+    def __init__(self, root: str, recursive: bool, want_folder, list_images):
+        import ctypes
+        import ctypes.util
+
+        self.root = root
+        self.recursive = recursive
+        self.want_folder = want_folder
+        self.list_images = list_images
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._folders = {}      # watch descriptor -> folder
+        try:
+            self._watch_tree(root)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, folder: str):
+        import ctypes
+
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"can't watch {folder}: {os.strerror(error)}")
+        self._folders[wd] = folder
+        if not self.recursive:
+            return
+        try:
+            with os.scandir(folder) as it:
+                subfolders = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return
+        for subfolder in sorted(subfolders):
+            if self.want_folder(subfolder):
+                self._watch_tree(subfolder)
+
+    def wait(self, timeout: float) -> list | None:
+        """
+        The images created, moved in or rewritten since the last call (waits up to
+        'timeout' for the first). None if events were lost and the folder must be
+        listed again.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths, lost = [], False
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                lost = True
+                continue
+            if mask & _IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if not mask & _IN_ISDIR:
+                paths.append(path)
+            elif self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO) and self.want_folder(path):
+                # Files can land in a new folder before its watch is in place: list it too
+                try:
+                    self._watch_tree(path)
+                except OSError:
+                    lost = True
+                paths.extend(self.list_images(path))
+        return None if lost else paths
+
+    def close(self):
+        os.close(self._fd)
+
+class WatchRunner:
+    """
+    Runs watch mode over settings.input_path until 'stop' (a threading.Event) is set.
+    'new_events' makes the events.EventQueue for each batch (and one for the watcher's
+    own log lines), so every batch gets fresh counters and summary.
+    """
+
+    def __init__(self, settings, new_events, stop, settle: float = 2.0, batch: float = 10.0,
+                 poll: float = 0.0):
+        if settings.output_strategy == "rename":
+            raise ValueError("Watch mode can't rename the originals in place (the renamed files "
+                             "would show up as new images); choose another output strategy.")
+        self.settings = settings.with_changes(input_type="Folder", resume_session="", retry_failures=False)
+        self.root = os.path.abspath(settings.input_path)
+        self.new_events = new_events
+        self.events = new_events()
+        self.stop = stop
+        self.settle = max(0.0, settle)
+        self.batch = max(0.0, batch)
+        self.poll = poll
+        self.include = parse_patterns(settings.scan_include)
+        self.exclude = parse_patterns(settings.scan_exclude)
+        self.output_folder = os.path.abspath(settings.output_folder)
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.seen = SeenSet(os.path.join(self.output_folder, SEEN_FILE))
+        self.session = None
+        self.session_day = None
+        self.session_images = 0
+
+    # Filters, the same as the engine's folder scan
+
+    def _prune(self, path, name):
+        # A session folder of ours, even before its renamed_images folder exists
+        return is_session_folder(path, name) or (
+            name.startswith("session-") and os.path.dirname(path) == self.output_folder)
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _want_folder(self, path):
+        if os.path.islink(path) and self.settings.scan_symlinks != "follow":
+            return False
+        return wanted_folder(path, self._rel(path), self.exclude, self._prune)
+
+    def _want_image(self, path):
+        if os.path.islink(path) and self.settings.scan_symlinks == "skip":
+            return False
+        folder = os.path.dirname(path)
+        while folder != self.root and folder.startswith(self.root):
+            if not self._want_folder(folder):
+                return False
+            folder = os.path.dirname(folder)
+        if folder != self.root or (not self.settings.scan_recursive and os.path.dirname(path) != self.root):
+            return False
+        return wanted_image(self._rel(path), self.include, self.exclude)
+
+    def _list_images(self, folder=None):
+        """
+        The images in the watched folder, or in one of its subfolders (checked
+        against the patterns relative to the watched folder).
+        """
+        def on_error(path, error):
+            self.events.log(f"[WARN] Can't read folder {path}: {error}", "warn")
+
+        paths = iter_images(
+            folder or self.root,
+            recursive=self.settings.scan_recursive,
+            include=() if folder else self.include,
+            exclude=() if folder else self.exclude,
+            symlinks=self.settings.scan_symlinks,
+            prune=self._prune,
+            on_error=on_error,
+        )
+        return paths if folder is None else (path for path in paths if self._want_image(path))
+
+    def _open_watch(self):
+        if self.poll <= 0 and sys.platform.startswith("linux"):
+            try:
+                watch = InotifyWatch(self.root, self.settings.scan_recursive, self._want_folder, self._list_images)
+                self.events.log(f"[WATCH] Watching {self.root} with inotify.", "info")
+                return watch
+            except OSError as e:
+                self.events.log(f"[WARN] inotify unavailable ({e}); polling instead.", "warn")
+        interval = self.poll if self.poll > 0 else DEFAULT_POLL_SECONDS
+        self.events.log(f"[WATCH] Watching {self.root} by polling every {interval:g}s.", "info")
+        return PollWatch(self._list_images, self.seen.is_new, interval)
+
+    # Rolling session
+
+    def _resume_last_session(self):
+        session, last = self.seen.last_session()
+        if not session or not has_journal(session) or \
+                time.strftime("%Y-%m-%d", time.localtime(last)) != time.strftime("%Y-%m-%d"):
+            return
+        count = len(read_session(session).images)
+        if count < SESSION_MAX_IMAGES:
+            self.session, self.session_day, self.session_images = session, time.strftime("%Y-%m-%d"), count
+            self.events.log(f"[WATCH] Continuing today's session {session}", "info")
+
+    def _current_session(self) -> str:
+        """
+        The session the next batch goes into ("" to start a new one).
+        """
+        if self.session and (self.session_day != time.strftime("%Y-%m-%d")
+                             or self.session_images >= SESSION_MAX_IMAGES
+                             or not has_journal(self.session)):
+            self.events.log(f"[WATCH] Closed session {self.session} ({self.session_images} image(s)).", "info")
+            self.session = None
+        return self.session or ""
+
+    def _process(self, ready: dict) -> dict:
+        """
+        Sends one batch ({path: signature}) through the engine and records what
+        became of each image. Returns the images that weren't processed (e.g. the run
+        budget stopped the batch), to be tried again with the next one.
+        """
+        paths = list(ready)
+        session = self._current_session()
+        settings = self.settings.with_changes(resume_session=session)
+        self.events.log(f"[WATCH] Processing {len(paths)} new image(s)"
+                        + (f" into {session}" if session else " into a new session") + ".", "info")
+        events = self.new_events()
+        summary = None
+        # A replaced file already has a journal record; only newer ones are this batch's
+        started = time.time()
+        try:
+            summary = run_engine(settings, events, paths=paths)
+        except Exception as e:
+            events.log(f"[ERROR] Batch stopped: {e}", "error")
+        finally:
+            events.emit("finished", summary=summary)
+
+        session_path = summary['session_path'] if summary else session
+        if not session_path or not has_journal(session_path):
+            return ready
+        if session_path != self.session:
+            self.session, self.session_day, self.session_images = session_path, time.strftime("%Y-%m-%d"), 0
+
+        records = read_session(session_path).images
+        records = {path: records[path] for path in paths
+                   if path in records and records[path].get('time', 0) >= started - 0.001}
+        handled = [(path, ready[path], records[path]['status']) for path in paths if path in records]
+        self.seen.mark(handled, session_path)
+        self.session_images += len(handled)
+        return {path: ready[path] for path in paths if path not in records}
+
+    def run(self):
+        """
+        Watches and processes until 'stop' is set; a batch in progress is finished first.
+        """
+        self._resume_last_session()
+        watch = self._open_watch()
+        settling = {}       # path -> (signature, since when it has been steady)
+        ready = {}          # path -> signature, waiting for the batch to go
+        ready_since = None
+
+        def arrived(path):
+            if path in ready:
+                # Waiting for its batch: only a change sends it back to settle
+                try:
+                    if _signature(os.stat(path)) == ready[path]:
+                        return
+                except OSError:
+                    pass
+                del ready[path]
+            if path not in settling:
+                settling[path] = (None, time.monotonic())
+
+        # Catch up on whatever arrived while we weren't watching
+        for path in self._list_images():
+            arrived(path)
+
+        try:
+            while not self.stop.is_set():
+                changed = watch.wait(timeout=min(1.0, self.settle or 1.0))
+                if changed is None:
+                    self.events.log("[WATCH] Missed some file events; listing the folder again.", "warn")
+                    changed = list(self._list_images())
+                for path in changed:
+                    if self._want_image(path):
+                        arrived(path)
+
+                now = time.monotonic()
+                for path, (signature, since) in list(settling.items()):
+                    try:
+                        current = _signature(os.stat(path))
+                    except OSError:
+                        # Gone (or moved on) before it settled
+                        del settling[path]
+                        continue
+                    if current != signature:
+                        settling[path] = (current, now)
+                        continue
+                    if now - since < self.settle or not current[0]:
+                        continue
+                    if not _readable(path):
+                        settling[path] = (current, now)
+                        continue
+                    del settling[path]
+                    if self.seen.is_new(path, current):
+                        ready[path] = current
+                        ready_since = ready_since or now
+
+                due = ready and (now - ready_since >= self.batch or len(ready) >= MAX_BATCH_IMAGES)
+                if due and not self.stop.is_set():
+                    batch = dict(list(ready.items())[:MAX_BATCH_IMAGES])
+                    for path in batch:
+                        del ready[path]
+                    ready.update(self._process(batch))
+                    ready_since = time.monotonic() if ready else None
+        finally:
+            watch.close()
+            self.seen.close()
+            self.events.log("[WATCH] Stopped.", "info")
+
+def run_watch(settings, new_events, stop, settle: float = 2.0, batch: float = 10.0, poll: float = 0.0):
+    """
+    Watch mode (see WatchRunner). 'poll' > 0 polls every that many seconds instead of
+    using inotify.
+    """
+    WatchRunner(settings, new_events, stop, settle, batch, poll).run()